@@ -0,0 +1,90 @@
+"""CPU cost per call of the ambient sound.
+
+Produces `--seconds` of ambient audio the way BackgroundAudioPlayer does for a file
+(decoding it in a loop, volume applied in float) and the way app.ambient does (the
+host's decoded cache, fixed point volume in preallocated buffers), and prints the
+CPU time each takes per call:
+
+    python ambient_benchmark.py [--sound office-ambience] [--seconds 300] [--volume 0.5]
+"""
+
+import argparse
+import asyncio
+import os
+import sys
+import tempfile
+import time
+
+# app.env refuses to import without these, their values don't matter here
+os.environ.setdefault("SERVER_URL", "http://localhost")
+os.environ.setdefault("SERVER_API_KEY", "ambient-benchmark")
+os.environ.setdefault("AMBIENT_CACHE_DIR", tempfile.mkdtemp(prefix="ambient-benchmark-"))
+
+import numpy as np  # noqa: E402
+from livekit import rtc  # noqa: E402
+from livekit.agents.utils.audio import audio_frames_from_file  # noqa: E402
+
+from app import ambient  # noqa: E402
+
+
+async def naive(path: str, samples: int, volume: float) -> None:
+    produced = 0
+    while produced < samples:
+        async for frame in audio_frames_from_file(path, ambient.AMBIENT_SAMPLE_RATE, 1):
+            if produced >= samples:
+                # the decoder thread can't be stopped early, let it finish the file
+                continue
+            data = np.frombuffer(frame.data, dtype=np.int16).astype(np.float32)
+            data *= 10 ** (np.log10(volume))
+            np.clip(data, -32768, 32767, out=data)
+            rtc.AudioFrame(
+                data=data.astype(np.int16).tobytes(),
+                sample_rate=frame.sample_rate,
+                num_channels=frame.num_channels,
+                samples_per_channel=frame.samples_per_channel,
+            )
+            produced += frame.samples_per_channel
+
+
+async def cached(sound: str, samples: int, volume: float) -> None:
+    # what every call after the host's first one does
+    ambient._tracks.clear()
+    track = ambient.AmbientTrack(await ambient.load_ambient(sound), volume)
+    for _ in range(0, samples, ambient.AMBIENT_FRAME_SAMPLES):
+        track.next_frame()
+
+
+def measure(coro) -> float:
+    started_at = time.process_time()
+    asyncio.run(coro)
+    return time.process_time() - started_at
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--sound", default="office-ambience", help="ambient sound, path or URL")
+    parser.add_argument("--seconds", type=float, default=300, help="call duration")
+    parser.add_argument("--volume", type=float, default=0.5)
+    parser.add_argument("--runs", type=int, default=3, help="best of N runs is reported")
+    args = parser.parse_args()
+
+    samples = int(args.seconds * ambient.AMBIENT_SAMPLE_RATE)
+    path = ambient._resolve(args.sound)
+
+    decode = measure(ambient.load_ambient(args.sound))
+    naive_cpu = min(measure(naive(path, samples, args.volume)) for _ in range(args.runs))
+    cached_cpu = min(measure(cached(args.sound, samples, args.volume)) for _ in range(args.runs))
+
+    print(f"Ambient sound {args.sound!r}, {args.seconds:.0f}s call, volume {args.volume}")
+    print(f"  decode into the host cache (once) {decode * 1000:8.1f} ms")
+    for name, cpu in (("decode per call", naive_cpu), ("shared cache", cached_cpu)):
+        print(
+            f"  {name:<33} {cpu * 1000:8.1f} ms per call, "
+            f"{cpu / args.seconds * 100:.3f}% of a core"
+        )
+    print(f"  saved per call {(naive_cpu - cached_cpu) * 1000:.1f} ms")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
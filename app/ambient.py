@@ -0,0 +1,174 @@
+import asyncio
+import fcntl
+import glob
+import hashlib
+import os
+from typing import AsyncIterator, Dict, Optional
+
+import aiohttp
+import numpy as np
+from livekit import rtc
+from livekit.agents.utils.audio import audio_frames_from_file
+from livekit.agents.voice.background_audio import BackgroundAudioPlayer, BuiltinAudioClip
+
+from . import env
+from .logger import logger
+from .metrics import metrics
+from .voice_info import VoiceInfo
+
+# BackgroundAudioPlayer mixes at 48kHz mono in blocks of 100ms
+AMBIENT_SAMPLE_RATE = 48000
+AMBIENT_FRAME_SAMPLES = AMBIENT_SAMPLE_RATE // 10
+
+# Q15 fixed point gain. Volumes are clamped to 0-2, samples a volume above 1.0 pushes
+# out of the int16 range are clipped.
+_GAIN_SHIFT = 15
+
+# Decoded assets mapped by this process, the pages are shared with the other job
+# processes through the page cache
+_tracks: Dict[str, np.ndarray] = {}
+
+
+def _resolve(source: str) -> str:
+    """Path or URL of an ambient sound name, file path or URL."""
+    if source.startswith(("http://", "https://")) or os.path.isfile(source):
+        return source
+    if env.AMBIENT_SOUND_DIR:
+        paths = sorted(glob.glob(os.path.join(glob.escape(env.AMBIENT_SOUND_DIR), f"{source}.*")))
+        if paths:
+            return paths[0]
+    for clip in BuiltinAudioClip:
+        if source in (clip.name.lower(), clip.value, clip.value.rsplit(".", 1)[0]):
+            return clip.path()
+    raise ValueError(f"Unknown ambient sound {source!r}")
+
+
+async def _download(url: str, path: str) -> None:
+    async with aiohttp.ClientSession() as session:
+        async with session.get(url, timeout=aiohttp.ClientTimeout(total=30)) as response:
+            response.raise_for_status()
+            data = await response.read()
+    await asyncio.to_thread(_write_file, path, data)
+
+
+def _write_file(path: str, data: bytes) -> None:
+    with open(path, "wb") as f:
+        f.write(data)
+
+
+async def _decode(source: str, path: str) -> None:
+    tmp_path = f"{path}.{os.getpid()}.tmp"
+    src_path = source
+    if source.startswith(("http://", "https://")):
+        src_path = f"{tmp_path}.src"
+        await _download(source, src_path)
+    try:
+        with open(tmp_path, "wb") as f:
+            async for frame in audio_frames_from_file(src_path, AMBIENT_SAMPLE_RATE, 1):
+                f.write(frame.data)
+        if not os.path.getsize(tmp_path):
+            raise ValueError(f"Ambient sound {source!r} has no audio")
+        os.replace(tmp_path, path)
+    finally:
+        for p in (tmp_path, f"{tmp_path}.src"):
+            if os.path.exists(p):
+                os.remove(p)
+
+
+async def load_ambient(source: str) -> np.ndarray:
+    """Return the 48kHz PCM of an ambient sound, memory-mapped from the host's cache.
+
+    An asset is decoded once per host into AMBIENT_CACHE_DIR, a lock file keeps the
+    other job processes waiting for it instead of decoding it as well.
+    """
+    pcm = _tracks.get(source)
+    if pcm is not None:
+        return pcm
+
+    resolved = _resolve(source)
+    key = hashlib.sha1(resolved.encode()).hexdigest()
+    path = os.path.join(env.AMBIENT_CACHE_DIR, f"{key}.pcm")
+    if not os.path.exists(path):
+        os.makedirs(env.AMBIENT_CACHE_DIR, exist_ok=True)
+        fd = os.open(f"{path}.lock", os.O_RDWR | os.O_CREAT, 0o600)
+        try:
+            while True:
+                try:
+                    fcntl.flock(fd, fcntl.LOCK_EX | fcntl.LOCK_NB)
+                    break
+                except BlockingIOError:
+                    await asyncio.sleep(0.1)
+            if not os.path.exists(path):
+                await _decode(resolved, path)
+                metrics.inc("ambient_decodes_total")
+                logger.info("Ambient sound cached: %r", source)
+        finally:
+            os.close(fd)
+
+    pcm = np.memmap(path, dtype=np.int16, mode="r")
+    _tracks[source] = pcm
+    return pcm
+
+
+class AmbientTrack:
+    """Loops an ambient sound at a volume.
+
+    Every frame is computed in buffers allocated once per track, the only
+    allocation per frame is the copy AudioFrame makes of its data.
+    """
+
+    def __init__(self, pcm: np.ndarray, volume: float) -> None:
+        self._pcm = pcm
+        self._gain = int(round(min(max(volume, 0.0), 2.0) * (1 << _GAIN_SHIFT)))
+        self._position = 0
+        self._mix = np.empty(AMBIENT_FRAME_SAMPLES, dtype=np.int32)
+        self._out = np.empty(AMBIENT_FRAME_SAMPLES, dtype=np.int16)
+
+    def next_frame(self) -> rtc.AudioFrame:
+        # the frame may wrap around the end of the sound, take it in parts
+        filled = 0
+        while filled < AMBIENT_FRAME_SAMPLES:
+            n = min(AMBIENT_FRAME_SAMPLES - filled, len(self._pcm) - self._position)
+            self._mix[filled : filled + n] = self._pcm[self._position : self._position + n]
+            filled += n
+            self._position = (self._position + n) % len(self._pcm)
+
+        np.multiply(self._mix, self._gain, out=self._mix)
+        np.right_shift(self._mix, _GAIN_SHIFT, out=self._mix)
+        np.clip(self._mix, -32768, 32767, out=self._mix)
+        np.copyto(self._out, self._mix, casting="unsafe")
+        return rtc.AudioFrame(
+            data=self._out,
+            sample_rate=AMBIENT_SAMPLE_RATE,
+            num_channels=1,
+            samples_per_channel=AMBIENT_FRAME_SAMPLES,
+        )
+
+    async def frames(self) -> AsyncIterator[rtc.AudioFrame]:
+        # endless, the player's mixer pulls frames at playback speed
+        while True:
+            yield self.next_frame()
+
+
+class AmbientPlayer:
+    """Plays the agent's ambient sound under the whole call."""
+
+    def __init__(self, agent: VoiceInfo, player: BackgroundAudioPlayer) -> None:
+        self._agent = agent
+        self._player = player
+        self._track: Optional[AmbientTrack] = None
+
+    @property
+    def enabled(self) -> bool:
+        return bool(self._agent.ambient_sound) and self._agent.ambient_sound_volume > 0
+
+    async def start(self) -> None:
+        if not self.enabled:
+            return
+        try:
+            pcm = await load_ambient(self._agent.ambient_sound)
+        except Exception:
+            logger.exception("Failed to load ambient sound %r", self._agent.ambient_sound)
+            return
+        self._track = AmbientTrack(pcm, self._agent.ambient_sound_volume)
+        self._player.play(self._track.frames())
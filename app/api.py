@@ -1,61 +1,265 @@
+import asyncio
+import os
+import random
+import time
+from typing import Any, Dict, Optional, Tuple
+
 import aiohttp
-from app import env
+from app import env, serializer
+from app.logger import logger
+from app.metrics import metrics
 from utils import is_ok
 
 HEADERS = {"x-server-api-key": env.SERVER_API_KEY}
 
+# Share of the call setup budget each endpoint may use. load() makes two of these
+# requests one after the other, so any pair stays within the budget.
+SETUP_BUDGET_SHARES = {
+    "agent": 0.4,
+    "call": 0.3,
+    "register": 0.3,
+}
+
+MAX_RETRIES = 2
+RETRY_BASE_DELAY = 0.2
+
+
+class BackendUnavailable(Exception):
+    """The backend timed out, failed or the circuit breaker is open."""
+
+
+class CircuitBreaker:
+    """Fails requests fast once the backend keeps failing.
+
+    Opens after `failure_threshold` consecutive failed requests. After
+    `reset_timeout` seconds one request is let through, its outcome closes the
+    breaker or opens it again. Shared by every call of the process.
+    """
+
+    def __init__(self, failure_threshold: int = 5, reset_timeout: float = 30.0) -> None:
+        self._failure_threshold = failure_threshold
+        self._reset_timeout = reset_timeout
+        self._failures = 0
+        self._opened_at = 0.0
+        self._probing = False
+        self._probe_at = 0.0
+
+    @property
+    def is_open(self) -> bool:
+        return self._opened_at > 0
+
+    def allow(self) -> bool:
+        if not self.is_open:
+            return True
+        now = time.monotonic()
+        if now - self._opened_at < self._reset_timeout:
+            return False
+        # a probe that never reported back (e.g. cancelled) doesn't block the next one
+        if self._probing and now - self._probe_at < self._reset_timeout:
+            return False
+        self._probing = True
+        self._probe_at = now
+        return True
+
+    def record_success(self) -> None:
+        if self.is_open:
+            logger.info("Backend circuit breaker closed")
+        self._failures = 0
+        self._opened_at = 0.0
+        self._probing = False
+        metrics.set("api_breaker_open", 0)
+
+    def record_failure(self) -> None:
+        self._failures += 1
+        if self._probing or (not self.is_open and self._failures >= self._failure_threshold):
+            if not self.is_open:
+                logger.warning("Backend circuit breaker opened after %d failures", self._failures)
+                metrics.inc("api_breaker_trips_total")
+            self._opened_at = time.monotonic()
+            self._probing = False
+            metrics.set("api_breaker_open", 1)
+
+
+breaker = CircuitBreaker()
+
+
+def _timeout(endpoint: str) -> float:
+    if endpoint in SETUP_BUDGET_SHARES:
+        return env.API_SETUP_BUDGET_SEC * SETUP_BUDGET_SHARES[endpoint]
+    return env.API_UPDATE_TIMEOUT_SEC
+
+
+async def _request(
+    endpoint: str,
+    method: str,
+    url: str,
+    *,
+    payload: Optional[dict] = None,
+    idempotent: bool = False,
+    bypass_breaker: bool = False,
+) -> Tuple[int, Any]:
+    """Make a backend request within the endpoint's deadline.
+
+    Idempotent requests are retried with jittered backoff on timeouts, connection
+    errors and 5xx responses while the deadline allows it, only these count as
+    failures for the circuit breaker. Raises BackendUnavailable when the backend
+    can't be reached in time, ValueError for a response that isn't JSON.
+
+    `bypass_breaker` requests are sent even while the breaker is open, for the ones a
+    call can't do without (the cached agent config is of no use without them) and
+    the call updates, which would be lost.
+    """
+    if not bypass_breaker and not breaker.allow():
+        metrics.inc("api_fast_failures_total", endpoint=endpoint)
+        raise BackendUnavailable(f"{endpoint}: circuit breaker open")
+
+    deadline = time.monotonic() + _timeout(endpoint)
+    headers = HEADERS
+    data = None
+    if payload is not None:
+        headers = HEADERS | {"Content-Type": "application/json"}  # merge headers
+        data = await serializer.dumps_async(payload)
+
+    async with aiohttp.ClientSession(headers=headers) as session:
+        attempt = 0
+        while True:
+            timeout = aiohttp.ClientTimeout(total=max(deadline - time.monotonic(), 0.01))
+            try:
+                async with session.request(method, url, data=data, timeout=timeout) as response:
+                    if response.status >= 500:
+                        raise aiohttp.ClientResponseError(
+                            response.request_info, (), status=response.status
+                        )
+                    body = await response.read()
+                    # the backend answered, even if with e.g. a proxy's 4xx error page
+                    breaker.record_success()
+                    try:
+                        result = await serializer.loads_async(body)
+                    except ValueError as e:
+                        metrics.inc("api_invalid_responses_total", endpoint=endpoint)
+                        raise ValueError(
+                            f"{endpoint}: HTTP {response.status} response is not JSON"
+                        ) from e
+                    return response.status, result
+            except (asyncio.TimeoutError, aiohttp.ClientError) as e:
+                if isinstance(e, asyncio.TimeoutError):
+                    metrics.inc("api_timeouts_total", endpoint=endpoint)
+                attempt += 1
+                backoff = random.uniform(0, RETRY_BASE_DELAY * 2**attempt)
+                if (
+                    not idempotent
+                    or attempt > MAX_RETRIES
+                    or time.monotonic() + backoff >= deadline
+                ):
+                    breaker.record_failure()
+                    metrics.inc("api_failures_total", endpoint=endpoint)
+                    if isinstance(e, aiohttp.ClientResponseError):
+                        raise BackendUnavailable(f"{endpoint}: HTTP {e.status}") from e
+                    raise BackendUnavailable(f"{endpoint}: {e!r}") from e
+                metrics.inc("api_retries_total", endpoint=endpoint)
+                await asyncio.sleep(backoff)
+
+
+# Last known good agent configs, in memory and on disk for the other job processes
+_agents: Dict[str, dict] = {}
+
+
+def _agent_cache_path(key: str) -> str:
+    return os.path.join(env.API_CACHE_DIR, f"agent-{key}.json")
+
+
+def _write_json(path: str, data: dict) -> None:
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    tmp_path = f"{path}.{os.getpid()}.tmp"
+    with open(tmp_path, "wb") as f:
+        f.write(serializer.dumps(data))
+    os.replace(tmp_path, path)
+
+
+def _read_json(path: str) -> Optional[dict]:
+    try:
+        with open(path, "rb") as f:
+            return serializer.loads(f.read())
+    except (OSError, ValueError):
+        return None
+
+
+async def _store_agent(key: str, data: dict) -> None:
+    if _agents.get(key) == data:
+        return
+    _agents[key] = data
+    try:
+        await asyncio.to_thread(_write_json, _agent_cache_path(key), data)
+    except OSError as e:
+        logger.warning("Failed to cache agent config: %s", e)
+
+
+async def _cached_agent(key: str, error: BackendUnavailable) -> dict:
+    data = _agents.get(key)
+    if data is None:
+        data = await asyncio.to_thread(_read_json, _agent_cache_path(key))
+    if data is None:
+        raise error
+    logger.warning("Using last known agent config for %s: %s", key, error)
+    metrics.inc("api_stale_agent_config_total")
+    return data
+
 
 async def get_agent_by_phone(phone: str, direction: str):
     url = f"{env.SERVER_URL}/api/agents/by-phone/{phone}"
-    async with aiohttp.ClientSession(headers=HEADERS) as session:
-        async with session.get(url) as response:
-            result = await response.json()
-            if not is_ok(response.status):
-                raise ValueError(f"Failed to fetch agent: {result}")
-            return result["data"][direction]
+    key = f"phone-{phone}"
+    try:
+        status, result = await _request("agent", "GET", url, idempotent=True)
+    except BackendUnavailable as e:
+        return (await _cached_agent(key, e))[direction]
+    if not is_ok(status):
+        raise ValueError(f"Failed to fetch agent: {result}")
+    await _store_agent(key, result["data"])
+    return result["data"][direction]
 
 
 async def get_agent_by_id(agent_id: str, user_id: str):
     url = f"{env.SERVER_URL}/api/agents/{agent_id}?userId={user_id}"
-    async with aiohttp.ClientSession(headers=HEADERS) as session:
-        async with session.get(url) as response:
-            result = await response.json()
-            if not is_ok(response.status):
-                raise ValueError(f"Failed to fetch agent: {result}")
-            return result["data"]
+    key = f"id-{agent_id}-{user_id}"
+    try:
+        status, result = await _request("agent", "GET", url, idempotent=True)
+    except BackendUnavailable as e:
+        return await _cached_agent(key, e)
+    if not is_ok(status):
+        raise ValueError(f"Failed to fetch agent: {result}")
+    await _store_agent(key, result["data"])
+    return result["data"]
 
 
 async def update_call(call_id: str, user_id: str, call_data: dict):
     url = f"{env.SERVER_URL}/api/calls/{call_id}?userId={user_id}"
-    headers = HEADERS | {"Content-Type": "application/json"}  # merge headers
-    async with aiohttp.ClientSession(headers=headers) as session:
-        async with session.patch(url, json=call_data) as response:
-            result = await response.json()
-            if not is_ok(response.status):
-                raise ValueError(f"Failed to update call: {result}")
-            return result["data"]
+    # the call's whole state, so it can be retried, and is sent while the breaker is
+    # open: the end of call update can't be made again later
+    status, result = await _request(
+        "update", "PATCH", url, payload=call_data, idempotent=True, bypass_breaker=True
+    )
+    if not is_ok(status):
+        raise ValueError(f"Failed to update call: {result}")
+    return result["data"]
 
 
 async def register_inbound_call(fromNumber: str, toNumber: str):
     url = f"{env.SERVER_URL}/api/calls/register-inbound-call"
-    headers = HEADERS | {"Content-Type": "application/json"}  # merge headers
     payload = {
         "fromNumber": fromNumber,
         "toNumber": toNumber,
     }
-    async with aiohttp.ClientSession(headers=headers) as session:
-        async with session.post(url, json=payload) as response:
-            result = await response.json()
-            if not is_ok(response.status):
-                raise ValueError(f"Failed to register inbound call: {result}")
-            return result["data"]
+    status, result = await _request(
+        "register", "POST", url, payload=payload, bypass_breaker=True
+    )
+    if not is_ok(status):
+        raise ValueError(f"Failed to register inbound call: {result}")
+    return result["data"]
 
 
 async def get_call_by_id(call_id: str):
-    async with aiohttp.ClientSession(headers=HEADERS) as session:
-        url = f"{env.SERVER_URL}/api/calls/{call_id}"
-        async with session.get(url) as response:
-            result = await response.json()
-            if not is_ok(response.status):
-                raise ValueError(f"Failed to fetch call: {result}")
-            return result["data"]
+    url = f"{env.SERVER_URL}/api/calls/{call_id}"
+    status, result = await _request("call", "GET", url, idempotent=True, bypass_breaker=True)
+    if not is_ok(status):
+        raise ValueError(f"Failed to fetch call: {result}")
+    return result["data"]
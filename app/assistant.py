@@ -1,11 +1,23 @@
 from livekit.agents import (
+    NOT_GIVEN,
     Agent,
+    FunctionTool,
+    ModelSettings,
     function_tool,
+    llm,
     RunContext,
 )
+from livekit.agents.voice.agent_activity import _SpeechHandleContextVar
 import asyncio
+from typing import AsyncIterable, Dict, Optional, Tuple
+
+from . import env
 from .logger import logger
 
+from .context_window import ContextWindow
+from .providers import llm_extra_kwargs
+from .response_cache import CachedReply, PendingReply, ResponseCache
+from .speculative import SpeculativeLLM
 from .voice_info import VoiceInfo
 
 
@@ -14,13 +26,129 @@ class Assistant(Agent):
         super().__init__(instructions=instructions)
         self._closing_task: asyncio.Task[None] | None = None
         self.voice_info = voice_info
+        self._llm_extra_kwargs = llm_extra_kwargs(voice_info)
+        self.speculative: Optional[SpeculativeLLM] = None
+        self.response_cache: Optional[ResponseCache] = None
+        self.context_window = ContextWindow(voice_info)
+        # the id of the user's last message and its cached or pending reply
+        self._turn: Optional[Tuple[str, Optional[CachedReply], Optional[PendingReply]]] = None
+        # passed from llm_node to the tts_node of the same speech, by speech id
+        self._replies: Dict[str, Tuple[Optional[CachedReply], Optional[PendingReply]]] = {}
 
     async def on_enter(self):
         logger.info("Agent on_enter")
+        if (
+            self.voice_info.response_cache
+            if self.voice_info.response_cache is not None
+            else env.RESPONSE_CACHE
+        ):
+            self.response_cache = ResponseCache(self.voice_info)
+            self.response_cache.start()
+        if (
+            self.voice_info.speculative_llm
+            if self.voice_info.speculative_llm is not None
+            else env.SPECULATIVE_LLM
+        ):
+            self.speculative = SpeculativeLLM(
+                self.session, self, self._llm_extra_kwargs, trim=self.context_window.trim
+            )
 
     async def on_exit(self):
         logger.info("Agent on_exit")
 
+    async def on_user_turn_completed(
+        self, turn_ctx: llm.ChatContext, new_message: llm.ChatMessage
+    ) -> None:
+        self._turn = None
+        if self.response_cache is None:
+            return
+        utterance = self.response_cache.cacheable(new_message.text_content or "")
+        if utterance is None:
+            return
+        cached = await self.response_cache.lookup(utterance)
+        pending = PendingReply(utterance) if cached is None else None
+        self._turn = (new_message.id, cached, pending)
+        if cached is not None and self.speculative:
+            self.speculative.skip_turn("response_cache")
+
+    async def llm_node(
+        self,
+        chat_ctx: llm.ChatContext,
+        tools: list[FunctionTool],
+        model_settings: ModelSettings,
+    ):
+        serving, replying = self._take_turn(chat_ctx)
+        if serving is not None:
+            yield serving.text
+            return
+
+        async for chunk in self._llm_chunks(chat_ctx, tools, model_settings):
+            if replying and isinstance(chunk, llm.ChatChunk) and chunk.delta:
+                if chunk.delta.tool_calls:
+                    replying.cacheable = False
+            yield chunk
+
+    def _take_turn(
+        self, chat_ctx: llm.ChatContext
+    ) -> Tuple[Optional[CachedReply], Optional[PendingReply]]:
+        turn, self._turn = self._turn, None
+        # the generation of the turn may have been interrupted before it got here
+        if turn is None or chat_ctx.get_by_id(turn[0]) is None:
+            return None, None
+        # livekit-agents 1.0 runs llm_node and tts_node of a speech in tasks created
+        # with the speech handle in this context variable; say() only runs tts_node
+        speech = _SpeechHandleContextVar.get(None)
+        if speech is None:
+            return None, None
+        _, serving, replying = turn
+        self._replies[speech.id] = (serving, replying)
+        speech.add_done_callback(lambda _: self._replies.pop(speech.id, None))
+        return serving, replying
+
+    async def _llm_chunks(
+        self,
+        chat_ctx: llm.ChatContext,
+        tools: list[FunctionTool],
+        model_settings: ModelSettings,
+    ):
+        if self.speculative:
+            speculation = self.speculative.take(chat_ctx)
+            if speculation:
+                async for chunk in self.speculative.replay(speculation):
+                    yield chunk
+                return
+
+        # same as Agent.default.llm_node, plus the agent's request limits (llm_max_tokens)
+        # and the bounded context
+        tool_choice = model_settings.tool_choice if model_settings else NOT_GIVEN
+        async with self.session.llm.chat(
+            chat_ctx=self.context_window.trim(chat_ctx),
+            tools=tools,
+            tool_choice=tool_choice,
+            extra_kwargs=self._llm_extra_kwargs,
+        ) as stream:
+            async for chunk in stream:
+                yield chunk
+
+    async def tts_node(self, text: AsyncIterable[str], model_settings: ModelSettings):
+        speech = _SpeechHandleContextVar.get(None)
+        serving, replying = self._replies.pop(speech.id, (None, None)) if speech else (None, None)
+        if serving is not None:
+            async for frame in serving.frames():
+                yield frame
+            return
+
+        if replying is not None:
+            text = replying.tee_text(text)
+        async for frame in Agent.default.tts_node(self, text, model_settings):
+            if replying is not None:
+                replying.frames.append(frame)
+            yield frame
+        # only reached when the reply was synthesised in full
+        entry = replying.to_entry() if replying is not None else None
+        if entry is not None:
+            await self.response_cache.store(entry)
+
     # to hang up the call as part of a function call
     @function_tool
     async def end_call(self, ctx: RunContext):
@@ -2,6 +2,7 @@ from dataclasses import dataclass
 from enum import Enum
 from typing import Optional
 
+from app import serializer
 from app.api import update_call
 
 
@@ -12,17 +13,17 @@ class CallStatus(str, Enum):
     ERROR = "error"
 
 
-# class CallDisconnectReason(str, Enum):
-#     USER_HANGUP = "user_hangup"
-#     AGENT_HANGUP = "agent_hangup"
-#     CALL_TRANSFER = "call_transfer"
-#     INACTIVITY = "inactivity"
-#     MAX_DURATION_REACHED = "max_duration_reached"
-#     CONCURRENT_CALL_LIMIT_REACHED = "concurrent_call_limit_reached"
-#     DIAL_BUSY = "dial_busy"
-#     DIAL_NO_ANSWER = "dial_no_answer"
-#     ERROR_UNKNOWN = "error_unknown"
-#     UNKNOWN = "unknown"
+class CallDisconnectReason(str, Enum):
+    USER_HANGUP = "user_hangup"
+    AGENT_HANGUP = "agent_hangup"
+    CALL_TRANSFER = "call_transfer"
+    INACTIVITY = "inactivity"
+    MAX_DURATION_REACHED = "max_duration_reached"
+    CONCURRENT_CALL_LIMIT_REACHED = "concurrent_call_limit_reached"
+    DIAL_BUSY = "dial_busy"
+    DIAL_NO_ANSWER = "dial_no_answer"
+    ERROR_UNKNOWN = "error_unknown"
+    UNKNOWN = "unknown"
 
 
 @dataclass
@@ -36,6 +37,10 @@ class CallInfo:
     call_end_time: Optional[int] = None
     transcript: Optional[str] = None
     latency: Optional[str] = None
+    memory: Optional[str] = None
+    network: Optional[str] = None
+    experiment: Optional[str] = None
+    event_loop: Optional[str] = None
 
     @staticmethod
     def from_json(data):
@@ -49,8 +54,16 @@ class CallInfo:
             call_end_time=data.get("callEndTime", None),
             transcript=data.get("transcript", None),
             latency=data.get("latency", None),
+            memory=data.get("memory", None),
+            network=data.get("network", None),
+            experiment=data.get("experiment", None),
+            event_loop=data.get("eventLoop", None),
         )
 
+    async def set_transcript(self, history: dict):
+        # the history of a long call takes milliseconds to encode, keep it off the loop
+        self.transcript = (await serializer.dumps_async(history, offload=True)).decode()
+
     async def update(self):
         body = {
             "callStatus": self.call_status.value,
@@ -60,6 +73,10 @@ class CallInfo:
             "callEndTime": self.call_end_time,
             "transcript": self.transcript,
             "latency": self.latency,
+            "memory": self.memory,
+            "network": self.network,
+            "experiment": self.experiment,
+            "eventLoop": self.event_loop,
         }
         new_call = CallInfo.from_json(await update_call(self.id, self.user_id, body))
         self.call_status = new_call.call_status
@@ -69,3 +86,7 @@ class CallInfo:
         self.call_end_time = new_call.call_end_time
         self.transcript = new_call.transcript
         self.latency = new_call.latency
+        self.memory = new_call.memory
+        self.network = new_call.network
+        self.experiment = new_call.experiment
+        self.event_loop = new_call.event_loop
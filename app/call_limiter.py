@@ -0,0 +1,103 @@
+import asyncio
+import fcntl
+import os
+import re
+import time
+from typing import List, Optional, Tuple
+
+from . import env
+from .logger import logger
+from .metrics import metrics
+
+
+class CallSlot:
+    """Locks held by an admitted call, released when the call ends.
+
+    The kernel also drops them if the job process dies, so a crashed call never
+    keeps its slot.
+    """
+
+    def __init__(self, fds: List[int]) -> None:
+        self._fds = fds
+
+    def release(self) -> None:
+        for fd in self._fds:
+            os.close(fd)
+        self._fds = []
+
+
+class CallLimiter:
+    """Limits the concurrent calls of a user and of an agent on this host.
+
+    Every job process of the host shares the slots: a slot is an flock on one of
+    `limit` lock files of the user or agent in `directory`. A call over a limit
+    waits up to `queue_timeout` seconds for a slot to free up, then is rejected.
+
+    Args:
+        per_user: Concurrent calls per user, 0 for no limit
+        per_agent: Concurrent calls per agent, 0 for no limit
+        queue_timeout: Seconds a call waits for a slot, 0 to reject right away
+        poll_interval: Seconds between attempts while waiting
+    """
+
+    def __init__(
+        self,
+        directory: str = env.CALL_LIMIT_DIR,
+        *,
+        per_user: int = env.CALL_LIMIT_PER_USER,
+        per_agent: int = env.CALL_LIMIT_PER_AGENT,
+        queue_timeout: float = env.CALL_LIMIT_QUEUE_SEC,
+        poll_interval: float = 0.5,
+    ) -> None:
+        self._directory = directory
+        self._per_user = per_user
+        self._per_agent = per_agent
+        self._queue_timeout = queue_timeout
+        self._poll_interval = poll_interval
+
+    def _try_lock(self, scope: str, key: str, limit: int) -> Optional[int]:
+        os.makedirs(self._directory, exist_ok=True)
+        key = re.sub(r"[^\w-]", "_", key)
+        for i in range(limit):
+            path = os.path.join(self._directory, f"{scope}-{key}.{i}.lock")
+            fd = os.open(path, os.O_RDWR | os.O_CREAT, 0o600)
+            try:
+                fcntl.flock(fd, fcntl.LOCK_EX | fcntl.LOCK_NB)
+                return fd
+            except BlockingIOError:
+                os.close(fd)
+        return None
+
+    def _try_acquire(self, user_id: str, agent_id: str) -> Tuple[Optional[CallSlot], str]:
+        fds: List[int] = []
+        for scope, key, limit in (
+            ("user", user_id, self._per_user),
+            ("agent", agent_id, self._per_agent),
+        ):
+            if limit <= 0:
+                continue
+            fd = self._try_lock(scope, key, limit)
+            if fd is None:
+                # never hold one slot while waiting for the other
+                CallSlot(fds).release()
+                return None, scope
+            fds.append(fd)
+        return CallSlot(fds), ""
+
+    async def acquire(self, user_id: str, agent_id: str) -> Optional[CallSlot]:
+        """Return the call's slot, or None when the call is rejected."""
+        started_at = time.monotonic()
+        slot, scope = self._try_acquire(user_id, agent_id)
+        if slot is None and self._queue_timeout > 0:
+            metrics.inc("call_limit_queued_total", scope=scope)
+            logger.info("Call queued, %s concurrent call limit reached", scope)
+            deadline = started_at + self._queue_timeout
+            while slot is None and time.monotonic() < deadline:
+                await asyncio.sleep(self._poll_interval)
+                slot, scope = self._try_acquire(user_id, agent_id)
+            metrics.observe("call_limit_wait_seconds", time.monotonic() - started_at)
+
+        if slot is None:
+            metrics.inc("call_limit_rejected_total", scope=scope)
+            logger.warning("Call rejected, %s concurrent call limit reached", scope)
+        return slot
@@ -0,0 +1,119 @@
+import asyncio
+import time
+from typing import Callable, Optional
+
+from livekit.agents import AgentSession
+from livekit.agents.voice.events import AgentStateChangedEvent, UserStateChangedEvent
+
+from .call_info import CallDisconnectReason
+from .logger import logger
+from .metrics import metrics
+from .voice_info import VoiceInfo
+
+CLOSING_LINES = {
+    CallDisconnectReason.INACTIVITY: {
+        "hi": "आपकी ओर से कोई जवाब नहीं मिला, इसलिए कॉल समाप्त की जा रही है। धन्यवाद!",
+        "en": "I haven't heard from you in a while, so I'll end the call now. Goodbye!",
+    },
+    CallDisconnectReason.MAX_DURATION_REACHED: {
+        "hi": "कॉल की अधिकतम अवधि पूरी हो गई है। कॉल करने के लिए धन्यवाद!",
+        "en": "We've reached the maximum call duration. Thank you for calling, goodbye!",
+    },
+}
+
+# Longest we wait for the closing line before hanging up anyway
+CLOSING_LINE_TIMEOUT = 10.0
+
+
+class CallWatchdog:
+    """Ends calls that run past `maximum_call_duration_in_sec` or stay silent for
+    `end_call_after_silence_in_sec`, so abandoned calls give their job slot back.
+
+    Silence is time where neither the user nor the agent is speaking or the agent
+    is thinking. A value of 0 disables the corresponding limit.
+    """
+
+    def __init__(
+        self,
+        session: AgentSession,
+        agent: VoiceInfo,
+        on_timeout: Callable[[CallDisconnectReason], None],
+    ) -> None:
+        self._session = session
+        self._agent = agent
+        self._on_timeout = on_timeout
+        self._max_duration = agent.maximum_call_duration_in_sec or 0
+        self._max_silence = agent.end_call_after_silence_in_sec or 0
+        self._started_at = 0.0
+        self._last_activity = 0.0
+        self._user_busy = False
+        self._agent_busy = False
+        self._task: Optional[asyncio.Task] = None
+
+        session.on("user_state_changed", self._on_user_state_changed)
+        session.on("agent_state_changed", self._on_agent_state_changed)
+
+    def start(self) -> None:
+        if not self._max_duration and not self._max_silence:
+            return
+        self._started_at = self._last_activity = time.monotonic()
+        self._task = asyncio.create_task(self._run())
+
+    def stop(self) -> None:
+        if self._task and not self._task.done() and self._task is not asyncio.current_task():
+            self._task.cancel()
+
+    def _on_user_state_changed(self, ev: UserStateChangedEvent) -> None:
+        self._user_busy = ev.new_state == "speaking"
+        self._last_activity = time.monotonic()
+
+    def _on_agent_state_changed(self, ev: AgentStateChangedEvent) -> None:
+        self._agent_busy = ev.new_state in ("thinking", "speaking")
+        self._last_activity = time.monotonic()
+
+    def _time_left(self) -> tuple[float, float]:
+        now = time.monotonic()
+        duration_left = (
+            self._started_at + self._max_duration - now if self._max_duration else float("inf")
+        )
+        if not self._max_silence or self._user_busy or self._agent_busy:
+            silence_left = float("inf")
+        else:
+            silence_left = self._last_activity + self._max_silence - now
+        return duration_left, silence_left
+
+    async def _run(self) -> None:
+        while True:
+            duration_left, silence_left = self._time_left()
+            if duration_left <= 0:
+                reason = CallDisconnectReason.MAX_DURATION_REACHED
+                break
+            if silence_left <= 0:
+                reason = CallDisconnectReason.INACTIVITY
+                break
+            # activity only ever moves deadlines later, so waking up early just loops again;
+            # while someone is speaking check back after a full silence period
+            await asyncio.sleep(min(duration_left, silence_left, self._max_silence or duration_left))
+
+        elapsed = time.monotonic() - self._started_at
+        logger.info("Watchdog ending call after %.0fs: %s", elapsed, reason.value)
+        metrics.inc("watchdog_calls_ended_total", reason=reason.value)
+        if reason == CallDisconnectReason.INACTIVITY and self._max_duration:
+            # without the watchdog the call would have held the slot up to the duration limit
+            metrics.inc(
+                "watchdog_reclaimed_seconds_total",
+                max(self._max_duration - elapsed, 0.0),
+                reason=reason.value,
+            )
+        await self._hang_up(reason)
+
+    async def _hang_up(self, reason: CallDisconnectReason) -> None:
+        lines = CLOSING_LINES[reason]
+        line = lines.get(self._agent.language, lines["en"])
+        try:
+            handle = self._session.say(line, allow_interruptions=False)
+            await asyncio.wait_for(handle.wait_for_playout(), CLOSING_LINE_TIMEOUT)
+        except Exception:
+            logger.exception("Failed to play the closing line")
+        self._on_timeout(reason)
+        await self._session.aclose()
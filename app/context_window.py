@@ -0,0 +1,172 @@
+import asyncio
+import time
+from typing import List, Optional, Set
+
+from livekit.agents import llm
+from livekit.agents.metrics import AgentMetrics, LLMMetrics
+
+from . import env
+from .logger import logger
+from .metrics import metrics
+from .providers import build_llm
+from .voice_info import VoiceInfo
+
+SUMMARY_INSTRUCTIONS = (
+    "You maintain a summary of a phone call between a user and a voice agent. Update the "
+    "summary with the new part of the conversation. Keep every fact, name, number, "
+    "request and commitment, and what is still open. Reply with the summary only, in "
+    "short sentences."
+)
+
+# Minutes into the call the prompt size and TTFT are reported by
+CALL_MINUTES = [2, 5, 10, 20]
+
+
+def _is_user_message(item: llm.ChatItem) -> bool:
+    return isinstance(item, llm.ChatMessage) and item.role == "user"
+
+
+def _transcript(items: List[llm.ChatItem]) -> str:
+    lines = []
+    for item in items:
+        if isinstance(item, llm.ChatMessage) and item.text_content:
+            speaker = "User" if item.role == "user" else "Agent"
+            lines.append(f"{speaker}: {item.text_content}")
+        elif isinstance(item, llm.FunctionCall):
+            lines.append(f"Agent called {item.name}({item.arguments})")
+        elif isinstance(item, llm.FunctionCallOutput):
+            lines.append(f"{item.name} returned: {item.output}")
+    return "\n".join(lines)
+
+
+def _minutes_label(elapsed: float) -> str:
+    minutes = elapsed / 60
+    lower = 0
+    for upper in CALL_MINUTES:
+        if minutes < upper:
+            return f"{lower}-{upper}"
+        lower = upper
+    return f"{lower}+"
+
+
+class ContextWindow:
+    """Bounds the chat context sent to the LLM on long calls.
+
+    The system prefix (the instructions) and the last `keep_turns` user turns are
+    sent verbatim. Older turns are folded into a running summary by a separate LLM
+    request in the background, `fold_turns` turns at a time; until the summary
+    covers them they are still sent verbatim, so nothing is ever dropped.
+
+    Also tracks the prompt size and TTFT of the call's replies by how far into the
+    call they came, to see whether they stay flat.
+    """
+
+    def __init__(
+        self,
+        agent: VoiceInfo,
+        *,
+        keep_turns: int = env.CONTEXT_KEEP_TURNS,
+        fold_turns: int = env.CONTEXT_FOLD_TURNS,
+    ) -> None:
+        self._agent = agent
+        self._keep_turns = keep_turns
+        self._fold_turns = max(fold_turns, 1)
+        self._llm: Optional[llm.LLM] = None
+        self._summary = ""
+        self._summarized: Set[str] = set()
+        self._task: Optional[asyncio.Task] = None
+        self._started_at = time.monotonic()
+        self._turns: List[List[float]] = []
+
+    def trim(self, chat_ctx: llm.ChatContext) -> llm.ChatContext:
+        """The context to send: the prefix, the summary and the turns it doesn't cover."""
+        if self._keep_turns <= 0:
+            return chat_ctx
+        items = chat_ctx.items
+        start = 0
+        while (
+            start < len(items)
+            and isinstance(items[start], llm.ChatMessage)
+            and items[start].role in ("system", "developer")
+        ):
+            start += 1
+        prefix, rest = items[:start], items[start:]
+
+        turn_starts = [i for i, item in enumerate(rest) if _is_user_message(item)]
+        if len(turn_starts) > self._keep_turns:
+            old = rest[: turn_starts[-self._keep_turns]]
+            pending = [item for item in old if item.id not in self._summarized]
+            if self._task is None and sum(map(_is_user_message, pending)) >= self._fold_turns:
+                self._task = asyncio.create_task(self._fold(pending))
+
+        if not self._summary:
+            return chat_ctx
+        summary = llm.ChatMessage(
+            role="system",
+            content=[f"Summary of the earlier conversation:\n{self._summary}"],
+        )
+        kept = [item for item in rest if item.id not in self._summarized]
+        return llm.ChatContext(prefix + [summary] + kept)
+
+    async def _fold(self, items: List[llm.ChatItem]) -> None:
+        started_at = time.monotonic()
+        try:
+            if self._llm is None:
+                # its own instance, so its metrics don't count as the call's replies
+                self._llm = build_llm(self._agent)
+            chat_ctx = llm.ChatContext()
+            chat_ctx.add_message(role="system", content=SUMMARY_INSTRUCTIONS)
+            chat_ctx.add_message(
+                role="user",
+                content=(
+                    f"Summary so far:\n{self._summary or '(none)'}\n\n"
+                    f"New part of the conversation:\n{_transcript(items)}"
+                ),
+            )
+            parts = []
+            async with self._llm.chat(chat_ctx=chat_ctx) as stream:
+                async for chunk in stream:
+                    if chunk.delta and chunk.delta.content:
+                        parts.append(chunk.delta.content)
+                    if chunk.usage:
+                        metrics.inc("context_summary_tokens_total", chunk.usage.total_tokens)
+            summary = "".join(parts).strip()
+            if summary:
+                self._summary = summary
+                self._summarized.update(item.id for item in items)
+                turns = sum(map(_is_user_message, items))
+                metrics.inc("context_folded_turns_total", turns)
+                metrics.observe("context_summary_seconds", time.monotonic() - started_at)
+                logger.info("Folded %d turns into the context summary", turns)
+        except Exception:
+            logger.exception("Failed to summarise the conversation")
+        finally:
+            self._task = None
+
+    def collect(self, ev_metrics: AgentMetrics) -> None:
+        if not isinstance(ev_metrics, LLMMetrics) or ev_metrics.cancelled:
+            return
+        elapsed = time.monotonic() - self._started_at
+        minutes = _minutes_label(elapsed)
+        metrics.observe("llm_prompt_tokens", ev_metrics.prompt_tokens, minutes=minutes)
+        metrics.observe("llm_ttft_seconds", ev_metrics.ttft, minutes=minutes)
+        self._turns.append([elapsed, ev_metrics.prompt_tokens, ev_metrics.ttft])
+
+    def report(self) -> None:
+        if self._task:
+            self._task.cancel()
+        if not self._turns:
+            return
+        first, last = self._turns[0], self._turns[-1]
+        logger.info(
+            "Context: %d replies over %.0fs, prompt %d -> %d tokens (max %d), "
+            "ttft %.2fs -> %.2fs, %d summarised items",
+            len(self._turns),
+            last[0],
+            first[1],
+            last[1],
+            max(turn[1] for turn in self._turns),
+            first[2],
+            last[2],
+            len(self._summarized),
+        )
@@ -0,0 +1,345 @@
+import asyncio
+import os
+import time
+from dataclasses import dataclass
+from typing import Dict, List, Optional
+
+from google.protobuf.duration_pb2 import Duration
+from livekit import api
+
+from . import serializer
+from .call_info import CallDisconnectReason, CallInfo, CallStatus
+from .api import get_call_by_id
+from .logger import logger
+from .metrics import metrics
+
+# SIP responses of a failed dial, from the sip_status_code metadata of the Twirp error
+SIP_BUSY_CODES = {"486", "600", "603"}
+SIP_NO_ANSWER_CODES = {"408", "480", "487"}
+
+# Progress statuses, a campaign never dials an entry that reached a final one again
+DIALING = "dialing"
+ANSWERED = "answered"
+ENDED = "ended"
+FAILED = "failed"
+FINAL_STATUSES = (ENDED, FAILED)
+
+# Times a dial rejected because the trunk is at capacity is retried
+MAX_THROTTLED_RETRIES = 5
+
+
+@dataclass
+class CampaignEntry:
+    call_id: str
+    phone_number: str
+    # None uses the agent of the trunk's outbound number
+    agent_id: Optional[str] = None
+
+    @staticmethod
+    def from_json(data: dict):
+        return CampaignEntry(
+            call_id=data["callId"],
+            phone_number=data["phoneNumber"],
+            agent_id=data.get("agentId"),
+        )
+
+
+class TokenBucket:
+    """Allows `rate` acquisitions per second on average with bursts of up to `burst`."""
+
+    def __init__(self, rate: float, burst: int = 1) -> None:
+        self._rate = rate
+        self._burst = burst
+        self._tokens = float(burst)
+        self._updated_at = time.monotonic()
+
+    async def acquire(self) -> None:
+        while True:
+            now = time.monotonic()
+            self._tokens = min(self._burst, self._tokens + (now - self._updated_at) * self._rate)
+            self._updated_at = now
+            if self._tokens >= 1:
+                self._tokens -= 1
+                return
+            await asyncio.sleep((1 - self._tokens) / self._rate)
+
+
+class ProgressLog:
+    """Append-only JSONL record of every entry's status changes.
+
+    Each line is flushed to disk before the dialer moves on, so a campaign that is
+    stopped or crashes resumes from the log without dialing anybody twice.
+    """
+
+    def __init__(self, path: str) -> None:
+        self._path = path
+        self._file = None
+
+    def load(self) -> Dict[str, str]:
+        """Return the last status of every entry in the log."""
+        statuses: Dict[str, str] = {}
+        if not os.path.exists(self._path):
+            return statuses
+        with open(self._path, "rb") as f:
+            for line in f:
+                try:
+                    record = serializer.loads(line)
+                except ValueError:
+                    # last line of a crashed run may be partially written
+                    continue
+                statuses[record["callId"]] = record["status"]
+        return statuses
+
+    def record(self, call_id: str, status: str, **fields) -> None:
+        if self._file is None:
+            self._file = open(self._path, "ab")
+        record = {"callId": call_id, "status": status, "at": int(time.time() * 1000), **fields}
+        self._file.write(serializer.dumps(record) + b"\n")
+        self._file.flush()
+        os.fsync(self._file.fileno())
+
+    def close(self) -> None:
+        if self._file is not None:
+            self._file.close()
+            self._file = None
+
+
+class CampaignDialer:
+    """Places the outbound calls of a campaign through the LiveKit SIP API.
+
+    Every entry gets its own room, the worker is dispatched to it automatically, or
+    explicitly when `agent_name` is set, and picks the call up in `load()` through
+    the callId participant attribute. Dials are paced by a token bucket and at most
+    `max_concurrent` calls are in flight, a call holds its slot from the dial until
+    its room is gone. The limit should be the lower of the trunk's concurrent call
+    limit and the capacity of the workers serving the campaign.
+
+    Args:
+        lkapi: LiveKit API client
+        trunk_id: Outbound SIP trunk to dial through
+        progress: Durable progress of the campaign
+        rate: Dials per second
+        burst: Dials that can be started at once after an idle period
+        max_concurrent: Calls in flight at any time
+        agent_name: Agent to dispatch explicitly, empty for automatic dispatch
+        room_prefix: Prefix of the room names, followed by the call id
+        ringing_timeout: Seconds to let a number ring before giving up
+        poll_interval: Seconds between checks for ended calls
+    """
+
+    def __init__(
+        self,
+        lkapi: api.LiveKitAPI,
+        trunk_id: str,
+        progress: ProgressLog,
+        *,
+        rate: float = 1.0,
+        burst: int = 1,
+        max_concurrent: int = 10,
+        agent_name: str = "",
+        room_prefix: str = "call-",
+        ringing_timeout: float = 30.0,
+        poll_interval: float = 5.0,
+    ) -> None:
+        self._lkapi = lkapi
+        self._trunk_id = trunk_id
+        self._progress = progress
+        self._bucket = TokenBucket(rate, burst)
+        self._slots = asyncio.Semaphore(max_concurrent)
+        self._agent_name = agent_name
+        self._room_prefix = room_prefix
+        self._ringing_timeout = ringing_timeout
+        self._poll_interval = poll_interval
+        # room name -> call id of calls holding a slot
+        self._in_flight: Dict[str, str] = {}
+        self._dials: List[asyncio.Task] = []
+
+    def room_name(self, entry: CampaignEntry) -> str:
+        return f"{self._room_prefix}{entry.call_id}"
+
+    async def run(self, entries: List[CampaignEntry]) -> None:
+        statuses = self._progress.load()
+        pending = []
+        for entry in entries:
+            status = statuses.get(entry.call_id)
+            if status in FINAL_STATUSES:
+                continue
+            if status == DIALING and not await self._resume_dial(entry):
+                continue
+            if status is not None:
+                # dialed by a previous run, its room tells whether the call is still going
+                await self._slots.acquire()
+                self._in_flight[self.room_name(entry)] = entry.call_id
+                continue
+            pending.append(entry)
+        logger.info(
+            "Campaign: %d to dial, %d resumed in flight, %d done",
+            len(pending),
+            len(self._in_flight),
+            len(entries) - len(pending) - len(self._in_flight),
+        )
+
+        watcher = asyncio.create_task(self._watch_rooms())
+        try:
+            for entry in pending:
+                await self._slots.acquire()
+                await self._bucket.acquire()
+                self._dials.append(asyncio.create_task(self._dial(entry)))
+            await asyncio.gather(*self._dials)
+            while self._in_flight:
+                await asyncio.sleep(self._poll_interval)
+        finally:
+            watcher.cancel()
+            self._progress.close()
+            metrics.log()
+
+    async def _dial(self, entry: CampaignEntry) -> None:
+        room = self.room_name(entry)
+        self._progress.record(entry.call_id, DIALING, room=room)
+        metrics.inc("dialer_dials_total")
+        attributes = {"direction": "outbound", "callId": entry.call_id}
+        if entry.agent_id:
+            attributes["agentId"] = entry.agent_id
+
+        for attempt in range(MAX_THROTTLED_RETRIES + 1):
+            try:
+                await self._create_participant(entry, room, attributes)
+                break
+            except api.TwirpError as e:
+                throttled = e.code == api.TwirpErrorCode.RESOURCE_EXHAUSTED
+                if throttled and attempt < MAX_THROTTLED_RETRIES:
+                    # the trunk is over its own limit, wait for calls to end instead of failing
+                    metrics.inc("dialer_throttled_total")
+                    await asyncio.sleep(self._poll_interval * (attempt + 1))
+                    continue
+                error = e
+            except Exception as e:
+                error = e
+
+            self._slots.release()
+            reason = dial_failure_reason(error)
+            logger.warning("Dial %s failed: %s (%s)", entry.call_id, reason.value, error)
+            metrics.inc("dialer_failures_total", reason=reason.value)
+            self._progress.record(entry.call_id, FAILED, reason=reason.value)
+            await self._end_call(entry, reason)
+            return
+
+        metrics.inc("dialer_answered_total")
+        self._progress.record(entry.call_id, ANSWERED)
+        self._in_flight[room] = entry.call_id
+
+    async def _resume_dial(self, entry: CampaignEntry) -> bool:
+        """Settle an entry a previous run stopped while dialing.
+
+        Returns whether its call is in flight. A call the worker never picked up is
+        failed: its dial may still be ringing, so its room is deleted first.
+        """
+        try:
+            call = CallInfo.from_json(await get_call_by_id(entry.call_id))
+        except Exception as e:
+            logger.warning("Failed to check call %s, resuming it in flight: %s", entry.call_id, e)
+            return True
+        if call.call_status == CallStatus.ONGOING:
+            return True
+        if call.call_status == CallStatus.ENDED:
+            self._progress.record(entry.call_id, ENDED)
+            return False
+
+        await self._delete_room(self.room_name(entry))
+        reason = CallDisconnectReason.ERROR_UNKNOWN
+        logger.warning("Dial %s was interrupted, marking it failed", entry.call_id)
+        metrics.inc("dialer_failures_total", reason=reason.value)
+        self._progress.record(entry.call_id, FAILED, reason=reason.value)
+        await self._end_call(entry, reason, call)
+        return False
+
+    async def _create_participant(
+        self, entry: CampaignEntry, room: str, attributes: Dict[str, str]
+    ) -> None:
+        if self._agent_name:
+            await self._lkapi.agent_dispatch.create_dispatch(
+                api.CreateAgentDispatchRequest(
+                    agent_name=self._agent_name,
+                    room=room,
+                    metadata=serializer.dumps_str(attributes),
+                )
+            )
+        try:
+            await self._lkapi.sip.create_sip_participant(
+                api.CreateSIPParticipantRequest(
+                    sip_trunk_id=self._trunk_id,
+                    sip_call_to=entry.phone_number,
+                    room_name=room,
+                    participant_identity=f"sip-{entry.call_id}",
+                    participant_attributes=attributes,
+                    ringing_timeout=Duration(seconds=int(self._ringing_timeout)),
+                    wait_until_answered=True,
+                ),
+                timeout=self._ringing_timeout + 10,
+            )
+        except BaseException:
+            if self._agent_name:
+                # the dispatched job waits for a participant that never joins, and a
+                # retried dial dispatches again
+                await self._delete_room(room)
+            raise
+
+    async def _delete_room(self, room: str) -> None:
+        try:
+            await self._lkapi.room.delete_room(api.DeleteRoomRequest(room=room))
+        except Exception as e:
+            logger.warning("Failed to delete room %s: %s", room, e)
+
+    async def _end_call(
+        self,
+        entry: CampaignEntry,
+        reason: CallDisconnectReason,
+        call: Optional[CallInfo] = None,
+    ) -> None:
+        # the worker never sees a call that wasn't answered, close its record here
+        try:
+            if call is None:
+                call = CallInfo.from_json(await get_call_by_id(entry.call_id))
+            call.call_status = CallStatus.ENDED
+            call.call_disconnect_reason = reason.value
+            await call.update()
+        except Exception:
+            logger.exception("Failed to update call %s", entry.call_id)
+
+    async def _watch_rooms(self) -> None:
+        while True:
+            await asyncio.sleep(self._poll_interval)
+            if not self._in_flight:
+                continue
+            try:
+                res = await self._lkapi.room.list_rooms(
+                    api.ListRoomsRequest(names=list(self._in_flight))
+                )
+            except Exception as e:
+                logger.warning("Failed to list campaign rooms: %s", e)
+                continue
+
+            alive = {room.name for room in res.rooms}
+            for room in [r for r in self._in_flight if r not in alive]:
+                call_id = self._in_flight.pop(room)
+                self._progress.record(call_id, ENDED)
+                self._slots.release()
+            metrics.set("dialer_calls_in_flight", len(self._in_flight))
+
+
+def dial_failure_reason(e: Exception) -> CallDisconnectReason:
+    if isinstance(e, api.TwirpError):
+        sip_status = e.metadata.get("sip_status_code", "")
+        if sip_status in SIP_BUSY_CODES:
+            return CallDisconnectReason.DIAL_BUSY
+        if sip_status in SIP_NO_ANSWER_CODES or e.code == api.TwirpErrorCode.DEADLINE_EXCEEDED:
+            return CallDisconnectReason.DIAL_NO_ANSWER
+    if isinstance(e, asyncio.TimeoutError):
+        return CallDisconnectReason.DIAL_NO_ANSWER
+    return CallDisconnectReason.ERROR_UNKNOWN
+
+
+def load_entries(path: str) -> List[CampaignEntry]:
+    """Read a campaign from a JSONL file of {"callId", "phoneNumber", "agentId"} lines."""
+    with open(path, "rb") as f:
+        return [CampaignEntry.from_json(serializer.loads(line)) for line in f if line.strip()]
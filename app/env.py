@@ -1,4 +1,6 @@
+import json
 import os
+import tempfile
 from typing import cast
 from dotenv import load_dotenv
 load_dotenv()
@@ -12,3 +14,112 @@ if not SERVER_URL:
 if not SERVER_API_KEY:
     raise ValueError("SERVER_API_KEY environment variable is not set")
 
+# Provider plugins to import at worker start instead of on the first call that selects them,
+# comma separated names from app.providers.PLUGINS (e.g. "openai,deepgram,sarvam").
+PRELOAD_PLUGINS = [p.strip() for p in os.getenv("PRELOAD_PLUGINS", "").split(",") if p.strip()]
+
+# Equivalent voices to fail over to when a TTS voice degrades, keyed by "provider:voiceId"
+# or "provider:*", e.g. {"sarvam:anushka": [{"provider": "elevenlabs", "model": "eleven_flash_v2_5",
+# "voiceId": "..."}]}
+TTS_FALLBACK_VOICES = json.loads(os.getenv("TTS_FALLBACK_VOICES") or "{}")
+
+# Play a filler clip when the agent hasn't started speaking this many seconds after the
+# user's turn ended, 0 disables fillers. Agents can override it with fillerAfterInSec.
+FILLER_AFTER_SEC = float(os.getenv("FILLER_AFTER_SEC", "0"))
+FILLER_CACHE_DIR = os.getenv(
+    "FILLER_CACHE_DIR", os.path.join(tempfile.gettempdir(), "urbanchat-fillers")
+)
+
+# Directory of the agents' ambient sounds, named after their ambientSound (e.g.
+# coffee-shop.ogg). URLs and livekit's built-in clips work without it. Decoded sounds
+# are cached in AMBIENT_CACHE_DIR for every job process of the host.
+AMBIENT_SOUND_DIR = os.getenv("AMBIENT_SOUND_DIR", "")
+AMBIENT_CACHE_DIR = os.getenv(
+    "AMBIENT_CACHE_DIR", os.path.join(tempfile.gettempdir(), "urbanchat-ambient")
+)
+
+# Opt-in memory profiling of job processes: "off", "rss" or "tracemalloc"
+MEMORY_PROFILE = os.getenv("MEMORY_PROFILE", "off")
+MEMORY_PROFILE_INTERVAL_SEC = float(os.getenv("MEMORY_PROFILE_INTERVAL_SEC", "30"))
+MEMORY_PROFILE_FRAMES = int(os.getenv("MEMORY_PROFILE_FRAMES", "1"))
+
+# Event loop lag sampling interval, and the duration from which a loop callback counts as
+# blocking (0 disables the detector). The stacks of at most SLOW_CALLBACK_STACKS blocking
+# callbacks are captured per call.
+LOOP_LAG_INTERVAL_SEC = float(os.getenv("LOOP_LAG_INTERVAL_SEC", "0.1"))
+SLOW_CALLBACK_SEC = float(os.getenv("SLOW_CALLBACK_SEC", "0.05"))
+SLOW_CALLBACK_STACKS = int(os.getenv("SLOW_CALLBACK_STACKS", "5"))
+
+# Seconds between RTC stats samples for the per-call network summary, 0 disables it
+NETWORK_STATS_INTERVAL_SEC = float(os.getenv("NETWORK_STATS_INTERVAL_SEC", "5"))
+
+# INFO lines allowed per message template every LOG_RATE_LIMIT_PERIOD_SEC seconds,
+# the rest are dropped and counted on the next line let through. 0 disables the limit.
+LOG_RATE_LIMIT = int(os.getenv("LOG_RATE_LIMIT", "20"))
+LOG_RATE_LIMIT_PERIOD_SEC = float(os.getenv("LOG_RATE_LIMIT_PERIOD_SEC", "10"))
+
+# Name the worker registers with, empty for automatic dispatch to every new room.
+# Campaigns dispatch this agent explicitly when it is set.
+AGENT_NAME = os.getenv("AGENT_NAME", "")
+
+# A/B experiments assigned per call, see app.experiments, e.g.
+# [{"name": "bulbul", "agents": ["<agent id>"], "arms": [{"name": "v1"},
+#   {"name": "v2", "agent": {"ttsModel": "bulbul:v2"}, "session": {"minEndpointingDelay": 0.3}}]}]
+EXPERIMENTS = json.loads(os.getenv("EXPERIMENTS") or "[]")
+
+# Concurrent calls per user and per agent on this host, 0 for no limit. Calls over a
+# limit wait up to CALL_LIMIT_QUEUE_SEC seconds for a slot before being rejected.
+CALL_LIMIT_PER_USER = int(os.getenv("CALL_LIMIT_PER_USER", "0"))
+CALL_LIMIT_PER_AGENT = int(os.getenv("CALL_LIMIT_PER_AGENT", "0"))
+CALL_LIMIT_QUEUE_SEC = float(os.getenv("CALL_LIMIT_QUEUE_SEC", "0"))
+CALL_LIMIT_DIR = os.getenv(
+    "CALL_LIMIT_DIR", os.path.join(tempfile.gettempdir(), "urbanchat-call-limits")
+)
+
+# VAD and endpointing profile of agents that don't pick one with vadProfile, and extra
+# profiles on top of app.vad_profiles.PROFILES, e.g. {"ivr": {"vad": {"activation_threshold":
+# 0.5}, "minEndpointingDelay": 0.4}}
+DEFAULT_VAD_PROFILE = os.getenv("DEFAULT_VAD_PROFILE", "default")
+VAD_PROFILES = json.loads(os.getenv("VAD_PROFILES") or "{}")
+# Tune the endpointing delay of each call to its caller, agents can override it with
+# adaptiveEndpointing
+ADAPTIVE_ENDPOINTING = os.getenv("ADAPTIVE_ENDPOINTING", "0") == "1"
+# Request the reply on the interim transcript once it has been stable for
+# SPECULATIVE_LLM_STABLE_SEC, agents can override it with speculativeLlm
+SPECULATIVE_LLM = os.getenv("SPECULATIVE_LLM", "0") == "1"
+SPECULATIVE_LLM_STABLE_SEC = float(os.getenv("SPECULATIVE_LLM_STABLE_SEC", "0.3"))
+# User turns sent to the LLM verbatim, older ones are folded into a summary
+# CONTEXT_FOLD_TURNS at a time. 0 sends the whole conversation.
+CONTEXT_KEEP_TURNS = int(os.getenv("CONTEXT_KEEP_TURNS", "12"))
+CONTEXT_FOLD_TURNS = int(os.getenv("CONTEXT_FOLD_TURNS", "4"))
+# Answer repeated questions with a stored reply and its audio, agents opt in with
+# responseCache. RESPONSE_CACHE_SIMILARITY above 0 also answers similar questions (cosine
+# similarity of their character trigrams, e.g. 0.9).
+RESPONSE_CACHE = os.getenv("RESPONSE_CACHE", "0") == "1"
+RESPONSE_CACHE_TTL_SEC = float(os.getenv("RESPONSE_CACHE_TTL_SEC", "86400"))
+RESPONSE_CACHE_SIMILARITY = float(os.getenv("RESPONSE_CACHE_SIMILARITY", "0"))
+RESPONSE_CACHE_DIR = os.getenv(
+    "RESPONSE_CACHE_DIR", os.path.join(tempfile.gettempdir(), "urbanchat-responses")
+)
+
+# Sarvam TTS requests of every job process of the host, to stay under the API key's rate
+# limit: SARVAM_RATE requests per second with bursts of SARVAM_BURST, at most
+# SARVAM_MAX_CONCURRENT in flight (0 disables either limit). Greetings and first
+# sentences may use the SARVAM_PRIORITY_RESERVE share of both that other requests leave
+# free. Requests waiting SARVAM_MAX_QUEUE_SEC fail over to the fallback voice.
+SARVAM_RATE = float(os.getenv("SARVAM_RATE", "0"))
+SARVAM_BURST = float(os.getenv("SARVAM_BURST", "10"))
+SARVAM_MAX_CONCURRENT = int(os.getenv("SARVAM_MAX_CONCURRENT", "0"))
+SARVAM_PRIORITY_RESERVE = float(os.getenv("SARVAM_PRIORITY_RESERVE", "0.2"))
+SARVAM_MAX_QUEUE_SEC = float(os.getenv("SARVAM_MAX_QUEUE_SEC", "5"))
+SARVAM_GOVERNOR_DIR = os.getenv(
+    "SARVAM_GOVERNOR_DIR", os.path.join(tempfile.gettempdir(), "urbanchat-sarvam")
+)
+
+# Seconds the backend requests of call setup may take together, each endpoint gets a
+# share of it (see app.api). Call updates happen off the setup path and get their own.
+API_SETUP_BUDGET_SEC = float(os.getenv("API_SETUP_BUDGET_SEC", "8"))
+API_UPDATE_TIMEOUT_SEC = float(os.getenv("API_UPDATE_TIMEOUT_SEC", "10"))
+API_CACHE_DIR = os.getenv(
+    "API_CACHE_DIR", os.path.join(tempfile.gettempdir(), "urbanchat-api-cache")
+)
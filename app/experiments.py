@@ -0,0 +1,226 @@
+import dataclasses
+import hashlib
+import inspect
+import time
+from dataclasses import dataclass, field
+from enum import Enum
+from typing import Any, Dict, List, Optional, Tuple
+
+from livekit.agents import AgentSession
+from livekit.agents.metrics import AgentMetrics, EOUMetrics, LLMMetrics, TTSMetrics
+from livekit.agents.voice.events import AgentStateChangedEvent, UserStateChangedEvent
+
+from . import env, serializer
+from .logger import logger
+from .metrics import metrics
+from .providers import load_plugin
+from .voice_info import VoiceInfo
+from utils import camel_to_snake
+
+
+@dataclass
+class Arm:
+    name: str
+    weight: float = 1.0
+    # VoiceInfo fields in the agent API's camelCase, e.g. {"ttsModel": "bulbul:v2"}
+    agent: Dict[str, Any] = field(default_factory=dict)
+    # AgentSession arguments, e.g. {"minEndpointingDelay": 0.3}
+    session: Dict[str, Any] = field(default_factory=dict)
+    # silero VAD.load arguments, e.g. {"minSilenceDuration": 0.2}
+    vad: Dict[str, Any] = field(default_factory=dict)
+
+    @staticmethod
+    def from_json(data: dict):
+        return Arm(
+            name=data["name"],
+            weight=data.get("weight", 1.0),
+            agent=data.get("agent", {}),
+            session=data.get("session", {}),
+            vad=data.get("vad", {}),
+        )
+
+
+@dataclass
+class Experiment:
+    name: str
+    arms: List[Arm]
+    # agent ids the experiment runs on, None for every agent
+    agents: Optional[List[str]] = None
+
+    @staticmethod
+    def from_json(data: dict):
+        return Experiment(
+            name=data["name"],
+            arms=[Arm.from_json(arm) for arm in data["arms"]],
+            agents=data.get("agents"),
+        )
+
+    def applies_to(self, agent: VoiceInfo) -> bool:
+        return self.agents is None or agent.id in self.agents
+
+    def assign(self, call_id: str) -> Arm:
+        """Pick the arm of a call, the same call id always gets the same arm."""
+        digest = hashlib.sha1(f"{self.name}:{call_id}".encode()).digest()
+        point = int.from_bytes(digest[:8], "big") / 2**64 * sum(a.weight for a in self.arms)
+        for arm in self.arms:
+            point -= arm.weight
+            if point < 0:
+                return arm
+        return self.arms[-1]
+
+
+# AgentSession arguments main.py sets itself, an arm can't override them
+_SESSION_COMPONENTS = {"self", "stt", "llm", "tts", "vad", "userdata", "loop"}
+
+_experiments: Optional[List[Experiment]] = None
+
+
+def _unknown_options(experiment: Experiment) -> List[str]:
+    known = {
+        "agent": {f.name for f in dataclasses.fields(VoiceInfo)},
+        "session": set(inspect.signature(AgentSession.__init__).parameters)
+        - _SESSION_COMPONENTS,
+        "vad": set(inspect.signature(load_plugin("silero").VAD.load).parameters),
+    }
+    unknown = []
+    for arm in experiment.arms:
+        for kind, options in (("agent", arm.agent), ("session", arm.session), ("vad", arm.vad)):
+            unknown += [
+                f"{arm.name}.{kind}.{key}"
+                for key in options
+                if camel_to_snake(key) not in known[kind]
+            ]
+    return unknown
+
+
+def load_experiments() -> List[Experiment]:
+    """The experiments of EXPERIMENTS, without the ones that set unknown options.
+
+    An unknown option would fail every call of its arm, so the whole experiment is
+    left out and its calls get the agent's own configuration.
+    """
+    global _experiments
+    if _experiments is None:
+        _experiments = []
+        for data in env.EXPERIMENTS:
+            experiment = Experiment.from_json(data)
+            unknown = _unknown_options(experiment)
+            if unknown:
+                logger.error(
+                    "Experiment %s disabled, unknown options: %s",
+                    experiment.name,
+                    ", ".join(unknown),
+                )
+                continue
+            _experiments.append(experiment)
+    return _experiments
+
+
+def _snake_case(options: Dict[str, Any]) -> Dict[str, Any]:
+    return {camel_to_snake(k): v for k, v in options.items()}
+
+
+@dataclass
+class Assignment:
+    """The arms a call was assigned to and the configuration they add up to."""
+
+    arms: Dict[str, str] = field(default_factory=dict)
+    session_options: Dict[str, Any] = field(default_factory=dict)
+    vad_options: Dict[str, Any] = field(default_factory=dict)
+
+    @property
+    def label(self) -> str:
+        """Metrics label of the assignment, e.g. "bulbul:v2|endpointing:control".
+
+        Without "," and "=", which separate the labels of a metrics key.
+        """
+        return "|".join(f"{e}:{a}" for e, a in sorted(self.arms.items())) or "none"
+
+
+def _apply_overrides(agent: VoiceInfo, overrides: Dict[str, Any]) -> VoiceInfo:
+    fields = {f.name: f for f in dataclasses.fields(VoiceInfo)}
+    changes = {}
+    for name, value in _snake_case(overrides).items():
+        if name not in fields:
+            raise ValueError(f"Unknown agent field in experiment: {name}")
+        field_type = fields[name].type
+        if isinstance(field_type, type) and issubclass(field_type, Enum):
+            value = field_type(value)
+        changes[name] = value
+    return dataclasses.replace(agent, **changes)
+
+
+def assign(
+    call_id: str,
+    agent: VoiceInfo,
+    experiments: Optional[List[Experiment]] = None,
+) -> Tuple[VoiceInfo, Assignment]:
+    """Assign a call to one arm of every experiment that runs on its agent and
+    return the agent with the arms' overrides applied.
+
+    Experiments should not override the same settings, later ones win if they do.
+    """
+    assignment = Assignment()
+    for experiment in load_experiments() if experiments is None else experiments:
+        if not experiment.applies_to(agent):
+            continue
+        arm = experiment.assign(call_id)
+        assignment.arms[experiment.name] = arm.name
+        agent = _apply_overrides(agent, arm.agent)
+        assignment.session_options.update(_snake_case(arm.session))
+        assignment.vad_options.update(_snake_case(arm.vad))
+        metrics.inc("experiment_calls_total", experiment=experiment.name, arm=arm.name)
+    if assignment.arms:
+        logger.info("Experiment arms: %s", assignment.label)
+    return agent, assignment
+
+
+class TurnLatencyTracker:
+    """Per-call latency of the assigned arms, stored on the call record.
+
+    Collects EOU delay, LLM TTFT, TTS TTFB and the end-to-end turn latency, from the
+    user going quiet to the agent starting to speak. Calls are the unit of analysis
+    (turns of a call aren't independent), so the summary holds per-call means.
+    """
+
+    def __init__(self, session: AgentSession, assignment: Assignment) -> None:
+        self._assignment = assignment
+        self._samples: Dict[str, List[float]] = {"eou": [], "ttft": [], "ttfb": [], "e2e": []}
+        self._user_stopped_at = 0.0
+
+        session.on("user_state_changed", self._on_user_state_changed)
+        session.on("agent_state_changed", self._on_agent_state_changed)
+
+    def collect(self, ev_metrics: AgentMetrics) -> None:
+        if isinstance(ev_metrics, EOUMetrics):
+            self._add("eou", ev_metrics.end_of_utterance_delay)
+        elif isinstance(ev_metrics, LLMMetrics):
+            self._add("ttft", ev_metrics.ttft)
+        elif isinstance(ev_metrics, TTSMetrics) and ev_metrics.ttfb >= 0:
+            self._add("ttfb", ev_metrics.ttfb)
+
+    def _add(self, name: str, value: float) -> None:
+        self._samples[name].append(value)
+        metrics.observe(f"experiment_{name}_seconds", value, arms=self._assignment.label)
+
+    def _on_user_state_changed(self, ev: UserStateChangedEvent) -> None:
+        if ev.old_state == "speaking" and ev.new_state != "speaking":
+            self._user_stopped_at = time.monotonic()
+        elif ev.new_state == "speaking":
+            self._user_stopped_at = 0.0
+
+    def _on_agent_state_changed(self, ev: AgentStateChangedEvent) -> None:
+        if ev.new_state == "speaking" and self._user_stopped_at:
+            self._add("e2e", time.monotonic() - self._user_stopped_at)
+            self._user_stopped_at = 0.0
+
+    def summary(self) -> Optional[str]:
+        """Compact JSON of the arms and the call's mean latencies in seconds."""
+        if not self._assignment.arms:
+            return None
+        summary: Dict[str, Any] = {"arms": self._assignment.arms}
+        for name, samples in self._samples.items():
+            if samples:
+                summary[name] = round(sum(samples) / len(samples), 3)
+        summary["turns"] = len(self._samples["e2e"])
+        return serializer.dumps_str(summary)
@@ -0,0 +1,200 @@
+import asyncio
+import hashlib
+import os
+import random
+import time
+import wave
+from typing import AsyncIterator, Dict, List, Optional
+
+from livekit import rtc
+from livekit.agents import AgentSession
+from livekit.agents.voice.background_audio import BackgroundAudioPlayer, PlayHandle
+from livekit.agents.voice.events import AgentStateChangedEvent, UserStateChangedEvent
+
+from . import env
+from .logger import logger
+from .metrics import metrics
+from .providers import create_tts
+from .tts_router import TTSRoute
+from .voice_info import VoiceInfo
+
+FILLER_PHRASES = {
+    "hi": ["हम्म", "एक सेकंड"],
+    "en": ["Hmm", "One moment"],
+}
+
+# BackgroundAudioPlayer mixes at 48kHz mono
+CLIP_SAMPLE_RATE = 48000
+CLIP_FRAME_SAMPLES = CLIP_SAMPLE_RATE // 50  # 20ms
+
+# Decoded clips shared by every call handled by this process
+_clips: Dict[str, bytes] = {}
+
+
+def _clip_key(route: TTSRoute, agent: VoiceInfo, text: str) -> str:
+    parts = [route.provider.value, route.model, route.voice_id, agent.language, agent.tts_speed]
+    key = "|".join(map(str, parts + [text]))
+    return hashlib.sha1(key.encode()).hexdigest()
+
+
+def _read_wav(path: str) -> bytes:
+    with wave.open(path, "rb") as wf:
+        return wf.readframes(wf.getnframes())
+
+
+def _write_wav(path: str, pcm: bytes) -> None:
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    tmp_path = f"{path}.{os.getpid()}.tmp"
+    with wave.open(tmp_path, "wb") as wf:
+        wf.setnchannels(1)
+        wf.setsampwidth(2)
+        wf.setframerate(CLIP_SAMPLE_RATE)
+        wf.writeframes(pcm)
+    # another job process may be writing the same clip, the rename makes it atomic
+    os.replace(tmp_path, path)
+
+
+async def load_clip(route: TTSRoute, agent: VoiceInfo, text: str) -> bytes:
+    """Return the 48kHz PCM of a filler phrase, synthesising it on first use.
+
+    Clips are cached in memory and in FILLER_CACHE_DIR, so a phrase is only ever
+    synthesised once per host and voice.
+    """
+    key = _clip_key(route, agent, text)
+    pcm = _clips.get(key)
+    if pcm is not None:
+        return pcm
+
+    path = os.path.join(env.FILLER_CACHE_DIR, f"{key}.wav")
+    if os.path.exists(path):
+        pcm = await asyncio.to_thread(_read_wav, path)
+    else:
+        # a dedicated TTS instance keeps this synthesis out of the call's usage metrics
+        tts = create_tts(route, agent)
+        try:
+            frame = await tts.synthesize(text).collect()
+        finally:
+            await tts.aclose()
+
+        resampler = rtc.AudioResampler(input_rate=frame.sample_rate, output_rate=CLIP_SAMPLE_RATE)
+        frames = resampler.push(frame) + resampler.flush()
+        pcm = b"".join(bytes(f.data) for f in frames)
+        await asyncio.to_thread(_write_wav, path, pcm)
+        logger.info("Filler clip cached: %r (%.2fs)", text, len(pcm) / 2 / CLIP_SAMPLE_RATE)
+
+    _clips[key] = pcm
+    return pcm
+
+
+async def _clip_frames(pcm: bytes) -> AsyncIterator[rtc.AudioFrame]:
+    # small frames, so stopping the clip cuts it within a frame
+    step = CLIP_FRAME_SAMPLES * 2
+    for i in range(0, len(pcm), step):
+        chunk = pcm[i : i + step]
+        yield rtc.AudioFrame(
+            data=chunk,
+            sample_rate=CLIP_SAMPLE_RATE,
+            num_channels=1,
+            samples_per_channel=len(chunk) // 2,
+        )
+
+
+class FillerPlayer:
+    """Masks long response latency with short filler clips in the agent's voice.
+
+    After the user's turn ends and the agent starts thinking, a clip is played if the
+    agent hasn't started speaking within the agent's filler threshold. The clip is
+    stopped as soon as the real reply starts or the user speaks again.
+    """
+
+    def __init__(
+        self,
+        session: AgentSession,
+        agent: VoiceInfo,
+        player: BackgroundAudioPlayer,
+    ) -> None:
+        self._session = session
+        self._agent = agent
+        self._player = player
+        self._threshold = (
+            agent.filler_after_in_sec
+            if agent.filler_after_in_sec is not None
+            else env.FILLER_AFTER_SEC
+        )
+        self._phrases = agent.filler_phrases or FILLER_PHRASES.get(agent.language, [])
+        self._clips: List[bytes] = []
+        self._last_clip: Optional[bytes] = None
+        self._user_turn_ended = False
+        self._thinking_at = 0.0
+        self._played_at = 0.0
+        self._timer: Optional[asyncio.TimerHandle] = None
+        self._handle: Optional[PlayHandle] = None
+
+    @property
+    def enabled(self) -> bool:
+        return self._threshold > 0 and bool(self._phrases)
+
+    async def start(self) -> None:
+        if not self.enabled:
+            return
+
+        route = TTSRoute(self._agent.tts_provider, self._agent.tts_model, self._agent.tts_voice_id)
+        for phrase in self._phrases:
+            try:
+                self._clips.append(await load_clip(route, self._agent, phrase))
+            except Exception:
+                logger.exception("Failed to load filler clip %r", phrase)
+
+        if self._clips:
+            self._session.on("user_state_changed", self._on_user_state_changed)
+            self._session.on("agent_state_changed", self._on_agent_state_changed)
+
+    def stop(self) -> None:
+        if self._clips:
+            self._session.off("user_state_changed", self._on_user_state_changed)
+            self._session.off("agent_state_changed", self._on_agent_state_changed)
+        self._clips = []
+        self._cancel()
+
+    def _on_user_state_changed(self, ev: UserStateChangedEvent) -> None:
+        if ev.new_state == "speaking":
+            self._user_turn_ended = False
+            self._cancel()
+        elif ev.old_state == "speaking":
+            self._user_turn_ended = True
+
+    def _on_agent_state_changed(self, ev: AgentStateChangedEvent) -> None:
+        if ev.new_state == "thinking" and self._user_turn_ended:
+            self._user_turn_ended = False
+            self._thinking_at = time.monotonic()
+            self._played_at = 0.0
+            metrics.inc("filler_turns_total")
+            self._timer = asyncio.get_running_loop().call_later(self._threshold, self._play)
+        elif ev.new_state != "thinking":
+            if ev.new_state == "speaking" and self._played_at:
+                # the caller heard the filler instead of silence until the reply started
+                metrics.observe("filler_latency_masked_seconds", time.monotonic() - self._played_at)
+            self._cancel()
+
+    def _play(self) -> None:
+        self._timer = None
+        choices = [c for c in self._clips if c is not self._last_clip] or self._clips
+        self._last_clip = random.choice(choices)
+        self._played_at = time.monotonic()
+        try:
+            self._handle = self._player.play(_clip_frames(self._last_clip))
+        except Exception:
+            logger.exception("Failed to play filler clip")
+            self._played_at = 0.0
+            return
+        metrics.inc("filler_played_total")
+        metrics.observe("filler_delay_seconds", self._played_at - self._thinking_at)
+
+    def _cancel(self) -> None:
+        if self._timer:
+            self._timer.cancel()
+            self._timer = None
+        if self._handle:
+            self._handle.stop()
+            self._handle = None
+        self._played_at = 0.0
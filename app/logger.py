@@ -1,3 +1,136 @@
+import atexit
+import contextvars
 import logging
-logger = logging.getLogger("@@-----@@")
-logger.setLevel(logging.INFO)
\ No newline at end of file
+import logging.handlers
+import os
+import queue
+import threading
+import time
+from typing import Dict, Optional, Tuple
+
+from . import env
+
+# Fields of the call being handled, added to every record logged from its tasks
+_call_context: contextvars.ContextVar[Dict[str, str]] = contextvars.ContextVar(
+    "call_context", default={}
+)
+
+
+def set_call_context(**fields: Optional[str]) -> None:
+    """Add fields (e.g. callId, agentId) to every record logged from the current task
+    and the tasks it creates afterwards."""
+    context = dict(_call_context.get())
+    context.update({k: v for k, v in fields.items() if v is not None})
+    _call_context.set(context)
+
+
+class RateLimitFilter(logging.Filter):
+    """Lets through at most `rate` INFO and lower records per message template every
+    `period` seconds. The next record let through reports how many were suppressed.
+
+    Templates are the unformatted `record.msg`, so lines must use lazy %-formatting
+    to be limited per line rather than per value.
+    """
+
+    def __init__(self, rate: int, period: float = 10.0) -> None:
+        super().__init__()
+        self._rate = rate
+        self._period = period
+        # template -> (window start, records in window, suppressed since last let through)
+        self._windows: Dict[Tuple[str, str], Tuple[float, int, int]] = {}
+        self._lock = threading.Lock()
+
+    def filter(self, record: logging.LogRecord) -> bool:
+        if self._rate <= 0 or record.levelno > logging.INFO:
+            return True
+
+        key = (record.name, str(record.msg))
+        now = time.monotonic()
+        with self._lock:
+            start, count, suppressed = self._windows.get(key, (now, 0, 0))
+            if now - start >= self._period:
+                start, count = now, 0
+            if count >= self._rate:
+                self._windows[key] = (start, count, suppressed + 1)
+                return False
+            self._windows[key] = (start, count + 1, 0)
+
+        if suppressed:
+            record.suppressed = suppressed
+        return True
+
+
+class OffloopHandler(logging.handlers.QueueHandler):
+    """Hands records to a background thread that formats them and passes them to the
+    root handlers, so the event loop only pays for creating the record.
+
+    Formatting happens later on the thread, log immutable values only. When the queue
+    is full records are dropped and counted rather than blocking the loop.
+    """
+
+    def __init__(self, maxsize: int = 10000) -> None:
+        super().__init__(queue.Queue(maxsize))
+        self._maxsize = maxsize
+        self._listener: Optional[logging.handlers.QueueListener] = None
+        self._pid = 0
+        self._lock = threading.Lock()
+        self.dropped = 0
+
+    def _ensure_listener(self) -> None:
+        # job processes may be forked from the worker, threads don't survive the fork
+        if self._pid == os.getpid():
+            return
+        with self._lock:
+            if self._pid == os.getpid():
+                return
+            self.queue = queue.Queue(self._maxsize)
+            self._listener = logging.handlers.QueueListener(self.queue, _RootForwarder())
+            self._listener.start()
+            self._pid = os.getpid()
+            atexit.register(self._listener.stop)
+
+    def prepare(self, record: logging.LogRecord) -> logging.LogRecord:
+        # unlike QueueHandler, keep msg/args as they are so formatting stays lazy
+        for name, value in _call_context.get().items():
+            setattr(record, name, value)
+        return record
+
+    def enqueue(self, record: logging.LogRecord) -> None:
+        self._ensure_listener()
+        try:
+            self.queue.put_nowait(record)
+        except queue.Full:
+            self.dropped += 1
+
+
+class _RootForwarder(logging.Handler):
+    def handle(self, record: logging.LogRecord) -> bool:
+        root = logging.getLogger()
+        if record.levelno >= root.getEffectiveLevel():
+            root.callHandlers(record)
+        return True
+
+
+_handler = OffloopHandler()
+_handler.addFilter(RateLimitFilter(env.LOG_RATE_LIMIT, env.LOG_RATE_LIMIT_PERIOD_SEC))
+
+
+def dropped_records() -> int:
+    """Records dropped by this process because the logging queue was full."""
+    return _handler.dropped
+
+
+def route_offloop(name: str) -> logging.Logger:
+    """Send the records of logger `name` through the off-loop handler."""
+    lg = logging.getLogger(name)
+    if _handler not in lg.handlers:
+        lg.addHandler(_handler)
+        lg.propagate = False
+    return lg
+
+
+logger = route_offloop("@@-----@@")
+logger.setLevel(logging.INFO)
+# the TTS plugins log per request from inside their streams
+route_offloop("sarvam")
+route_offloop("smallest")
@@ -0,0 +1,173 @@
+import asyncio
+import sys
+import threading
+import time
+import traceback
+from typing import Dict, List, Optional, Tuple
+
+from . import env, serializer
+from .logger import logger
+from .metrics import metrics
+from .network_stats import RollingStat
+
+_original_run = asyncio.events.Handle._run
+# the monitor of the loop running in this thread, `console` runs a job per thread
+_local = threading.local()
+# monitors that timed callbacks, Handle._run is patched while there are any
+_patches = 0
+_patches_lock = threading.Lock()
+
+
+def _timed_run(self: asyncio.Handle) -> None:
+    monitor = getattr(_local, "monitor", None)
+    if monitor is None:
+        _original_run(self)
+        return
+    monitor._run_number += 1
+    run_number = monitor._run_number
+    started_at = time.perf_counter()
+    monitor._running = (started_at, run_number)
+    try:
+        _original_run(self)
+    finally:
+        monitor._running = None
+        duration = time.perf_counter() - started_at
+        if duration >= monitor.slow_callback:
+            monitor._on_slow_callback(self, duration, run_number)
+
+
+def _callback_frames(frame):
+    # innermost first, the blocking call is at the top, up to the loop's own frames
+    while frame is not None and frame.f_code is not _original_run.__code__:
+        yield frame, frame.f_lineno
+        frame = frame.f_back
+
+
+def _describe(handle: asyncio.Handle) -> str:
+    callback = handle._callback
+    owner = getattr(callback, "__self__", None)
+    if isinstance(owner, asyncio.Task):
+        # a step of a task, name it after the task's coroutine
+        coro = owner.get_coro()
+        return f"task {getattr(coro, '__qualname__', repr(coro))}"
+    return getattr(callback, "__qualname__", None) or repr(callback)
+
+
+class LoopMonitor:
+    """Measures how long the job's event loop is blocked.
+
+    The lag of a `interval` seconds sleep is sampled for the whole call. Every loop
+    callback is timed, one running `slow_callback` seconds or more is counted against
+    its name (the coroutine of a task, or the function). A watchdog thread captures
+    the stack of the loop's thread while such a callback is still running, for at
+    most `max_stacks` callbacks per call; timing itself costs two clock reads per
+    callback.
+    """
+
+    def __init__(
+        self,
+        *,
+        interval: float = env.LOOP_LAG_INTERVAL_SEC,
+        slow_callback: float = env.SLOW_CALLBACK_SEC,
+        max_stacks: int = env.SLOW_CALLBACK_STACKS,
+    ) -> None:
+        self.slow_callback = slow_callback
+        self._interval = interval
+        self._max_stacks = max_stacks
+        self._lag = RollingStat()
+        self._slow: Dict[str, List[float]] = {}
+        self._stacks: Dict[int, str] = {}
+        self._task: Optional[asyncio.Task] = None
+        self._watchdog: Optional[threading.Thread] = None
+        self._stopped = threading.Event()
+        self._timing = False
+        # the callback running now: (start time, run number)
+        self._running: Optional[Tuple[float, int]] = None
+        self._run_number = 0
+
+    def start(self) -> None:
+        global _patches
+        self._task = asyncio.create_task(self._run())
+        if self.slow_callback <= 0:
+            return
+        _local.monitor = self
+        self._timing = True
+        with _patches_lock:
+            _patches += 1
+            asyncio.events.Handle._run = _timed_run
+        if self._max_stacks > 0:
+            self._watchdog = threading.Thread(
+                target=self._watch,
+                args=(threading.get_ident(),),
+                name="loop-monitor",
+                daemon=True,
+            )
+            self._watchdog.start()
+
+    def stop(self) -> None:
+        global _patches
+        if self._task:
+            self._task.cancel()
+            self._task = None
+        if self._timing:
+            self._timing = False
+            if getattr(_local, "monitor", None) is self:
+                _local.monitor = None
+            with _patches_lock:
+                _patches -= 1
+                if not _patches:
+                    asyncio.events.Handle._run = _original_run
+        self._stopped.set()
+
+    async def _run(self) -> None:
+        loop = asyncio.get_running_loop()
+        while True:
+            expected = loop.time() + self._interval
+            await asyncio.sleep(self._interval)
+            lag = max(loop.time() - expected, 0.0)
+            self._lag.add(lag)
+            metrics.observe("event_loop_lag_seconds", lag)
+
+    def _watch(self, loop_thread: int) -> None:
+        while not self._stopped.wait(self.slow_callback / 2):
+            running = self._running
+            if running is None or len(self._stacks) >= self._max_stacks:
+                continue
+            started_at, run_number = running
+            if run_number in self._stacks or time.perf_counter() - started_at < self.slow_callback:
+                continue
+            frame = sys._current_frames().get(loop_thread)
+            if frame is not None:
+                stack = traceback.StackSummary.extract(_callback_frames(frame), limit=12)
+                self._stacks[run_number] = "".join(stack.format())
+
+    def _on_slow_callback(self, handle: asyncio.Handle, duration: float, run_number: int) -> None:
+        name = _describe(handle)
+        stats = self._slow.setdefault(name, [0, 0.0, 0.0])
+        stats[0] += 1
+        stats[1] += duration
+        stats[2] = max(stats[2], duration)
+        metrics.inc("slow_callbacks_total")
+        metrics.observe("slow_callback_seconds", duration)
+
+        stack = self._stacks.get(run_number)
+        if stack is not None:
+            logger.warning(
+                "Slow callback %s blocked the loop for %.0fms at:\n%s",
+                name,
+                duration * 1000,
+                stack,
+            )
+        else:
+            logger.info("Slow callback %s blocked the loop for %.0fms", name, duration * 1000)
+
+    def summary(self) -> str:
+        """Compact JSON summary of the call: lag [mean, p90, max] and slow callbacks in ms."""
+        top = sorted(self._slow.items(), key=lambda item: item[1][1], reverse=True)[:5]
+        summary = {
+            "lag": self._lag.summary(scale=1000),
+            "slow": sum(int(stats[0]) for stats in self._slow.values()),
+            "blocked": round(sum(stats[1] for stats in self._slow.values()) * 1000),
+            "top": [[name, int(count), round(longest * 1000)] for name, (count, _, longest) in top],
+        }
+        return serializer.dumps_str(summary)
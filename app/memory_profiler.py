@@ -0,0 +1,123 @@
+import asyncio
+import resource
+import sys
+import tracemalloc
+from typing import List, Optional, Tuple
+
+import psutil
+
+from . import env, serializer
+from .logger import logger
+from .metrics import metrics
+
+MB = 1024 * 1024
+
+
+def rss_bytes() -> int:
+    return psutil.Process().memory_info().rss
+
+
+def peak_rss_bytes() -> int:
+    """High-water mark of the process RSS, free to read at any time."""
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # kilobytes on Linux, bytes on macOS
+    return peak if sys.platform == "darwin" else peak * 1024
+
+
+class MemoryProfiler:
+    """Per-job memory usage, summarised on the call record next to `latency`.
+
+    The peak RSS is always reported, it is read once from the kernel at the end of
+    the call. MEMORY_PROFILE enables periodic sampling every
+    MEMORY_PROFILE_INTERVAL_SEC seconds:
+
+    - "rss": samples the RSS to see how it grows over the call
+    - "tracemalloc": also traces Python allocations and attributes the growth since
+      the start of the call to the source lines that allocated it. Tracing slows
+      allocations down noticeably, use it on a few workers only.
+    """
+
+    def __init__(
+        self,
+        mode: str = env.MEMORY_PROFILE,
+        interval: float = env.MEMORY_PROFILE_INTERVAL_SEC,
+        top: int = 5,
+    ) -> None:
+        self._mode = mode
+        self._interval = interval
+        self._top = top
+        self._task: Optional[asyncio.Task] = None
+        self._rss_start = 0
+        self._rss_max = 0
+        self._baseline: Optional[tracemalloc.Snapshot] = None
+        self._top_allocators: List[Tuple[str, int]] = []
+
+    def start(self) -> None:
+        self._rss_start = self._rss_max = rss_bytes()
+        if self._mode == "tracemalloc":
+            if not tracemalloc.is_tracing():
+                tracemalloc.start(env.MEMORY_PROFILE_FRAMES)
+            self._baseline = tracemalloc.take_snapshot()
+        if self._mode in ("rss", "tracemalloc"):
+            self._task = asyncio.create_task(self._run())
+
+    def stop(self) -> None:
+        if self._task:
+            self._task.cancel()
+            self._task = None
+            self._sample_rss()
+        if self._baseline is not None:
+            self._top_allocators = self._attribute(tracemalloc.take_snapshot())
+            self._baseline = None
+
+    async def _run(self) -> None:
+        while True:
+            await asyncio.sleep(self._interval)
+            rss = self._sample_rss()
+            logger.info("memory: rss %.1fMB (start %.1fMB)", rss / MB, self._rss_start / MB)
+            if self._baseline is not None:
+                snapshot = await asyncio.to_thread(tracemalloc.take_snapshot)
+                self._top_allocators = self._attribute(snapshot)
+                for where, size in self._top_allocators:
+                    logger.info("memory: %+.0fKB %s", size / 1024, where)
+
+    def _sample_rss(self) -> int:
+        rss = rss_bytes()
+        self._rss_max = max(self._rss_max, rss)
+        return rss
+
+    def _attribute(self, snapshot: tracemalloc.Snapshot) -> List[Tuple[str, int]]:
+        snapshot = snapshot.filter_traces(
+            [
+                tracemalloc.Filter(False, tracemalloc.__file__),
+                tracemalloc.Filter(False, "<frozen *>"),
+            ]
+        )
+        stats = snapshot.compare_to(self._baseline, "lineno")
+        top = []
+        for stat in stats[: self._top]:
+            if stat.size_diff <= 0:
+                break
+            frame = stat.traceback[0]
+            # package/module.py is enough to find the line and keeps the summary short
+            filename = "/".join(frame.filename.split("/")[-2:])
+            top.append((f"{filename}:{frame.lineno}", stat.size_diff))
+        return top
+
+    def summary(self) -> str:
+        """Compact JSON summary of the call, sizes in MB."""
+        rss_end = rss_bytes()
+        rss_peak = peak_rss_bytes()
+        metrics.set("process_rss_bytes", rss_end)
+        metrics.set("process_rss_peak_bytes", rss_peak)
+
+        summary = {
+            "rssStart": round(self._rss_start / MB, 1),
+            "rssEnd": round(rss_end / MB, 1),
+            "rssPeak": round(rss_peak / MB, 1),
+        }
+        if self._mode in ("rss", "tracemalloc"):
+            summary["rssSampledMax"] = round(max(self._rss_max, rss_end) / MB, 1)
+        if self._top_allocators:
+            summary["top"] = [[where, round(size / MB, 2)] for where, size in self._top_allocators]
+        return serializer.dumps_str(summary)
@@ -0,0 +1,67 @@
+from dataclasses import dataclass
+from typing import Dict
+
+from .logger import dropped_records, logger
+
+
+@dataclass
+class Summary:
+    count: int = 0
+    total: float = 0.0
+    max: float = 0.0
+
+    def observe(self, value: float) -> None:
+        self.count += 1
+        self.total += value
+        if value > self.max:
+            self.max = value
+
+
+class Metrics:
+    """Process-wide counters, gauges and summaries.
+
+    Each job process keeps its own registry, it is logged as one line at the end of
+    every call so the numbers can be scraped from the worker logs.
+    """
+
+    def __init__(self) -> None:
+        self._counters: Dict[str, float] = {}
+        self._gauges: Dict[str, float] = {}
+        self._summaries: Dict[str, Summary] = {}
+
+    @staticmethod
+    def _key(name: str, labels: dict) -> str:
+        if not labels:
+            return name
+        return name + "{" + ",".join(f"{k}={v}" for k, v in sorted(labels.items())) + "}"
+
+    def inc(self, name: str, value: float = 1.0, **labels) -> None:
+        key = self._key(name, labels)
+        self._counters[key] = self._counters.get(key, 0.0) + value
+
+    def set(self, name: str, value: float, **labels) -> None:
+        self._gauges[self._key(name, labels)] = value
+
+    def observe(self, name: str, value: float, **labels) -> None:
+        key = self._key(name, labels)
+        summary = self._summaries.get(key)
+        if summary is None:
+            summary = self._summaries[key] = Summary()
+        summary.observe(value)
+
+    def snapshot(self) -> Dict[str, float]:
+        result = dict(self._counters)
+        result.update(self._gauges)
+        for key, summary in self._summaries.items():
+            result[f"{key}:count"] = summary.count
+            result[f"{key}:sum"] = round(summary.total, 4)
+            result[f"{key}:max"] = round(summary.max, 4)
+        return result
+
+    def log(self) -> None:
+        self.set("log_records_dropped", dropped_records())
+        # the snapshot is a copy, it is serialised on the logging thread
+        logger.info("metrics", extra={"metrics": self.snapshot()})
+
+
+metrics = Metrics()
@@ -0,0 +1,175 @@
+import asyncio
+import time
+from collections import deque
+from typing import Deque, Dict, List, Optional
+
+from livekit import rtc
+
+from . import env, serializer
+from .logger import logger
+from .metrics import metrics
+
+
+class RollingStat:
+    """Call-wide mean and max plus a p90 over the most recent samples, in fixed memory."""
+
+    def __init__(self, window: int = 60) -> None:
+        self._recent: Deque[float] = deque(maxlen=window)
+        self.count = 0
+        self.total = 0.0
+        self.max = 0.0
+
+    def add(self, value: float) -> None:
+        self._recent.append(value)
+        self.count += 1
+        self.total += value
+        self.max = value if self.count == 1 else max(self.max, value)
+
+    def summary(self, scale: float = 1.0) -> Optional[List[float]]:
+        """Return [mean, recent p90, max] multiplied by `scale`, or None without samples."""
+        if not self.count:
+            return None
+        recent = sorted(self._recent)
+        p90 = recent[min(int(len(recent) * 0.9), len(recent) - 1)]
+        return [round(v * scale, 1) for v in (self.total / self.count, p90, self.max)]
+
+
+class _Counters:
+    """Previous values of cumulative counters, to turn them into per-interval rates."""
+
+    def __init__(self) -> None:
+        self._values: Dict[str, float] = {}
+
+    def delta(self, key: str, value: float) -> float:
+        previous = self._values.get(key)
+        self._values[key] = value
+        # a stream that just appeared (or restarted) has no previous interval
+        if previous is None or value < previous:
+            return 0.0
+        return value - previous
+
+
+class NetworkStatsSampler:
+    """Samples the room's WebRTC stats and keeps a compact network quality summary.
+
+    Subscriber stats describe the caller's audio reaching us (inbound jitter, loss and
+    bitrate), publisher stats the agent's audio reaching the caller (remote reported
+    jitter, loss and RTT, outbound bitrate). Raw stat objects are discarded after each
+    sample, only the rolling aggregates are kept.
+    """
+
+    def __init__(self, room: rtc.Room, interval: float = env.NETWORK_STATS_INTERVAL_SEC) -> None:
+        self._room = room
+        self._interval = interval
+        self._task: Optional[asyncio.Task] = None
+        self._counters = _Counters()
+        self._last_sample_at = 0.0
+        self._primed = False
+        self._stats = {
+            name: RollingStat()
+            for name in (
+                "inJitter",
+                "inLoss",
+                "inKbps",
+                "outJitter",
+                "outLoss",
+                "outKbps",
+                "rtt",
+            )
+        }
+
+    def start(self) -> None:
+        if self._interval > 0:
+            self._last_sample_at = time.monotonic()
+            self._task = asyncio.create_task(self._run())
+
+    def stop(self) -> None:
+        if self._task:
+            self._task.cancel()
+            self._task = None
+
+    async def _run(self) -> None:
+        while True:
+            await asyncio.sleep(self._interval)
+            try:
+                self._sample(await self._room.get_rtc_stats())
+            except Exception as e:
+                logger.warning("Failed to sample rtc stats: %s", e)
+
+    def _sample(self, rtc_stats) -> None:
+        now = time.monotonic()
+        elapsed = now - self._last_sample_at
+        self._last_sample_at = now
+
+        in_bytes = in_received = in_lost = out_bytes = 0.0
+        in_jitter: List[float] = []
+        out_jitter: List[float] = []
+        out_loss: List[float] = []
+        rtts: List[float] = []
+
+        for stats in rtc_stats.subscriber_stats:
+            kind = stats.WhichOneof("stats")
+            if kind == "inbound_rtp":
+                s = stats.inbound_rtp
+                in_jitter.append(s.received.jitter)
+                in_received += self._counters.delta(f"{s.rtc.id}:recv", s.received.packets_received)
+                in_lost += self._counters.delta(f"{s.rtc.id}:lost", s.received.packets_lost)
+                in_bytes += self._counters.delta(f"{s.rtc.id}:bytes", s.inbound.bytes_received)
+            elif kind == "candidate_pair" and stats.candidate_pair.candidate_pair.nominated:
+                rtts.append(stats.candidate_pair.candidate_pair.current_round_trip_time)
+
+        for stats in rtc_stats.publisher_stats:
+            kind = stats.WhichOneof("stats")
+            if kind == "remote_inbound_rtp":
+                s = stats.remote_inbound_rtp
+                out_jitter.append(s.received.jitter)
+                out_loss.append(s.remote_inbound.fraction_lost)
+                if s.remote_inbound.round_trip_time:
+                    rtts.append(s.remote_inbound.round_trip_time)
+            elif kind == "outbound_rtp":
+                s = stats.outbound_rtp
+                out_bytes += self._counters.delta(f"{s.rtc.id}:bytes", s.sent.bytes_sent)
+            elif kind == "candidate_pair" and stats.candidate_pair.candidate_pair.nominated:
+                rtts.append(stats.candidate_pair.candidate_pair.current_round_trip_time)
+
+        # the worst stream of each direction is what the caller hears
+        if in_jitter:
+            self._stats["inJitter"].add(max(in_jitter))
+        if in_received + in_lost > 0:
+            self._stats["inLoss"].add(in_lost / (in_received + in_lost))
+        if out_jitter:
+            self._stats["outJitter"].add(max(out_jitter))
+        if out_loss:
+            self._stats["outLoss"].add(max(out_loss))
+        rtts = [rtt for rtt in rtts if rtt > 0]
+        if rtts:
+            self._stats["rtt"].add(max(rtts))
+        # byte counters need a previous sample to become a bitrate
+        if self._primed and elapsed > 0:
+            self._stats["inKbps"].add(in_bytes * 8 / 1000 / elapsed)
+            self._stats["outKbps"].add(out_bytes * 8 / 1000 / elapsed)
+        self._primed = True
+
+    def summary(self) -> Optional[str]:
+        """Compact JSON summary, [mean, recent p90, max] per metric.
+
+        Jitter and RTT are in ms, loss in percent and bitrates in kbps.
+        """
+        scales = {
+            "inJitter": 1000,
+            "outJitter": 1000,
+            "rtt": 1000,
+            "inLoss": 100,
+            "outLoss": 100,
+            "inKbps": 1,
+            "outKbps": 1,
+        }
+        summary = {}
+        for name, stat in self._stats.items():
+            values = stat.summary(scales[name])
+            if values is not None:
+                summary[name] = values
+                metrics.observe(f"network_{name}", values[0])
+        if not summary:
+            return None
+        return serializer.dumps_str(summary)
@@ -0,0 +1,217 @@
+import importlib
+import os
+from types import ModuleType
+
+from livekit.agents import llm, stt, tts
+
+from . import env
+from .metrics import metrics
+from .sarvam_governor import get_governor
+from .tts_router import RoutedTTS, TTSRoute
+from .voice_info import LLMProvider, STTProvider, TTSProvider, VoiceInfo
+
+# Provider plugins are imported on first use only. Importing every plugin up front
+# (the openai plugin alone pulls in the whole openai SDK) costs seconds on every
+# worker start, job process spawn and CLI invocation.
+PLUGINS = {
+    "deepgram": "livekit.plugins.deepgram",
+    "elevenlabs": "livekit.plugins.elevenlabs",
+    "openai": "livekit.plugins.openai",
+    "silero": "livekit.plugins.silero",
+    "sarvam": "sarvam.tts",
+    "smallest": "smallest.tts",
+}
+
+LANGUAGE_CODES = {
+    "hi": "hi-IN",
+    "en": "en-IN",
+}
+
+DEEPGRAM_LANGUAGES = {
+    "hi": "hi",
+    "en": "en-IN",
+}
+
+# Agent languages that leave the language to be detected by the STT
+MULTILINGUAL = ("multi", "auto")
+
+GOOGLE_OPENAI_BASE_URL = "https://generativelanguage.googleapis.com/v1beta/openai/"
+
+
+def load_plugin(name: str) -> ModuleType:
+    # livekit plugins register themselves on import, which must happen on the main
+    # thread. Job processes run their job there, but `console` runs jobs in threads of
+    # the worker process, see main.py for the plugins it imports up front.
+    return importlib.import_module(PLUGINS[name])
+
+
+def load_all_plugins() -> None:
+    # `download-files` only sees plugins that have been imported.
+    for name in PLUGINS:
+        load_plugin(name)
+
+
+def _on_sarvam_cancelled(ev) -> None:
+    if ev.sent:
+        metrics.inc("tts_cancelled_requests_total", provider="sarvam")
+    else:
+        metrics.inc("tts_dropped_sentences_total", provider="sarvam")
+    metrics.inc("tts_cancelled_characters_total", ev.characters, provider="sarvam")
+    metrics.inc("tts_cancelled_bytes_total", ev.bytes, provider="sarvam")
+
+
+def _sarvam_tts(route: TTSRoute, agent: VoiceInfo) -> tts.TTS:
+    sarvam_tts = load_plugin("sarvam").TTS(
+        speaker=route.voice_id,
+        target_language_code=LANGUAGE_CODES[agent.language],
+        model=route.model,
+        pace=agent.tts_speed,
+        loudness=agent.tts_volume,
+        request_gate=get_governor(),
+    )
+    sarvam_tts.on("synthesis_cancelled", _on_sarvam_cancelled)
+    return sarvam_tts
+
+
+def _openai_tts(route: TTSRoute, agent: VoiceInfo) -> tts.TTS:
+    return load_plugin("openai").TTS(
+        model=route.model,
+        voice=route.voice_id,
+        speed=agent.tts_speed,
+    )
+
+
+def _elevenlabs_tts(route: TTSRoute, agent: VoiceInfo) -> tts.TTS:
+    return load_plugin("elevenlabs").TTS(
+        voice_id=route.voice_id,
+        model=route.model,
+        language=agent.language,
+    )
+
+
+def _deepgram_tts(route: TTSRoute, agent: VoiceInfo) -> tts.TTS:
+    # Deepgram Aura voices are models, e.g. "aura-asteria-en"
+    return load_plugin("deepgram").TTS(model=route.voice_id or route.model)
+
+
+def _smallest_tts(route: TTSRoute, agent: VoiceInfo) -> tts.TTS:
+    return load_plugin("smallest").TTS(
+        voice_id=route.voice_id,
+        model=route.model,
+        speed=agent.tts_speed,
+    )
+
+
+TTS_BUILDERS = {
+    TTSProvider.sarvam: _sarvam_tts,
+    TTSProvider.openai: _openai_tts,
+    TTSProvider.elevenlabs: _elevenlabs_tts,
+    TTSProvider.deepgram: _deepgram_tts,
+    TTSProvider.smallest: _smallest_tts,
+}
+
+
+def create_tts(route: TTSRoute, agent: VoiceInfo) -> tts.TTS:
+    if route.provider not in TTS_BUILDERS:
+        raise ValueError(f"Unsupported TTS provider: {route.provider}")
+    return TTS_BUILDERS[route.provider](route, agent)
+
+
+def fallback_routes(primary: TTSRoute) -> list[TTSRoute]:
+    fallbacks = env.TTS_FALLBACK_VOICES.get(primary.key)
+    if fallbacks is None:
+        fallbacks = env.TTS_FALLBACK_VOICES.get(f"{primary.provider.value}:*", [])
+    return [r for r in map(TTSRoute.from_json, fallbacks) if r != primary]
+
+
+def build_tts(agent: VoiceInfo) -> tts.TTS:
+    primary = TTSRoute(agent.tts_provider, agent.tts_model, agent.tts_voice_id)
+    routes = [primary] + fallback_routes(primary)
+    if len(routes) == 1:
+        return create_tts(primary, agent)
+    return RoutedTTS([(route, create_tts(route, agent)) for route in routes])
+
+
+def is_language_pinned(agent: VoiceInfo) -> bool:
+    return agent.language not in MULTILINGUAL
+
+
+def _deepgram_stt(agent: VoiceInfo) -> stt.STT:
+    # A pinned language skips multilingual detection, which is faster and more
+    # accurate for agents that only ever speak one language.
+    if is_language_pinned(agent):
+        language = DEEPGRAM_LANGUAGES.get(agent.language, agent.language)
+    else:
+        language = "multi"
+    return load_plugin("deepgram").STT(model=agent.stt_model, language=language)
+
+
+def _openai_stt(agent: VoiceInfo) -> stt.STT:
+    if is_language_pinned(agent):
+        return load_plugin("openai").STT(model=agent.stt_model, language=agent.language)
+    return load_plugin("openai").STT(model=agent.stt_model, detect_language=True)
+
+
+STT_BUILDERS = {
+    STTProvider.deepgram: _deepgram_stt,
+    STTProvider.openai: _openai_stt,
+}
+
+
+def build_stt(agent: VoiceInfo) -> stt.STT:
+    if agent.stt_provider not in STT_BUILDERS:
+        raise ValueError(f"Unsupported STT provider: {agent.stt_provider}")
+    return STT_BUILDERS[agent.stt_provider](agent)
+
+
+def stt_config_key(agent: VoiceInfo) -> str:
+    """Label identifying the STT configuration of an agent in metrics."""
+    language = agent.language if is_language_pinned(agent) else "multi"
+    return f"{agent.stt_provider.value}:{agent.stt_model}:{language}"
+
+
+def _openai_llm(agent: VoiceInfo) -> llm.LLM:
+    return load_plugin("openai").LLM(model=agent.llm_model, temperature=agent.llm_temperature)
+
+
+def _deepseek_llm(agent: VoiceInfo) -> llm.LLM:
+    return load_plugin("openai").LLM.with_deepseek(
+        model=agent.llm_model, temperature=agent.llm_temperature
+    )
+
+
+def _google_llm(agent: VoiceInfo) -> llm.LLM:
+    # Gemini through its OpenAI compatible endpoint, no extra plugin needed
+    return load_plugin("openai").LLM(
+        model=agent.llm_model,
+        temperature=agent.llm_temperature,
+        base_url=GOOGLE_OPENAI_BASE_URL,
+        api_key=os.environ.get("GOOGLE_API_KEY"),
+    )
+
+
+LLM_BUILDERS = {
+    LLMProvider.openai: _openai_llm,
+    LLMProvider.deepseek: _deepseek_llm,
+    LLMProvider.google: _google_llm,
+}
+
+# Name of the completion length limit in each provider's chat completions API
+LLM_MAX_TOKENS_PARAMS = {
+    LLMProvider.openai: "max_completion_tokens",
+    LLMProvider.deepseek: "max_tokens",
+    LLMProvider.google: "max_tokens",
+}
+
+
+def build_llm(agent: VoiceInfo) -> llm.LLM:
+    if agent.llm_provider not in LLM_BUILDERS:
+        raise ValueError(f"Unsupported LLM provider: {agent.llm_provider}")
+    return LLM_BUILDERS[agent.llm_provider](agent)
+
+
+def llm_extra_kwargs(agent: VoiceInfo) -> dict:
+    """Request parameters the LLM plugins don't take in their constructor."""
+    if not agent.llm_max_tokens or agent.llm_max_tokens <= 0:
+        return {}
+    return {LLM_MAX_TOKENS_PARAMS[agent.llm_provider]: agent.llm_max_tokens}
@@ -0,0 +1,262 @@
+import asyncio
+import hashlib
+import math
+import os
+import shutil
+import time
+from collections import Counter
+from dataclasses import dataclass
+from typing import AsyncIterator, Dict, List, Optional, Tuple
+
+from livekit import rtc
+
+from . import env, serializer
+from .logger import logger
+from .metrics import metrics
+from .speculative import normalize
+from .voice_info import VoiceInfo
+
+# Shorter utterances ("yes", "tell me more") depend on the conversation, never cache them
+MIN_WORDS = 3
+
+FRAME_DURATION_MS = 20
+
+
+@dataclass
+class CachedReply:
+    utterance: str
+    text: str
+    sample_rate: int
+    num_channels: int
+    created_at: float
+    pcm: bytes = b""
+
+    @staticmethod
+    def from_json(data: dict):
+        return CachedReply(
+            utterance=data["utterance"],
+            text=data["text"],
+            sample_rate=data["sampleRate"],
+            num_channels=data["numChannels"],
+            created_at=data["createdAt"],
+        )
+
+    def to_json(self) -> dict:
+        return {
+            "utterance": self.utterance,
+            "text": self.text,
+            "sampleRate": self.sample_rate,
+            "numChannels": self.num_channels,
+            "createdAt": self.created_at,
+        }
+
+    async def frames(self) -> AsyncIterator[rtc.AudioFrame]:
+        samples = self.sample_rate * FRAME_DURATION_MS // 1000
+        step = samples * self.num_channels * 2
+        for i in range(0, len(self.pcm), step):
+            chunk = self.pcm[i : i + step]
+            yield rtc.AudioFrame(
+                data=chunk,
+                sample_rate=self.sample_rate,
+                num_channels=self.num_channels,
+                samples_per_channel=len(chunk) // (2 * self.num_channels),
+            )
+
+
+def _fingerprint(agent: VoiceInfo) -> str:
+    # everything a stored reply depends on, a change starts a new cache
+    parts = [
+        agent.llm_general_prompt,
+        agent.language,
+        agent.llm_provider.value,
+        agent.llm_model,
+        agent.tts_provider.value,
+        agent.tts_model,
+        agent.tts_voice_id,
+        agent.tts_speed,
+    ]
+    return hashlib.sha1("|".join(map(str, parts)).encode()).hexdigest()[:16]
+
+
+def _trigrams(text: str) -> Counter:
+    padded = f" {text} "
+    return Counter(padded[i : i + 3] for i in range(len(padded) - 2))
+
+
+def _cosine(a: Counter, b: Counter) -> float:
+    dot = sum(count * b[gram] for gram, count in a.items() if gram in b)
+    norm = math.sqrt(sum(c * c for c in a.values()) * sum(c * c for c in b.values()))
+    return dot / norm if norm else 0.0
+
+
+class ResponseCache:
+    """Replies of an agent to repeated questions, with their synthesised audio.
+
+    Entries are keyed on the normalised user utterance and stored in
+    RESPONSE_CACHE_DIR for every job process of the host, under a fingerprint of the
+    agent's prompt, LLM and voice: changing any of them invalidates the agent's
+    entries. Entries expire after `ttl` seconds. With `similarity` above 0, an
+    utterance without an exact entry uses the entry whose character trigrams are
+    the most similar, if their cosine similarity reaches it.
+    """
+
+    def __init__(
+        self,
+        agent: VoiceInfo,
+        *,
+        directory: str = env.RESPONSE_CACHE_DIR,
+        ttl: float = env.RESPONSE_CACHE_TTL_SEC,
+        similarity: float = env.RESPONSE_CACHE_SIMILARITY,
+    ) -> None:
+        self._agent_dir = os.path.join(directory, agent.id)
+        self._fingerprint = _fingerprint(agent)
+        self._dir = os.path.join(self._agent_dir, self._fingerprint)
+        self._ttl = ttl
+        self._similarity = similarity
+        self._entries: Dict[str, CachedReply] = {}
+        self._vectors: List[Tuple[str, Counter]] = []
+        self._loaded: Optional[asyncio.Task] = None
+        self._lookups = 0
+        self._hits = 0
+
+    def start(self) -> None:
+        self._loaded = asyncio.create_task(asyncio.to_thread(self._load))
+
+    def _path(self, utterance: str, ext: str) -> str:
+        return os.path.join(self._dir, hashlib.sha1(utterance.encode()).hexdigest() + ext)
+
+    def _load(self) -> None:
+        if os.path.isdir(self._agent_dir):
+            for name in os.listdir(self._agent_dir):
+                if name != self._fingerprint:
+                    # stored for a previous prompt or voice of the agent
+                    shutil.rmtree(os.path.join(self._agent_dir, name), ignore_errors=True)
+        if not os.path.isdir(self._dir):
+            return
+        for name in os.listdir(self._dir):
+            if name.endswith(".json"):
+                entry = self._read_entry(os.path.join(self._dir, name))
+                if entry is not None:
+                    self._add(entry)
+
+    def _read_entry(self, path: str) -> Optional[CachedReply]:
+        try:
+            with open(path, "rb") as f:
+                entry = CachedReply.from_json(serializer.loads(f.read()))
+        except (OSError, ValueError, KeyError):
+            return None
+        if time.time() - entry.created_at > self._ttl:
+            for p in (path, path[: -len(".json")] + ".pcm"):
+                if os.path.exists(p):
+                    os.remove(p)
+            return None
+        return entry
+
+    def _add(self, entry: CachedReply) -> None:
+        if entry.utterance not in self._entries:
+            self._vectors.append((entry.utterance, _trigrams(entry.utterance)))
+        self._entries[entry.utterance] = entry
+
+    def _nearest(self, utterance: str) -> Optional[CachedReply]:
+        vector = _trigrams(utterance)
+        best, best_score = None, self._similarity
+        for candidate, candidate_vector in self._vectors:
+            score = _cosine(vector, candidate_vector)
+            if score >= best_score:
+                best, best_score = candidate, score
+        return self._entries.get(best) if best is not None else None
+
+    def _read_pcm(self, entry: CachedReply) -> bytes:
+        with open(self._path(entry.utterance, ".pcm"), "rb") as f:
+            return f.read()
+
+    def cacheable(self, text: str) -> Optional[str]:
+        """The cache key of an utterance, None for utterances that are never cached."""
+        utterance = normalize(text)
+        return utterance if len(utterance.split()) >= MIN_WORDS else None
+
+    async def lookup(self, utterance: str) -> Optional[CachedReply]:
+        if self._loaded is not None:
+            await self._loaded
+        self._lookups += 1
+        metrics.inc("response_cache_lookups_total")
+
+        match = "exact"
+        entry = self._entries.get(utterance)
+        if entry is None:
+            # another job process may have stored it since this call started
+            entry = await asyncio.to_thread(self._read_entry, self._path(utterance, ".json"))
+            if entry is not None:
+                self._add(entry)
+        if entry is None and self._similarity > 0:
+            match = "similar"
+            entry = self._nearest(utterance)
+        if entry is None or time.time() - entry.created_at > self._ttl:
+            return None
+
+        if not entry.pcm:
+            try:
+                entry.pcm = await asyncio.to_thread(self._read_pcm, entry)
+            except OSError:
+                return None
+        self._hits += 1
+        metrics.inc("response_cache_hits_total", match=match)
+        logger.info("Reply to %r served from the response cache (%s)", utterance, match)
+        return entry
+
+    def _write(self, entry: CachedReply) -> None:
+        os.makedirs(self._dir, exist_ok=True)
+        # the audio first, an entry is only visible once its .json exists
+        for ext, data in (
+            (".pcm", entry.pcm),
+            (".json", serializer.dumps(entry.to_json())),
+        ):
+            path = self._path(entry.utterance, ext)
+            tmp_path = f"{path}.{os.getpid()}.tmp"
+            with open(tmp_path, "wb") as f:
+                f.write(data)
+            os.replace(tmp_path, path)
+
+    async def store(self, entry: CachedReply) -> None:
+        try:
+            await asyncio.to_thread(self._write, entry)
+        except OSError as e:
+            logger.warning("Failed to store cached reply: %s", e)
+            return
+        self._add(entry)
+        metrics.inc("response_cache_stores_total")
+
+    def report(self) -> None:
+        if self._lookups:
+            metrics.observe("response_cache_hit_rate", self._hits / self._lookups)
+        logger.info("Response cache: %d/%d lookups hit", self._hits, self._lookups)
+
+
+class PendingReply:
+    """The reply to a cacheable utterance being generated, stored once fully synthesised."""
+
+    def __init__(self, utterance: str) -> None:
+        self.utterance = utterance
+        # replies that called a tool depend on more than the utterance
+        self.cacheable = True
+        self.text: List[str] = []
+        self.frames: List[rtc.AudioFrame] = []
+
+    async def tee_text(self, text: AsyncIterator[str]) -> AsyncIterator[str]:
+        async for chunk in text:
+            self.text.append(chunk)
+            yield chunk
+
+    def to_entry(self) -> Optional[CachedReply]:
+        text = "".join(self.text).strip()
+        if not self.cacheable or not text or not self.frames:
+            return None
+        first = self.frames[0]
+        return CachedReply(
+            utterance=self.utterance,
+            text=text,
+            sample_rate=first.sample_rate,
+            num_channels=first.num_channels,
+            created_at=time.time(),
+            pcm=b"".join(bytes(frame.data) for frame in self.frames),
+        )
@@ -0,0 +1,176 @@
+import asyncio
+import contextlib
+import fcntl
+import os
+import struct
+import time
+from typing import AsyncIterator, Optional, Tuple
+
+from livekit.agents import APIConnectionError
+
+from . import env
+from .logger import logger
+from .metrics import metrics
+
+# sarvam.tts.PRIORITY_FIRST, the plugin isn't imported until a Sarvam voice is used
+PRIORITY_FIRST = 0
+
+# tokens, refilled at (unix time), blocked until (unix time)
+_STATE = struct.Struct("<ddd")
+
+# Retry-After assumed when a 429 response doesn't say
+DEFAULT_RETRY_AFTER = 1.0
+
+
+class SarvamGovernor:
+    """Rate and concurrency limits of the Sarvam requests of every job process of the host.
+
+    The rate is a token bucket of `rate` requests per second up to `burst`, kept in
+    a state file under `directory`. In-flight requests are limited to
+    `max_concurrent` by flocks on lock files, so a crashed process never keeps a
+    slot. A 429 response blocks every process until its Retry-After has passed.
+
+    Greetings and first sentences (PRIORITY_FIRST) may use the `reserve` share of
+    the tokens and slots other requests leave free, so the caller isn't kept in
+    silence behind the rest of other calls' replies. A request waits at most
+    `max_wait` seconds in total, its retries included, then fails without further
+    retries so the call fails over to another voice.
+    """
+
+    def __init__(
+        self,
+        directory: str = env.SARVAM_GOVERNOR_DIR,
+        *,
+        rate: float = env.SARVAM_RATE,
+        burst: float = env.SARVAM_BURST,
+        max_concurrent: int = env.SARVAM_MAX_CONCURRENT,
+        reserve: float = env.SARVAM_PRIORITY_RESERVE,
+        max_wait: float = env.SARVAM_MAX_QUEUE_SEC,
+        poll_interval: float = 0.02,
+    ) -> None:
+        self._directory = directory
+        self._rate = rate
+        self._burst = max(burst, 1.0)
+        self._max_concurrent = max_concurrent
+        self._reserved_tokens = self._burst * reserve
+        self._reserved_slots = int(max_concurrent * reserve)
+        self._max_wait = max_wait
+        self._poll_interval = poll_interval
+        os.makedirs(directory, exist_ok=True)
+        self._state_fd = os.open(os.path.join(directory, "bucket"), os.O_RDWR | os.O_CREAT, 0o600)
+
+    async def _lock_state(self) -> None:
+        # held by other processes for a read and a write only, but never block the loop
+        while True:
+            try:
+                fcntl.flock(self._state_fd, fcntl.LOCK_EX | fcntl.LOCK_NB)
+                return
+            except BlockingIOError:
+                await asyncio.sleep(0.001)
+
+    async def _take_token(self, priority: int) -> Tuple[float, str]:
+        """Take a token, or return how long to wait for one and why."""
+        await self._lock_state()
+        try:
+            now = time.time()
+            data = os.pread(self._state_fd, _STATE.size, 0)
+            if len(data) == _STATE.size:
+                tokens, refilled_at, blocked_until = _STATE.unpack(data)
+            else:
+                tokens, refilled_at, blocked_until = self._burst, now, 0.0
+            if now < blocked_until:
+                return blocked_until - now, "retry_after"
+            if self._rate <= 0:
+                return 0.0, ""
+
+            tokens = min(self._burst, tokens + max(now - refilled_at, 0.0) * self._rate)
+            needed = 1.0 if priority == PRIORITY_FIRST else 1.0 + self._reserved_tokens
+            wait = 0.0
+            if tokens >= needed:
+                tokens -= 1.0
+            else:
+                wait = (needed - tokens) / self._rate
+            os.pwrite(self._state_fd, _STATE.pack(tokens, now, blocked_until), 0)
+            return wait, "rate" if wait else ""
+        finally:
+            fcntl.flock(self._state_fd, fcntl.LOCK_UN)
+
+    def _try_lock_slot(self, priority: int) -> Tuple[Optional[int], bool]:
+        """Return the fd of a free slot and whether a slot was needed at all."""
+        if self._max_concurrent <= 0:
+            return None, False
+        slots = self._max_concurrent
+        if priority != PRIORITY_FIRST:
+            slots = max(slots - self._reserved_slots, 1)
+        for i in range(slots):
+            path = os.path.join(self._directory, f"slot.{i}.lock")
+            fd = os.open(path, os.O_RDWR | os.O_CREAT, 0o600)
+            try:
+                fcntl.flock(fd, fcntl.LOCK_EX | fcntl.LOCK_NB)
+                return fd, True
+            except BlockingIOError:
+                os.close(fd)
+        return None, True
+
+    @contextlib.asynccontextmanager
+    async def slot(self, priority: int, queued_at: Optional[float] = None) -> AsyncIterator[None]:
+        """Hold a request slot for the duration of a Sarvam request.
+
+        `queued_at` is the time.monotonic() the request first queued at, its retries
+        share the request's `max_wait`.
+        """
+        started_at = time.monotonic() if queued_at is None else queued_at
+        label = "first" if priority == PRIORITY_FIRST else "normal"
+        queued = False
+        while True:
+            fd, limited = self._try_lock_slot(priority)
+            if fd is None and limited:
+                wait, reason = self._poll_interval, "concurrency"
+            else:
+                wait, reason = await self._take_token(priority)
+                if not wait:
+                    break
+                if fd is not None:
+                    os.close(fd)
+
+            if not queued:
+                queued = True
+                metrics.inc("sarvam_queued_total", reason=reason, priority=label)
+            if time.monotonic() + wait - started_at > self._max_wait:
+                metrics.inc("sarvam_queue_timeouts_total", priority=label)
+                raise APIConnectionError("Sarvam request queue timed out", retryable=False)
+            await asyncio.sleep(max(wait, self._poll_interval))
+
+        metrics.observe("sarvam_queue_wait_seconds", time.monotonic() - started_at, priority=label)
+        try:
+            yield
+        finally:
+            if fd is not None:
+                os.close(fd)
+
+    async def throttled(self, retry_after: Optional[float]) -> None:
+        """Hold every process's requests after a 429 response."""
+        retry_after = DEFAULT_RETRY_AFTER if retry_after is None else retry_after
+        metrics.inc("sarvam_throttled_total")
+        logger.warning("Sarvam rate limited, holding requests for %.1fs", retry_after)
+        await self._lock_state()
+        try:
+            blocked_until = time.time() + retry_after
+            data = os.pread(self._state_fd, _STATE.size, 0)
+            if len(data) == _STATE.size:
+                blocked_until = max(blocked_until, _STATE.unpack(data)[2])
+            # the bucket was too optimistic, refill it from empty once the block ends
+            os.pwrite(self._state_fd, _STATE.pack(0.0, blocked_until, blocked_until), 0)
+        finally:
+            fcntl.flock(self._state_fd, fcntl.LOCK_UN)
+
+
+_governor: Optional[SarvamGovernor] = None
+
+
+def get_governor() -> Optional[SarvamGovernor]:
+    """The process's governor, None when no limit is configured."""
+    global _governor
+    if _governor is None and (env.SARVAM_RATE > 0 or env.SARVAM_MAX_CONCURRENT > 0):
+        _governor = SarvamGovernor()
+    return _governor
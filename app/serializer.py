@@ -0,0 +1,66 @@
+import asyncio
+import json
+from typing import Any, Union
+
+# JSON with the fastest library installed: orjson, msgspec or the stdlib. Every
+# backend produces the same compact UTF-8 output.
+try:
+    import orjson
+
+    BACKEND = "orjson"
+
+    def dumps(obj: Any) -> bytes:
+        return orjson.dumps(obj)
+
+    loads = orjson.loads
+except ImportError:
+    try:
+        import msgspec
+
+        BACKEND = "msgspec"
+        dumps = msgspec.json.Encoder().encode
+        _decoder = msgspec.json.Decoder()
+
+        def loads(data: Union[bytes, str]) -> Any:
+            try:
+                return _decoder.decode(data)
+            except msgspec.DecodeError as e:
+                # callers expect json's errors
+                raise ValueError(str(e)) from e
+    except ImportError:
+        BACKEND = "json"
+
+        def dumps(obj: Any) -> bytes:
+            return json.dumps(obj, ensure_ascii=False, separators=(",", ":")).encode()
+
+        loads = json.loads
+
+# Documents from this size on are encoded and decoded in a thread, below it the
+# thread hop costs more than it saves the event loop
+OFFLOAD_BYTES = 64 * 1024
+
+
+def dumps_str(obj: Any) -> str:
+    return dumps(obj).decode()
+
+
+def approx_size(obj: Any) -> int:
+    """Lower bound of the encoded size of a flat document, from its strings."""
+    if isinstance(obj, (str, bytes)):
+        return len(obj)
+    if isinstance(obj, dict):
+        return sum(len(v) for v in obj.values() if isinstance(v, (str, bytes)))
+    return 0
+
+
+async def dumps_async(obj: Any, *, offload: bool = False) -> bytes:
+    """Encode `obj`, in a thread if `offload` or if its strings are large."""
+    if offload or approx_size(obj) >= OFFLOAD_BYTES:
+        return await asyncio.to_thread(dumps, obj)
+    return dumps(obj)
+
+
+async def loads_async(data: Union[bytes, str]) -> Any:
+    if len(data) >= OFFLOAD_BYTES:
+        return await asyncio.to_thread(loads, data)
+    return loads(data)
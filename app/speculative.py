@@ -0,0 +1,246 @@
+import asyncio
+import re
+import time
+from typing import AsyncIterator, Callable, List, Optional
+
+from livekit.agents import Agent, AgentSession, llm
+from livekit.agents.voice.events import UserInputTranscribedEvent, UserStateChangedEvent
+
+from . import env
+from .logger import logger
+from .metrics import metrics
+
+
+def normalize(text: str) -> str:
+    """Transcript text for comparison, interim and final transcripts differ in case and
+    punctuation only."""
+    return " ".join(re.sub(r"[^\w\s]", " ", text.lower()).split())
+
+
+class Speculation:
+    """An LLM request started on an interim transcript, buffering its chunks until the
+    turn is committed."""
+
+    def __init__(self, text: str, base_ids: List[str]) -> None:
+        self.text = text
+        self.base_ids = base_ids
+        self.started_at = time.monotonic()
+        self.first_chunk_at = 0.0
+        self.chunks: List[llm.ChatChunk] = []
+        self.error: Optional[Exception] = None
+        self.done = False
+        self._updated = asyncio.Event()
+        self._task: Optional[asyncio.Task] = None
+
+    def start(self, llm_: llm.LLM, chat_ctx: llm.ChatContext, tools: list, extra_kwargs: dict):
+        self._task = asyncio.create_task(self._run(llm_, chat_ctx, tools, extra_kwargs))
+
+    async def _run(self, llm_: llm.LLM, chat_ctx: llm.ChatContext, tools: list, extra_kwargs):
+        try:
+            async with llm_.chat(
+                chat_ctx=chat_ctx, tools=tools, extra_kwargs=extra_kwargs
+            ) as stream:
+                async for chunk in stream:
+                    if not self.first_chunk_at:
+                        self.first_chunk_at = time.monotonic()
+                    self.chunks.append(chunk)
+                    self._updated.set()
+        except Exception as e:
+            self.error = e
+        finally:
+            self.done = True
+            self._updated.set()
+
+    def cancel(self) -> int:
+        """Stop the request, return the number of chunks generated for nothing."""
+        if self._task and not self.done:
+            self._task.cancel()
+        return len(self.chunks)
+
+    async def replay(self) -> AsyncIterator[llm.ChatChunk]:
+        """Yield the buffered chunks, then the rest as the request produces them."""
+        i = 0
+        while True:
+            while i < len(self.chunks):
+                yield self.chunks[i]
+                i += 1
+            if self.done:
+                if self.error is not None:
+                    raise self.error
+                return
+            self._updated.clear()
+            await self._updated.wait()
+
+
+class SpeculativeLLM:
+    """Starts the LLM request of a turn before the turn ends.
+
+    Once the interim transcript of the user's turn hasn't changed for
+    `stable_after` seconds, or the user stops speaking, the reply is requested with
+    the transcript so far. When the turn is committed with the same text and
+    context, the reply is taken from that request and its TTFT has already (partly)
+    elapsed; otherwise it is cancelled and the reply requested as usual. A turn
+    restarts its speculation at most `max_restarts` times as the transcript changes.
+
+    Chunks received by cancelled requests are reported as wasted tokens, OpenAI
+    compatible APIs stream about one token per chunk.
+    """
+
+    def __init__(
+        self,
+        session: AgentSession,
+        agent: Agent,
+        extra_kwargs: dict,
+        *,
+        stable_after: float = env.SPECULATIVE_LLM_STABLE_SEC,
+        max_restarts: int = 2,
+        trim: Optional[Callable[[llm.ChatContext], llm.ChatContext]] = None,
+    ) -> None:
+        self._session = session
+        self._agent = agent
+        self._extra_kwargs = extra_kwargs
+        self._stable_after = stable_after
+        self._max_restarts = max_restarts
+        self._trim = trim
+        self._finals: List[str] = []
+        self._interim = ""
+        self._timer: Optional[asyncio.TimerHandle] = None
+        self._speculation: Optional[Speculation] = None
+        self._restarts = 0
+        self._turns = 0
+        self._hits = 0
+        self._wasted_tokens = 0
+        self._saved = 0.0
+
+        session.on("user_input_transcribed", self._on_user_input_transcribed)
+        session.on("user_state_changed", self._on_user_state_changed)
+
+    @property
+    def _turn_text(self) -> str:
+        return " ".join(self._finals + [self._interim]).strip()
+
+    def _on_user_input_transcribed(self, ev: UserInputTranscribedEvent) -> None:
+        if ev.is_final:
+            self._finals.append(ev.transcript)
+            self._interim = ""
+        else:
+            self._interim = ev.transcript
+        if self._timer:
+            self._timer.cancel()
+        self._timer = asyncio.get_running_loop().call_later(self._stable_after, self._speculate)
+
+    def _on_user_state_changed(self, ev: UserStateChangedEvent) -> None:
+        # the end of speech is the most stable the transcript gets before the final one
+        if ev.old_state == "speaking" and ev.new_state != "speaking":
+            self._speculate()
+
+    def _speculate(self) -> None:
+        self._timer = None
+        text = self._turn_text
+        if not normalize(text):
+            return
+        if self._speculation is not None:
+            if self._speculation.text == normalize(text):
+                return
+            if self._restarts >= self._max_restarts:
+                return
+            self._restarts += 1
+            metrics.inc("speculation_restarts_total")
+            self._discard("restart")
+
+        chat_ctx = self._agent.chat_ctx.copy()
+        base_ids = [item.id for item in chat_ctx.items]
+        chat_ctx.add_message(role="user", content=text)
+        if self._trim is not None:
+            chat_ctx = self._trim(chat_ctx)
+        self._speculation = Speculation(normalize(text), base_ids)
+        self._speculation.start(
+            self._session.llm, chat_ctx, list(self._agent.tools), self._extra_kwargs
+        )
+
+    def _discard(self, reason: str) -> None:
+        wasted = self._speculation.cancel()
+        self._speculation = None
+        metrics.inc("speculation_misses_total", reason=reason)
+        metrics.inc("speculation_wasted_tokens_total", wasted)
+        self._wasted_tokens += wasted
+
+    def skip_turn(self, reason: str) -> None:
+        """End the turn without requesting its reply, e.g. answered from a cache."""
+        if self._timer:
+            self._timer.cancel()
+            self._timer = None
+        self._finals, self._interim, self._restarts = [], "", 0
+        if self._speculation is not None:
+            self._discard(reason)
+
+    def take(self, chat_ctx: llm.ChatContext) -> Optional[Speculation]:
+        """Return the speculation matching the committed turn in `chat_ctx`, if any.
+
+        Ends the turn, a speculation that doesn't match is cancelled.
+        """
+        if self._timer:
+            self._timer.cancel()
+            self._timer = None
+        speculation, self._speculation = self._speculation, None
+        self._finals, self._interim, self._restarts = [], "", 0
+
+        user_message = chat_ctx.items[-1] if chat_ctx.items else None
+        if not isinstance(user_message, llm.ChatMessage) or user_message.role != "user":
+            # not a user turn, e.g. the greeting or a reply to a tool call
+            if speculation is not None:
+                self._speculation = speculation
+                self._discard("not_a_user_turn")
+            return None
+
+        metrics.inc("speculation_turns_total")
+        self._turns += 1
+        if speculation is None:
+            return None
+        self._speculation = speculation
+        if speculation.text != normalize(user_message.text_content or ""):
+            self._discard("transcript_changed")
+            return None
+        if [item.id for item in chat_ctx.items[:-1]] != speculation.base_ids:
+            self._discard("context_changed")
+            return None
+        if speculation.error is not None:
+            self._discard("error")
+            return None
+
+        self._speculation = None
+        metrics.inc("speculation_hits_total")
+        self._hits += 1
+        return speculation
+
+    async def replay(self, speculation: Speculation) -> AsyncIterator[llm.ChatChunk]:
+        committed_at = time.monotonic()
+        first = True
+        try:
+            async for chunk in speculation.replay():
+                if first:
+                    first = False
+                    # without speculation the first chunk would have come one TTFT after
+                    # the commit
+                    ttft = speculation.first_chunk_at - speculation.started_at
+                    saved = ttft - max(speculation.first_chunk_at - committed_at, 0.0)
+                    metrics.observe("speculation_latency_saved_seconds", saved)
+                    self._saved += saved
+                    logger.info("Speculative reply used, %.0fms saved", saved * 1000)
+                yield chunk
+        finally:
+            # interrupted while replaying, the request isn't needed anymore
+            speculation.cancel()
+
+    def report(self) -> None:
+        if self._speculation is not None:
+            self._discard("call_ended")
+        if self._turns:
+            metrics.observe("speculation_hit_rate", self._hits / self._turns)
+        logger.info(
+            "Speculative LLM: %d/%d turns hit, %d tokens wasted, %.0fms saved per hit",
+            self._hits,
+            self._turns,
+            self._wasted_tokens,
+            self._saved / self._hits * 1000 if self._hits else 0.0,
+        )
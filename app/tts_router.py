@@ -0,0 +1,406 @@
+import asyncio
+import dataclasses
+import time
+from collections import deque
+from dataclasses import dataclass
+from typing import Deque, Dict, List, Optional, Tuple
+
+from livekit import rtc
+from livekit.agents import (
+    APIConnectionError,
+    APIConnectOptions,
+    DEFAULT_API_CONNECT_OPTIONS,
+    tokenize,
+    tts,
+    utils,
+)
+from livekit.agents.metrics import TTSMetrics
+
+from .logger import logger
+from .metrics import metrics
+from .voice_info import TTSProvider
+
+
+@dataclass(frozen=True)
+class TTSRoute:
+    provider: TTSProvider
+    model: str
+    voice_id: str
+
+    @property
+    def key(self) -> str:
+        return f"{self.provider.value}:{self.voice_id}"
+
+    @staticmethod
+    def from_json(data: dict):
+        return TTSRoute(
+            provider=TTSProvider(data["provider"]),
+            model=data["model"],
+            voice_id=data["voiceId"],
+        )
+
+
+class RouteHealth:
+    """Rolling TTFB and error rate of one provider/voice.
+
+    Samples expire after `max_age` seconds, so a degraded route that stopped getting
+    traffic becomes eligible again once its bad samples have aged out.
+    """
+
+    def __init__(self, window: int = 20, max_age: float = 120.0) -> None:
+        self._samples: Deque[Tuple[float, Optional[float]]] = deque(maxlen=window)
+        self._max_age = max_age
+
+    def record(self, ttfb: Optional[float]) -> None:
+        """Record a request, `ttfb` is None when the request failed."""
+        self._samples.append((time.monotonic(), ttfb))
+
+    def stats(self) -> Tuple[int, float, float]:
+        """Return the sample count, mean TTFB of successful requests and error rate."""
+        cutoff = time.monotonic() - self._max_age
+        while self._samples and self._samples[0][0] < cutoff:
+            self._samples.popleft()
+
+        ttfbs = [ttfb for _, ttfb in self._samples if ttfb is not None]
+        count = len(self._samples)
+        if count == 0:
+            return 0, 0.0, 0.0
+        mean_ttfb = sum(ttfbs) / len(ttfbs) if ttfbs else 0.0
+        return count, mean_ttfb, (count - len(ttfbs)) / count
+
+
+# Shared by every call handled by this process
+_health: Dict[str, RouteHealth] = {}
+
+
+def get_health(route: TTSRoute) -> RouteHealth:
+    health = _health.get(route.key)
+    if health is None:
+        health = _health[route.key] = RouteHealth()
+    return health
+
+
+class RoutedTTS(tts.TTS):
+    """Routes every synthesis to the healthiest of several equivalent voices.
+
+    The first route is the agent's configured voice and is preferred while it is
+    healthy. A route is degraded when its rolling mean TTFB or error rate goes over
+    the limits, degraded routes are tried last. A request that fails before any
+    audio was produced fails over to the next route, so a provider outage costs
+    one sentence of extra latency rather than the call.
+
+    Streams are the route's own stream, so a provider's streaming features (e.g.
+    Sarvam's cancellation of in-flight requests and request priorities) are kept.
+    Routes that can't stream are wrapped in a StreamAdapter.
+
+    Args:
+        routes: The routes and their TTS instances, in order of preference
+        max_ttfb: Mean TTFB in seconds above which a route is degraded
+        max_error_rate: Error rate above which a route is degraded
+        min_samples: Samples needed before a route can be marked degraded
+        attempt_timeout: Seconds to wait for the first audio frame of a route
+    """
+
+    def __init__(
+        self,
+        routes: List[Tuple[TTSRoute, tts.TTS]],
+        *,
+        max_ttfb: float = 1.5,
+        max_error_rate: float = 0.3,
+        min_samples: int = 3,
+        attempt_timeout: float = 5.0,
+    ) -> None:
+        if not routes:
+            raise ValueError("At least one TTS route is required.")
+        if len({t.num_channels for _, t in routes}) != 1:
+            raise ValueError("All TTS routes must have the same number of channels.")
+
+        super().__init__(
+            capabilities=tts.TTSCapabilities(streaming=True),
+            sample_rate=max(t.sample_rate for _, t in routes),
+            num_channels=routes[0][1].num_channels,
+        )
+        self._routes = routes
+        self._max_ttfb = max_ttfb
+        self._max_error_rate = max_error_rate
+        self._min_samples = min_samples
+        self._attempt_timeout = attempt_timeout
+        self._active: Optional[TTSRoute] = None
+        self._streamers: Dict[TTSRoute, tts.TTS] = {
+            route: t
+            if t.capabilities.streaming
+            else tts.StreamAdapter(tts=t, sentence_tokenizer=tokenize.basic.SentenceTokenizer())
+            for route, t in routes
+        }
+
+        for route, t in routes:
+            t.on("metrics_collected", lambda ev, route=route: self._on_metrics(route, ev))
+
+    def _on_metrics(self, route: TTSRoute, ev) -> None:
+        # the TTFB of every request of a route, whether streamed or not
+        if isinstance(ev, TTSMetrics) and ev.ttfb >= 0:
+            self.record(route, ev.ttfb)
+        # usage collection relies on the metrics of the TTS that actually spoke
+        self.emit("metrics_collected", ev)
+
+    def is_degraded(self, route: TTSRoute) -> bool:
+        count, mean_ttfb, error_rate = get_health(route).stats()
+        if count < self._min_samples:
+            return False
+        return mean_ttfb > self._max_ttfb or error_rate > self._max_error_rate
+
+    def ordered_routes(self) -> List[Tuple[TTSRoute, tts.TTS]]:
+        # stable sort, healthy routes keep their order of preference
+        ordered = sorted(self._routes, key=lambda r: self.is_degraded(r[0]))
+
+        route = ordered[0][0]
+        if route != self._active:
+            primary = self._routes[0][0]
+            if self._active is not None:
+                logger.info("TTS route switched from %s to %s", self._active.key, route.key)
+                metrics.inc("tts_route_switch_total", route=route.key, primary=primary.key)
+            self._active = route
+        return ordered
+
+    def record(self, route: TTSRoute, ttfb: Optional[float]) -> None:
+        health = get_health(route)
+        health.record(ttfb)
+        _, mean_ttfb, error_rate = health.stats()
+        metrics.set("tts_route_ttfb_seconds", round(mean_ttfb, 3), route=route.key)
+        metrics.set("tts_route_error_rate", round(error_rate, 3), route=route.key)
+
+    def synthesize(
+        self,
+        text: str,
+        *,
+        conn_options: APIConnectOptions = DEFAULT_API_CONNECT_OPTIONS,
+    ) -> "RoutedChunkedStream":
+        return RoutedChunkedStream(tts=self, input_text=text, conn_options=conn_options)
+
+    def stream(
+        self,
+        *,
+        conn_options: APIConnectOptions = DEFAULT_API_CONNECT_OPTIONS,
+    ) -> "RoutedSynthesizeStream":
+        return RoutedSynthesizeStream(tts=self, conn_options=conn_options)
+
+    def prewarm(self) -> None:
+        self._routes[0][1].prewarm()
+
+    async def aclose(self) -> None:
+        for _, t in self._routes:
+            await t.aclose()
+
+
+class RoutedChunkedStream(tts.ChunkedStream):
+    def __init__(
+        self,
+        *,
+        tts: RoutedTTS,
+        input_text: str,
+        conn_options: APIConnectOptions,
+    ) -> None:
+        super().__init__(tts=tts, input_text=input_text, conn_options=conn_options)
+        self._router = tts
+
+    async def _metrics_monitor_task(self, event_aiter) -> None:
+        # metrics are forwarded from the TTS that served the request
+        async for _ in event_aiter:
+            pass
+
+    async def _run(self) -> None:
+        # fail over to the next route instead of retrying a failing one
+        conn_options = dataclasses.replace(self._conn_options, max_retry=0)
+        routes = self._router.ordered_routes()
+        primary = self._router._routes[0][0]
+
+        for route, route_tts in routes:
+            metrics.inc(
+                "tts_route_requests_total",
+                route=route.key,
+                reason="primary" if route == primary else "fallback",
+            )
+            resampler = None
+            if route_tts.sample_rate != self._router.sample_rate:
+                resampler = rtc.AudioResampler(
+                    input_rate=route_tts.sample_rate, output_rate=self._router.sample_rate
+                )
+
+            started = False
+            request_id = ""
+            try:
+                async with route_tts.synthesize(
+                    self._input_text, conn_options=conn_options
+                ) as stream:
+                    while True:
+                        try:
+                            audio = await asyncio.wait_for(
+                                stream.__anext__(),
+                                None if started else self._router._attempt_timeout,
+                            )
+                        except StopAsyncIteration:
+                            break
+
+                        started = True
+                        request_id = audio.request_id
+
+                        if resampler is None:
+                            self._event_ch.send_nowait(audio)
+                            continue
+                        for frame in resampler.push(audio.frame):
+                            self._event_ch.send_nowait(
+                                tts.SynthesizedAudio(frame=frame, request_id=request_id)
+                            )
+
+                if resampler is not None:
+                    for frame in resampler.flush():
+                        self._event_ch.send_nowait(
+                            tts.SynthesizedAudio(frame=frame, request_id=request_id)
+                        )
+                if not started:
+                    raise APIConnectionError("No audio received")
+                return
+
+            except Exception as e:
+                if started:
+                    # part of the sentence was already played, don't say it twice
+                    raise
+                self._router.record(route, None)
+                metrics.inc("tts_route_failures_total", route=route.key)
+                logger.warning("TTS route %s failed, trying next route: %r", route.key, e)
+
+        raise APIConnectionError(
+            f"All TTS routes failed: {[route.key for route, _ in routes]}"
+        )
+
+
+class RoutedSynthesizeStream(tts.SynthesizeStream):
+    """Streams text to the stream of the healthiest route.
+
+    The text pushed so far is kept until the route produces its first audio frame,
+    if the route fails before that it is replayed to the next route. Closing the
+    stream closes the route's stream. Like the routes, the stream isn't retried: a
+    retry after some audio was played would say it twice.
+    """
+
+    def __init__(self, *, tts: RoutedTTS, conn_options: APIConnectOptions) -> None:
+        super().__init__(tts=tts, conn_options=dataclasses.replace(conn_options, max_retry=0))
+        self._router = tts
+        # the text pushed so far, None marks a flush
+        self._pushed: List[Optional[str]] = []
+        self._input_ended = False
+        self._input_changed = asyncio.Event()
+
+    async def _metrics_monitor_task(self, event_aiter) -> None:
+        # metrics are forwarded from the TTS that served the request
+        async for _ in event_aiter:
+            pass
+
+    async def _read_input(self) -> None:
+        async for data in self._input_ch:
+            self._pushed.append(None if isinstance(data, self._FlushSentinel) else data)
+            self._input_changed.set()
+        self._input_ended = True
+        self._input_changed.set()
+
+    async def _forward_input(self, stream: tts.SynthesizeStream) -> None:
+        forwarded = 0
+        while True:
+            for data in self._pushed[forwarded:]:
+                if data is None:
+                    stream.flush()
+                else:
+                    stream.push_text(data)
+            forwarded = len(self._pushed)
+            if self._input_ended:
+                stream.end_input()
+                return
+            self._input_changed.clear()
+            await self._input_changed.wait()
+
+    async def _wait_for_text(self) -> bool:
+        """Wait until some text was pushed, return False if the input ended without."""
+        while not any(self._pushed):
+            if self._input_ended:
+                return False
+            self._input_changed.clear()
+            await self._input_changed.wait()
+        return True
+
+    async def _run(self) -> None:
+        routes = self._router.ordered_routes()
+        primary = self._router._routes[0][0]
+        read_task = asyncio.create_task(self._read_input())
+
+        try:
+            for route, route_tts in routes:
+                metrics.inc(
+                    "tts_route_requests_total",
+                    route=route.key,
+                    reason="primary" if route == primary else "fallback",
+                )
+                resampler = None
+                if route_tts.sample_rate != self._router.sample_rate:
+                    resampler = rtc.AudioResampler(
+                        input_rate=route_tts.sample_rate, output_rate=self._router.sample_rate
+                    )
+
+                started = False
+                request_id = ""
+                forward_task: Optional[asyncio.Task] = None
+                try:
+                    # leaving the block closes the route's stream, also when we are closed
+                    async with self._router._streamers[route].stream(
+                        conn_options=self._conn_options
+                    ) as stream:
+                        forward_task = asyncio.create_task(self._forward_input(stream))
+                        while True:
+                            try:
+                                if started:
+                                    audio = await stream.__anext__()
+                                elif await self._wait_for_text():
+                                    # the attempt timeout starts with the first text
+                                    audio = await asyncio.wait_for(
+                                        stream.__anext__(), self._router._attempt_timeout
+                                    )
+                                else:
+                                    # nothing to say, don't count it against the route
+                                    return
+                            except StopAsyncIteration:
+                                break
+
+                            started = True
+                            request_id = audio.request_id
+                            if resampler is None:
+                                self._event_ch.send_nowait(audio)
+                                continue
+                            for frame in resampler.push(audio.frame):
+                                self._event_ch.send_nowait(
+                                    tts.SynthesizedAudio(frame=frame, request_id=request_id)
+                                )
+
+                    if resampler is not None:
+                        for frame in resampler.flush():
+                            self._event_ch.send_nowait(
+                                tts.SynthesizedAudio(frame=frame, request_id=request_id)
+                            )
+                    if not started and any(self._pushed):
+                        raise APIConnectionError("No audio received")
+                    return
+
+                except Exception as e:
+                    if started:
+                        # part of the reply was already played, don't say it twice
+                        raise
+                    self._router.record(route, None)
+                    metrics.inc("tts_route_failures_total", route=route.key)
+                    logger.warning("TTS route %s failed, trying next route: %r", route.key, e)
+                finally:
+                    if forward_task is not None:
+                        await utils.aio.cancel_and_wait(forward_task)
+
+            raise APIConnectionError(
+                f"All TTS routes failed: {[route.key for route, _ in routes]}"
+            )
+        finally:
+            await utils.aio.cancel_and_wait(read_task)
@@ -33,7 +33,7 @@ class UsageCollector:
         if isinstance(metrics, EOUMetrics):
             if self._summary.eou_end_of_utterance_delay < metrics.end_of_utterance_delay:
                 self._summary.eou_end_of_utterance_delay = metrics.end_of_utterance_delay
-            logger.info(f"eou time {metrics.end_of_utterance_delay}")
+            logger.info("eou time %s", metrics.end_of_utterance_delay)
 
         elif isinstance(metrics, LLMMetrics):
             self._summary.llm_prompt_tokens += metrics.prompt_tokens
@@ -41,13 +41,13 @@ class UsageCollector:
             self._summary.llm_completion_tokens += metrics.completion_tokens
             if self._summary.llm_ttft < metrics.ttft:
                 self._summary.llm_ttft = metrics.ttft
-            logger.info(f"llm time {metrics.ttft}")
+            logger.info("llm time %s", metrics.ttft)
 
         elif isinstance(metrics, TTSMetrics):
             self._summary.tts_characters_count += metrics.characters_count
             if self._summary.tts_ttfb < metrics.ttfb:
                 self._summary.tts_ttfb = metrics.ttfb
-            logger.info(f"tts time {metrics.ttfb}")
+            logger.info("tts time %s", metrics.ttfb)
 
         # elif isinstance(metrics, RealtimeModelMetrics):
         #     self._summary.llm_prompt_tokens += metrics.input_tokens
@@ -59,7 +59,7 @@ class UsageCollector:
 
         # elif isinstance(metrics, STTMetrics):
         #     self._summary.stt_audio_duration += metrics.audio_duration
-        #     logger.info(f"stt time {metrics.audio_duration}")
+        #     logger.info("stt time %s", metrics.audio_duration)
 
     def get_summary(self) -> UsageSummary:
         return deepcopy(self._summary)
@@ -83,19 +83,19 @@ class AverageUsageCollector:
     def collect(self, metrics: AgentMetrics) -> None:
         if isinstance(metrics, EOUMetrics):
             self._eou_delays.append(metrics.end_of_utterance_delay)
-            logger.info(f"eou time {metrics.end_of_utterance_delay}")
+            logger.info("eou time %s", metrics.end_of_utterance_delay)
 
         elif isinstance(metrics, LLMMetrics):
             self._summary.llm_prompt_tokens += metrics.prompt_tokens
             self._summary.llm_prompt_cached_tokens += metrics.prompt_cached_tokens
             self._summary.llm_completion_tokens += metrics.completion_tokens
             self._llm_ttfts.append(metrics.ttft)
-            logger.info(f"llm time {metrics.ttft}")
+            logger.info("llm time %s", metrics.ttft)
 
         elif isinstance(metrics, TTSMetrics):
             self._summary.tts_characters_count += metrics.characters_count
             self._tts_ttfbs.append(metrics.ttfb)
-            logger.info(f"tts time {metrics.ttfb}")
+            logger.info("tts time %s", metrics.ttfb)
 
     def get_summary(self) -> UsageSummary:
         # Compute averages
@@ -0,0 +1,202 @@
+import statistics
+import time
+from collections import deque
+from dataclasses import dataclass, field
+from typing import Any, Deque, Dict
+
+from livekit.agents import AgentSession
+from livekit.agents.metrics import AgentMetrics, EOUMetrics
+from livekit.agents.voice.events import UserStateChangedEvent
+
+from . import env
+from .logger import logger
+from .metrics import metrics
+from .providers import load_plugin
+from .voice_info import VoiceInfo
+
+
+@dataclass(frozen=True)
+class VADProfile:
+    """Silero VAD options and AgentSession endpointing of a kind of caller or line."""
+
+    name: str
+    vad: Dict[str, float] = field(default_factory=dict)
+    min_endpointing_delay: float = 0.5
+    max_endpointing_delay: float = 6.0
+    min_interruption_duration: float = 0.5
+
+    @staticmethod
+    def from_json(name: str, data: dict):
+        return VADProfile(
+            name=name,
+            vad=data.get("vad", {}),
+            min_endpointing_delay=data.get("minEndpointingDelay", 0.5),
+            max_endpointing_delay=data.get("maxEndpointingDelay", 6.0),
+            min_interruption_duration=data.get("minInterruptionDuration", 0.5),
+        )
+
+    @property
+    def session_options(self) -> Dict[str, float]:
+        return {
+            "min_endpointing_delay": self.min_endpointing_delay,
+            "max_endpointing_delay": self.max_endpointing_delay,
+            "min_interruption_duration": self.min_interruption_duration,
+        }
+
+
+_DEFAULT_VAD = {
+    "min_speech_duration": 0.03,
+    "min_silence_duration": 0.3,
+    "prefix_padding_duration": 0.3,
+    "activation_threshold": 0.3,
+}
+
+PROFILES = {
+    "default": VADProfile("default", _DEFAULT_VAD),
+    # short answers on clean lines, e.g. surveys and confirmations
+    "fast": VADProfile(
+        "fast",
+        _DEFAULT_VAD | {"min_silence_duration": 0.2},
+        min_endpointing_delay=0.3,
+    ),
+    # callers who pause mid-sentence, e.g. older callers or dictating details
+    "patient": VADProfile(
+        "patient",
+        _DEFAULT_VAD | {"min_silence_duration": 0.5},
+        min_endpointing_delay=0.8,
+        min_interruption_duration=0.8,
+    ),
+    # background noise, a higher threshold keeps noise from opening turns
+    "noisy": VADProfile(
+        "noisy",
+        _DEFAULT_VAD | {"min_speech_duration": 0.1, "activation_threshold": 0.6},
+        min_interruption_duration=0.8,
+    ),
+}
+PROFILES.update(
+    {name: VADProfile.from_json(name, data) for name, data in env.VAD_PROFILES.items()}
+)
+
+
+def get_profile(agent: VoiceInfo) -> VADProfile:
+    name = agent.vad_profile or env.DEFAULT_VAD_PROFILE
+    profile = PROFILES.get(name)
+    if profile is None:
+        logger.warning("Unknown VAD profile %r, using the default profile", name)
+        profile = PROFILES["default"]
+    return profile
+
+
+def preload_vads(userdata: Dict[str, Any]) -> None:
+    """Load the VAD of every profile, they are shared by all calls of the process."""
+    silero = load_plugin("silero")
+    userdata["vads"] = {name: silero.VAD.load(**p.vad) for name, p in PROFILES.items()}
+
+
+def get_vad(userdata: Dict[str, Any], profile: VADProfile, overrides: Dict[str, float]):
+    """The preloaded VAD of a profile, or one with an experiment's options on top of it."""
+    if not overrides:
+        return userdata["vads"][profile.name]
+    # job processes are reused, keep each variant for the next calls that need it
+    variants = userdata.setdefault("vad_variants", {})
+    key = (profile.name, tuple(sorted(overrides.items())))
+    if key not in variants:
+        variants[key] = load_plugin("silero").VAD.load(**(profile.vad | overrides))
+    return variants[key]
+
+
+def set_min_endpointing_delay(session: AgentSession, delay: float) -> None:
+    session.options.min_endpointing_delay = delay
+    # the running turn detection keeps its own copy of the delay (livekit-agents 1.0)
+    activity = getattr(session, "_activity", None)
+    recognition = getattr(activity, "_audio_recognition", None)
+    if recognition is not None:
+        recognition._min_endpointing_delay = delay
+
+
+class AdaptiveEndpointing:
+    """Tunes the endpointing delay of a call to how its caller speaks.
+
+    A user who starts speaking again within `barge_in_window` seconds of the turn
+    being committed was cut off, the delay goes up by `step_up`. After
+    `clean_turns` turns without such a barge-in the delay goes down by `step_down`.
+    The delay never goes below the median time the STT takes to deliver the final
+    transcript, ending the turn earlier than that gains nothing.
+    """
+
+    def __init__(
+        self,
+        session: AgentSession,
+        profile: VADProfile,
+        *,
+        floor: float = 0.15,
+        ceiling: float = 1.5,
+        step_up: float = 0.15,
+        step_down: float = 0.05,
+        clean_turns: int = 2,
+        barge_in_window: float = 1.5,
+    ) -> None:
+        self._session = session
+        self._delay = session.options.min_endpointing_delay
+        self._floor = floor
+        self._ceiling = max(ceiling, self._delay)
+        self._step_up = step_up
+        self._step_down = step_down
+        self._clean_turns = clean_turns
+        self._barge_in_window = barge_in_window
+        self._profile = profile
+        self._transcription_delays: Deque[float] = deque(maxlen=10)
+        self._committed_at = 0.0
+        self._streak = 0
+        self._turns = 0
+        self._barge_ins = 0
+
+        session.on("user_state_changed", self._on_user_state_changed)
+
+    def collect(self, ev_metrics: AgentMetrics) -> None:
+        if not isinstance(ev_metrics, EOUMetrics):
+            return
+        # emitted when a user turn is committed, unlike the agent thinking, which
+        # greetings and tool call follow-ups do too
+        self._committed_at = time.monotonic()
+        self._transcription_delays.append(ev_metrics.transcription_delay)
+        self._turns += 1
+        self._streak += 1
+        if self._streak >= self._clean_turns:
+            self._streak = 0
+            self._set_delay(self._delay - self._step_down)
+
+    def _on_user_state_changed(self, ev: UserStateChangedEvent) -> None:
+        if ev.new_state != "speaking" or not self._committed_at:
+            return
+        if time.monotonic() - self._committed_at < self._barge_in_window:
+            self._barge_ins += 1
+            self._streak = 0
+            metrics.inc("endpointing_barge_ins_total", profile=self._profile.name)
+            self._set_delay(self._delay + self._step_up)
+        self._committed_at = 0.0
+
+    def _set_delay(self, delay: float) -> None:
+        floor = self._floor
+        if self._transcription_delays:
+            floor = max(floor, statistics.median(self._transcription_delays))
+        delay = round(min(max(delay, floor), self._ceiling), 3)
+        if delay != self._delay:
+            self._delay = delay
+            set_min_endpointing_delay(self._session, delay)
+            logger.info("Endpointing delay set to %.2fs", delay)
+
+    def report(self) -> None:
+        if self._turns:
+            metrics.observe(
+                "endpointing_barge_in_rate",
+                self._barge_ins / self._turns,
+                profile=self._profile.name,
+            )
+        metrics.observe("endpointing_final_delay_seconds", self._delay, profile=self._profile.name)
+        logger.info(
+            "Adaptive endpointing: %.2fs after %d turns, %d barge-ins",
+            self._delay,
+            self._turns,
+            self._barge_ins,
+        )
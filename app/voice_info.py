@@ -1,5 +1,5 @@
 from dataclasses import dataclass
-from typing import Optional
+from typing import List, Optional
 from enum import Enum
 
 
@@ -58,6 +58,16 @@ class VoiceInfo:
     # Relations
     user_id: str
 
+    # Filler attributes, None falls back to the worker defaults
+    filler_after_in_sec: Optional[float] = None
+    filler_phrases: Optional[List[str]] = None
+
+    # Turn taking, None falls back to the worker defaults
+    vad_profile: Optional[str] = None
+    adaptive_endpointing: Optional[bool] = None
+    speculative_llm: Optional[bool] = None
+    response_cache: Optional[bool] = None
+
     @staticmethod
     def from_json(data: dict):
         return VoiceInfo(
@@ -83,4 +93,10 @@ class VoiceInfo:
             llm_begin_message=data["llmBeginMessage"],
             ambient_sound=data["ambientSound"],
             ambient_sound_volume=data["ambientSoundVolume"],
+            filler_after_in_sec=data.get("fillerAfterInSec"),
+            filler_phrases=data.get("fillerPhrases"),
+            vad_profile=data.get("vadProfile"),
+            adaptive_endpointing=data.get("adaptiveEndpointing"),
+            speculative_llm=data.get("speculativeLlm"),
+            response_cache=data.get("responseCache"),
         )
@@ -0,0 +1,63 @@
+"""Outbound call campaign dialer.
+
+Dials every entry of a JSONL campaign file ({"callId", "phoneNumber", "agentId"} per
+line) through a LiveKit outbound SIP trunk. Progress is appended to a log next to
+the campaign file, running the same command again resumes the campaign:
+
+    python dialer.py campaign.jsonl --trunk-id ST_xxx --rate 2 \\
+        --trunk-concurrency 20 --worker-capacity 16
+
+LIVEKIT_URL, LIVEKIT_API_KEY and LIVEKIT_API_SECRET select the LiveKit server,
+point LIVEKIT_URL at livekit_stub.py to try a campaign without placing calls.
+"""
+
+import argparse
+import asyncio
+
+from livekit import api
+
+import app.env  # noqa: F401
+from app.dialer import CampaignDialer, ProgressLog, load_entries
+
+
+async def run(args: argparse.Namespace) -> None:
+    entries = load_entries(args.campaign)
+    progress = ProgressLog(args.progress or f"{args.campaign}.progress")
+    async with api.LiveKitAPI() as lkapi:
+        dialer = CampaignDialer(
+            lkapi,
+            args.trunk_id,
+            progress,
+            rate=args.rate,
+            burst=args.burst,
+            max_concurrent=min(args.trunk_concurrency, args.worker_capacity),
+            agent_name=args.agent_name,
+            ringing_timeout=args.ringing_timeout,
+            poll_interval=args.poll_interval,
+        )
+        await dialer.run(entries)
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("campaign", help="JSONL file of the calls to place")
+    parser.add_argument("--trunk-id", required=True, help="outbound SIP trunk id")
+    parser.add_argument("--progress", help="progress log, defaults to <campaign>.progress")
+    parser.add_argument("--rate", type=float, default=1.0, help="dials per second")
+    parser.add_argument("--burst", type=int, default=1, help="dials started at once")
+    parser.add_argument(
+        "--trunk-concurrency", type=int, default=10, help="concurrent calls the trunk allows"
+    )
+    parser.add_argument(
+        "--worker-capacity", type=int, default=10, help="concurrent calls the workers can serve"
+    )
+    parser.add_argument(
+        "--agent-name", default=app.env.AGENT_NAME, help="dispatch this agent explicitly"
+    )
+    parser.add_argument("--ringing-timeout", type=float, default=30.0)
+    parser.add_argument("--poll-interval", type=float, default=5.0)
+    asyncio.run(run(parser.parse_args()))
+
+
+if __name__ == "__main__":
+    main()
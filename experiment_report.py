@@ -0,0 +1,100 @@
+"""Per-arm latency report of the A/B experiments.
+
+Reads call records as returned by the calls API, one JSON object per line, and
+aggregates the `experiment` summaries the worker stores on them:
+
+    python experiment_report.py calls.jsonl [--metric e2e]
+
+For every experiment and latency (eou, ttft, ttfb, e2e) it prints the calls, mean
+and 95% confidence interval of each arm, with calls as samples. The fastest arm is
+compared to each other arm with Welch's t-test; the p-value uses the normal
+approximation, so only trust it with 30 or more calls per arm.
+"""
+
+import argparse
+import json
+import math
+import statistics
+import sys
+from collections import defaultdict
+from dataclasses import dataclass
+from typing import Dict, List
+
+LATENCIES = ["eou", "ttft", "ttfb", "e2e"]
+
+
+@dataclass
+class ArmStats:
+    name: str
+    samples: List[float]
+
+    @property
+    def mean(self) -> float:
+        return statistics.fmean(self.samples)
+
+    @property
+    def variance(self) -> float:
+        return statistics.variance(self.samples) if len(self.samples) > 1 else 0.0
+
+    @property
+    def ci95(self) -> float:
+        return 1.96 * math.sqrt(self.variance / len(self.samples))
+
+
+def welch_p_value(a: ArmStats, b: ArmStats) -> float:
+    """Two-sided p-value of the difference between the means of two arms."""
+    se = math.sqrt(a.variance / len(a.samples) + b.variance / len(b.samples))
+    if se == 0:
+        return 1.0 if a.mean == b.mean else 0.0
+    z = abs(a.mean - b.mean) / se
+    return math.erfc(z / math.sqrt(2))
+
+
+def load(path: str) -> Dict[str, Dict[str, Dict[str, List[float]]]]:
+    """experiment -> latency -> arm -> per-call means"""
+    samples: Dict[str, Dict[str, Dict[str, List[float]]]] = defaultdict(
+        lambda: defaultdict(lambda: defaultdict(list))
+    )
+    with sys.stdin if path == "-" else open(path) as f:
+        for line in f:
+            if not line.strip():
+                continue
+            summary = json.loads(line).get("experiment")
+            if not summary:
+                continue
+            summary = json.loads(summary)
+            for experiment, arm in summary["arms"].items():
+                for latency in LATENCIES:
+                    if latency in summary:
+                        samples[experiment][latency][arm].append(summary[latency])
+    return samples
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("calls", help="JSONL file of call records, - for stdin")
+    parser.add_argument("--metric", choices=LATENCIES, action="append", help="latencies to report")
+    args = parser.parse_args()
+
+    for experiment, latencies in sorted(load(args.calls).items()):
+        print(f"\n{experiment}")
+        for latency in args.metric or LATENCIES:
+            arms = [ArmStats(name, s) for name, s in sorted(latencies.get(latency, {}).items())]
+            if not arms:
+                continue
+            arms.sort(key=lambda arm: arm.mean)
+            best = arms[0]
+            print(f"  {latency}")
+            for arm in arms:
+                line = (
+                    f"    {arm.name:<20} calls {len(arm.samples):>5}  "
+                    f"mean {arm.mean * 1000:7.0f}ms ± {arm.ci95 * 1000:.0f}ms"
+                )
+                if arm is not best:
+                    line += f"  p={welch_p_value(best, arm):.3f} vs {best.name}"
+                print(line)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,96 @@
+"""Import-time report and startup budget check for the worker.
+
+Runs `python -X importtime -c "import main"` in a fresh interpreter, prints the
+slowest imports and exits non-zero when the startup budget is exceeded or when a
+provider plugin is imported eagerly. Meant to be run in CI:
+
+    python import_budget.py --budget-ms 1200
+"""
+
+import argparse
+import os
+import subprocess
+import sys
+from dataclasses import dataclass
+
+# Plugins are loaded lazily by app.providers, none of them should be imported by main.
+FORBIDDEN_MODULES = [
+    "livekit.plugins.deepgram",
+    "livekit.plugins.elevenlabs",
+    "livekit.plugins.openai",
+    "livekit.plugins.silero",
+    "sarvam.tts",
+    "smallest.tts",
+    "onnxruntime",
+]
+
+
+@dataclass
+class ImportTime:
+    module: str
+    self_us: int
+    cumulative_us: int
+
+
+def measure(target: str) -> list[ImportTime]:
+    env = os.environ.copy()
+    # app.env refuses to import without these, their values don't matter here
+    env.setdefault("SERVER_URL", "http://localhost")
+    env.setdefault("SERVER_API_KEY", "import-budget")
+    proc = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", f"import {target}"],
+        env=env,
+        capture_output=True,
+        text=True,
+        cwd=os.path.dirname(os.path.abspath(__file__)),
+    )
+    if proc.returncode != 0:
+        raise RuntimeError(f"Failed to import {target}:\n{proc.stderr}")
+
+    times = []
+    for line in proc.stderr.splitlines():
+        if not line.startswith("import time:") or "self [us]" in line:
+            continue
+        self_us, cumulative_us, module = line[len("import time:") :].split("|")
+        times.append(ImportTime(module.strip(), int(self_us), int(cumulative_us)))
+    return times
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--target", default="main", help="module to import")
+    parser.add_argument(
+        "--budget-ms",
+        type=float,
+        default=float(os.getenv("IMPORT_BUDGET_MS", "1500")),
+        help="maximum allowed import time in milliseconds",
+    )
+    parser.add_argument("--runs", type=int, default=3, help="best of N runs is reported")
+    parser.add_argument("--top", type=int, default=15, help="number of slowest imports to show")
+    args = parser.parse_args()
+
+    runs = [measure(args.target) for _ in range(args.runs)]
+    times = min(runs, key=lambda t: t[-1].cumulative_us)
+    total_ms = times[-1].cumulative_us / 1000
+
+    print(f"Top {args.top} imports by self time:")
+    for t in sorted(times, key=lambda t: t.self_us, reverse=True)[: args.top]:
+        print(f"  {t.self_us / 1000:8.1f} ms  {t.cumulative_us / 1000:8.1f} ms  {t.module}")
+
+    failed = False
+    imported = {t.module for t in times}
+    for module in FORBIDDEN_MODULES:
+        if module in imported:
+            print(f"FAIL: {module} is imported at startup")
+            failed = True
+
+    print(f"Total import time of {args.target}: {total_ms:.1f} ms (budget {args.budget_ms:.0f} ms)")
+    if total_ms > args.budget_ms:
+        print("FAIL: import time budget exceeded")
+        failed = True
+
+    return 1 if failed else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
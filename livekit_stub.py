@@ -0,0 +1,175 @@
+"""Stub of the LiveKit server API calls of the campaign dialer, to run a campaign locally.
+
+Serves the Twirp endpoints dialer.py uses: CreateSIPParticipant, CreateDispatch,
+ListRooms and DeleteRoom. Nobody is actually called: the outcome of a dial
+depends on the last digit of the number. Numbers ending in 1 are busy, numbers
+ending in 2 don't answer and numbers ending in 3 fail with an internal error.
+Every other number answers, and its call lasts --call-seconds. A dial over
+--trunk-concurrency calls is rejected as resource exhausted, like a trunk at
+capacity.
+
+    python livekit_stub.py --port 7880 &
+    LIVEKIT_URL=http://localhost:7880 LIVEKIT_API_KEY=stub LIVEKIT_API_SECRET=stub \\
+        python dialer.py campaign.jsonl --trunk-id ST_stub --agent-name urbanchat \\
+        --poll-interval 1
+
+When it is stopped, it prints the dials by outcome and the rooms that are still
+open. An open room of a failed dial is a dispatched job that never ends.
+"""
+
+import argparse
+import asyncio
+import signal
+import sys
+import time
+from collections import Counter
+from typing import Dict, Optional, Set
+
+from aiohttp import web
+from livekit import api
+from livekit.protocol import agent_dispatch, models, room, sip
+
+# Last digit of the number -> (outcome, Twirp code, HTTP status, SIP status)
+FAILURES = {
+    "1": ("busy", api.TwirpErrorCode.UNAVAILABLE, 503, "486"),
+    "2": ("no_answer", api.TwirpErrorCode.DEADLINE_EXCEEDED, 408, "480"),
+    "3": ("error", api.TwirpErrorCode.INTERNAL, 500, ""),
+}
+
+
+class TwirpFailure(Exception):
+    def __init__(self, code: str, msg: str, status: int, meta: Optional[dict] = None) -> None:
+        super().__init__(msg)
+        self.body = {"code": code, "msg": msg, "meta": meta or {}}
+        self.status = status
+
+
+class StubServer:
+    def __init__(self, *, call_seconds: float, answer_delay: float, trunk_concurrency: int):
+        self._call_seconds = call_seconds
+        self._answer_delay = answer_delay
+        self._trunk_concurrency = trunk_concurrency
+        # room name -> time its call ends, None while nobody has joined
+        self.rooms: Dict[str, Optional[float]] = {}
+        self.failed_rooms: Set[str] = set()
+        self.stats: Counter = Counter()
+
+    def _expire(self) -> None:
+        now = time.time()
+        for name, ends_at in list(self.rooms.items()):
+            if ends_at is not None and ends_at <= now:
+                del self.rooms[name]
+
+    async def create_dispatch(self, req: agent_dispatch.CreateAgentDispatchRequest):
+        self.stats["dispatches"] += 1
+        # the dispatched job joins the room and waits for the participant
+        self.rooms.setdefault(req.room, None)
+        return agent_dispatch.AgentDispatch(
+            id=f"AD_{self.stats['dispatches']}",
+            agent_name=req.agent_name,
+            room=req.room,
+            metadata=req.metadata,
+        )
+
+    async def create_sip_participant(self, req: sip.CreateSIPParticipantRequest):
+        self._expire()
+        calls = sum(1 for ends_at in self.rooms.values() if ends_at is not None)
+        if self._trunk_concurrency and calls >= self._trunk_concurrency:
+            self.stats["throttled"] += 1
+            raise TwirpFailure(api.TwirpErrorCode.RESOURCE_EXHAUSTED, "trunk at capacity", 429)
+        await asyncio.sleep(self._answer_delay)
+
+        failure = FAILURES.get(req.sip_call_to[-1:])
+        if failure is not None:
+            outcome, code, status, sip_status = failure
+            self.stats[outcome] += 1
+            if req.room_name in self.rooms:
+                self.failed_rooms.add(req.room_name)
+            meta = {"sip_status_code": sip_status} if sip_status else None
+            raise TwirpFailure(code, f"dial {outcome}", status, meta)
+
+        self.stats["answered"] += 1
+        self.rooms[req.room_name] = time.time() + self._call_seconds
+        return sip.SIPParticipantInfo(
+            participant_id=f"PA_{req.participant_identity}",
+            participant_identity=req.participant_identity,
+            room_name=req.room_name,
+            sip_call_id=f"SC_{self.stats['answered']}",
+        )
+
+    async def list_rooms(self, req: room.ListRoomsRequest):
+        self._expire()
+        names = [name for name in self.rooms if not req.names or name in req.names]
+        return room.ListRoomsResponse(rooms=[models.Room(name=name) for name in names])
+
+    async def delete_room(self, req: room.DeleteRoomRequest):
+        self.stats["rooms_deleted"] += 1
+        self.rooms.pop(req.room, None)
+        self.failed_rooms.discard(req.room)
+        return room.DeleteRoomResponse()
+
+    def app(self) -> web.Application:
+        endpoints = [
+            ("AgentDispatchService", "CreateDispatch", self.create_dispatch,
+             agent_dispatch.CreateAgentDispatchRequest),
+            ("SIP", "CreateSIPParticipant", self.create_sip_participant,
+             sip.CreateSIPParticipantRequest),
+            ("RoomService", "ListRooms", self.list_rooms, room.ListRoomsRequest),
+            ("RoomService", "DeleteRoom", self.delete_room, room.DeleteRoomRequest),
+        ]
+        app = web.Application()
+        for service, method, fn, request_class in endpoints:
+            app.router.add_post(f"/twirp/livekit.{service}/{method}", _handler(fn, request_class))
+        return app
+
+    def report(self) -> None:
+        self._expire()
+        leaked = sorted(name for name in self.failed_rooms if name in self.rooms)
+        print("Dials: " + " ".join(f"{k}={v}" for k, v in sorted(self.stats.items())))
+        print(f"Rooms open: {len(self.rooms)}, of failed dials: {len(leaked)} {leaked}")
+
+
+def _handler(fn, request_class):
+    async def handle(request: web.Request) -> web.Response:
+        try:
+            res = await fn(request_class.FromString(await request.read()))
+        except TwirpFailure as e:
+            return web.json_response(e.body, status=e.status)
+        return web.Response(body=res.SerializeToString(), content_type="application/protobuf")
+
+    return handle
+
+
+async def serve(args: argparse.Namespace) -> None:
+    stub = StubServer(
+        call_seconds=args.call_seconds,
+        answer_delay=args.answer_delay,
+        trunk_concurrency=args.trunk_concurrency,
+    )
+    runner = web.AppRunner(stub.app())
+    await runner.setup()
+    await web.TCPSite(runner, args.host, args.port).start()
+    print(f"LiveKit stub listening on http://{args.host}:{args.port}", flush=True)
+    stopped = asyncio.Event()
+    for sig in (signal.SIGINT, signal.SIGTERM):
+        asyncio.get_running_loop().add_signal_handler(sig, stopped.set)
+    await stopped.wait()
+    stub.report()
+    await runner.cleanup()
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=7880)
+    parser.add_argument("--call-seconds", type=float, default=5.0, help="length of answered calls")
+    parser.add_argument("--answer-delay", type=float, default=0.5, help="seconds of ringing")
+    parser.add_argument(
+        "--trunk-concurrency", type=int, default=0, help="calls the trunk allows, 0 for no limit"
+    )
+    asyncio.run(serve(parser.parse_args()))
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -1,4 +1,4 @@
-import json
+import sys
 from typing import Optional
 from livekit import agents, rtc
 from livekit.agents import (
@@ -13,30 +13,44 @@ from livekit.agents import (
     CloseEvent,
     voice,
 )
+from livekit.agents.voice.background_audio import BackgroundAudioPlayer
+from livekit.agents.metrics import EOUMetrics
 import app.env  # noqa: F401
 
-from livekit.plugins import (
-    deepgram,
-    openai,
-    silero,
-)
 import asyncio
 
+from app import serializer
+from app.ambient import AmbientPlayer
 from app.api import (
     get_agent_by_id,
     get_agent_by_phone,
     get_call_by_id,
     register_inbound_call,
 )
-from app.call_info import CallInfo, CallStatus
+from app.call_info import CallDisconnectReason, CallInfo, CallStatus
+from app.call_limiter import CallLimiter
+from app.call_watchdog import CallWatchdog
+from app.experiments import TurnLatencyTracker, assign
+from app.filler import FillerPlayer
 
 from app.assistant import Assistant
+from app.loop_monitor import LoopMonitor
+from app.memory_profiler import MemoryProfiler
+from app.metrics import metrics
+from app.network_stats import NetworkStatsSampler
+from app.providers import (
+    build_llm,
+    build_stt,
+    build_tts,
+    load_all_plugins,
+    load_plugin,
+    stt_config_key,
+)
 from app.usage_collector import AverageUsageCollector
-from app.voice_info import TTSProvider, VoiceInfo
-from sarvam import tts as sarvam
-from livekit.api import LiveKitAPI
+from app.vad_profiles import AdaptiveEndpointing, get_profile, get_vad, preload_vads
+from app.voice_info import VoiceInfo
 
-from app.logger import logger
+from app.logger import logger, set_call_context
 
 import utils
 
@@ -74,12 +88,9 @@ Language: {language_name}
 
 
 def prewarm(job: JobProcess):
-    job.userdata["vad"] = silero.VAD.load(
-        min_speech_duration=0.03,
-        min_silence_duration=0.3,
-        prefix_padding_duration=0.3,
-        activation_threshold=0.3,
-    )
+    for name in app.env.PRELOAD_PLUGINS:
+        load_plugin(name)
+    preload_vads(job.userdata)
 
 
 async def load(ctx: JobContext, p: rtc.RemoteParticipant):
@@ -90,15 +101,20 @@ async def load(ctx: JobContext, p: rtc.RemoteParticipant):
         trunk_phone = p.attributes["sip.trunkPhoneNumber"].lstrip("+")
         phone = p.attributes["sip.phoneNumber"].lstrip("+")
         direction = p.attributes["direction"]
-        agent = VoiceInfo.from_json(await get_agent_by_phone(trunk_phone, direction))
+        # campaigns pick the agent of each call instead of the trunk's outbound agent
+        agent_id = p.attributes.get("agentId") if direction == "outbound" else None
+        if not agent_id:
+            agent = VoiceInfo.from_json(await get_agent_by_phone(trunk_phone, direction))
         if direction == "inbound":
             # Register the SIP call
             call = CallInfo.from_json(await register_inbound_call(phone, trunk_phone))
         elif direction == "outbound":
             call = CallInfo.from_json(await get_call_by_id(p.attributes["callId"]))
+            if agent_id:
+                agent = VoiceInfo.from_json(await get_agent_by_id(agent_id, call.user_id))
 
     if p.kind == rtc.ParticipantKind.PARTICIPANT_KIND_STANDARD:
-        meta = json.loads(ctx.job.metadata or "{}")
+        meta = serializer.loads(ctx.job.metadata or "{}")
         agent_id = meta["agentId"]
         user_id = meta["userId"]
         call_id = meta["callId"]
@@ -113,102 +129,184 @@ async def load(ctx: JobContext, p: rtc.RemoteParticipant):
     return call, agent, is_web_call
 
 
+async def update_ended_call(call: CallInfo, history: Optional[dict]):
+    if history is not None:
+        try:
+            await call.set_transcript(history)
+        except Exception as e:
+            logger.warning("Could not encode transcript: %s", e)
+    # runs in a task nobody awaits, its errors would go unnoticed
+    try:
+        await call.update()
+    except Exception:
+        logger.exception("Failed to update ended call")
+
+
 async def entrypoint(ctx: agents.JobContext):
-    lk_api = LiveKitAPI()
+    set_call_context(jobId=ctx.job.id, room=ctx.job.room.name)
     is_call_ended = False
     usage_collector = AverageUsageCollector()
+    memory_profiler = MemoryProfiler()
+    network_sampler = NetworkStatsSampler(ctx.room)
+    loop_monitor = LoopMonitor()
     call = None
     session = None
+    watchdog = None
+    latency_tracker = None
+    call_slot = None
+    adaptive_endpointing = None
+    assistant = None
+    filler = None
+    background_audio = None
+    background_audio_closed: Optional[asyncio.Task] = None
 
     def on_call_end(reason: str):
-        nonlocal is_call_ended
+        nonlocal is_call_ended, background_audio_closed
         if is_call_ended:
             return
         is_call_ended = True
+        if watchdog:
+            watchdog.stop()
+        memory_profiler.stop()
+        network_sampler.stop()
+        loop_monitor.stop()
+        if filler:
+            filler.stop()
+        if background_audio:
+            # ends the filler and ambient playback and unpublishes their track
+            background_audio_closed = asyncio.create_task(background_audio.aclose())
+        if call_slot:
+            call_slot.release()
 
         if call:
             try:
-                transcript = None
+                history = None
                 if session:
                     try:
                         history = session.history.to_dict()
-                        transcript = json.dumps(history)
                     except Exception as e:
-                        logger.warning(f"Could not get transcript: {e}")
+                        logger.warning("Could not get transcript: %s", e)
 
                 call.call_status = CallStatus.ENDED
                 call.call_end_time = utils.timestamp()
                 call.call_disconnect_reason = reason
-                call.transcript = transcript
+                call.transcript = None
+                # eou, ttft and ttfb
                 call.latency = usage_collector.get_latency()
-
-                logger.info(f"Call ended: {reason}")
-                asyncio.create_task(call.update())
+                call.memory = memory_profiler.summary()
+                call.network = network_sampler.summary()
+                call.event_loop = loop_monitor.summary()
+                if latency_tracker:
+                    call.experiment = latency_tracker.summary()
+                if adaptive_endpointing:
+                    adaptive_endpointing.report()
+                if assistant and assistant.speculative:
+                    assistant.speculative.report()
+                if assistant and assistant.response_cache:
+                    assistant.response_cache.report()
+                if assistant:
+                    assistant.context_window.report()
+
+                logger.info("Call ended: %s", reason)
+                metrics.log()
+                asyncio.create_task(update_ended_call(call, history))
 
             except Exception:
                 logger.exception("Failed during call end cleanup")
         else:
-            logger.warning(f"Call not initialized, but on_call_end triggered. Reason: {reason}")
+            logger.warning("Call not initialized, but on_call_end triggered. Reason: %s", reason)
 
     @ctx.room.on("participant_disconnected")
     def on_participant_disconnected(p: rtc.RemoteParticipant):
-        logger.info(f"Participant disconnected: {p} {p.attributes}")
-        on_call_end("user_hangup")
+        logger.info("Participant disconnected: %s %s", p.identity, dict(p.attributes))
+        on_call_end(CallDisconnectReason.USER_HANGUP.value)
 
     async def on_shutdown(reason: str):
-        logger.info(f"Shutdown hook called: {reason}")
+        logger.info("Shutdown hook called: %s", reason)
         if not is_call_ended:
-            on_call_end("unknown")
+            on_call_end(CallDisconnectReason.UNKNOWN.value)
+        if background_audio_closed:
+            await background_audio_closed
 
     ctx.add_shutdown_callback(on_shutdown)
 
     try:
         await ctx.connect(auto_subscribe=AutoSubscribe.AUDIO_ONLY)
+        memory_profiler.start()
+        network_sampler.start()
+        loop_monitor.start()
 
         participant = await ctx.wait_for_participant()
-        logger.info(f"attributes: {participant.attributes} metadata: {ctx.job.metadata}")
+        logger.info(
+            "attributes: %s metadata: %s", dict(participant.attributes), ctx.job.metadata
+        )
 
         call, agent, is_web_call = await load(ctx, participant)
-        logger.info(f"call: {call}, agent: {agent}, is_web_call: {is_web_call}")
-
-        if agent.tts_provider == TTSProvider.sarvam:
-            language = {
-                "hi": "hi-IN",
-                "en": "en-IN",
-            }[agent.language]
-            tts = sarvam.TTS(
-                speaker=agent.tts_voice_id,
-                target_language_code=language,
-                model=agent.tts_model,
-                pace=agent.tts_speed,
-                loudness=agent.tts_volume,
-            )
-        else:
-            raise ValueError(f"Unsupported TTS provider: {agent.tts_provider}")
+        set_call_context(callId=call.id, agentId=agent.id)
+        logger.info("call: %s, agent: %s, is_web_call: %s", call, agent, is_web_call)
 
+        # before any provider connection is made, a rejected call costs nothing
+        call_slot = await CallLimiter().acquire(call.user_id, agent.id)
+        if call_slot is None:
+            on_call_end(CallDisconnectReason.CONCURRENT_CALL_LIMIT_REACHED.value)
+            ctx.delete_room()
+            return
+
+        agent, assignment = assign(call.id, agent)
+        vad_profile = get_profile(agent)
         session = AgentSession(
-            stt=deepgram.STT(model="nova-3", language="multi"),
-            llm=openai.LLM(model=agent.llm_model, temperature=agent.llm_temperature),
-            tts=tts,
-            vad=ctx.proc.userdata["vad"],
+            stt=build_stt(agent),
+            llm=build_llm(agent),
+            tts=build_tts(agent),
+            vad=get_vad(ctx.proc.userdata, vad_profile, assignment.vad_options),
+            **(vad_profile.session_options | assignment.session_options),
         )
+        latency_tracker = TurnLatencyTracker(session, assignment)
+        if (
+            agent.adaptive_endpointing
+            if agent.adaptive_endpointing is not None
+            else app.env.ADAPTIVE_ENDPOINTING
+        ):
+            adaptive_endpointing = AdaptiveEndpointing(session, vad_profile)
+
+        stt_config = stt_config_key(agent)
 
         @session.on("metrics_collected")
         def _on_metrics_collected(ev: MetricsCollectedEvent):
             usage_collector.collect(ev.metrics)
+            latency_tracker.collect(ev.metrics)
+            if adaptive_endpointing:
+                adaptive_endpointing.collect(ev.metrics)
+            if assistant:
+                assistant.context_window.collect(ev.metrics)
+            if isinstance(ev.metrics, EOUMetrics):
+                # end of speech to final transcript, to compare STT configurations
+                metrics.observe(
+                    "stt_final_transcript_delay_seconds",
+                    ev.metrics.transcription_delay,
+                    stt=stt_config,
+                )
 
         @session.on("close")
         def _on_close(ev: CloseEvent):
-            logger.info(f"Session closed: {ev}")
+            logger.info("Session closed: %s", ev)
             if ev.error:
                 on_call_end(ev.error.type)
             else:
-                on_call_end("unknown")
+                on_call_end(CallDisconnectReason.UNKNOWN.value)
             ctx.delete_room()
 
+        watchdog = CallWatchdog(
+            session, agent, on_timeout=lambda reason: on_call_end(reason.value)
+        )
+
+        background_audio = BackgroundAudioPlayer()
+        filler = FillerPlayer(session, agent, background_audio)
+        ambient = AmbientPlayer(agent, background_audio)
+
         @session.on("error")
         def _on_error(ev: ErrorEvent):
-            logger.error(f"Session error: {ev.error.type}")
+            logger.error("Session error: %s", ev.error.type)
 
         def on_call_ongoing():
             call.call_status = CallStatus.ONGOING
@@ -226,11 +324,12 @@ async def entrypoint(ctx: agents.JobContext):
             )
         )
 
+        assistant = Assistant(
+            voice_info=agent, instructions=f"{prompt}.\n{agent.llm_general_prompt}"
+        )
         await session.start(
             room=ctx.room,
-            agent=Assistant(
-                voice_info=agent, instructions=f"{prompt}.\n{agent.llm_general_prompt}"
-            ),
+            agent=assistant,
             room_input_options=RoomInputOptions(
                 text_enabled=True,
                 audio_enabled=True,
@@ -241,8 +340,16 @@ async def entrypoint(ctx: agents.JobContext):
             ),
         )
         logger.info("Session started")
+        if filler.enabled or ambient.enabled:
+            await background_audio.start(room=ctx.room)
+        if filler.enabled:
+            # clips are synthesised on the first call of a voice, don't hold the greeting for it
+            asyncio.create_task(filler.start())
+        if ambient.enabled:
+            asyncio.create_task(ambient.start())
         # Register the call as ongoing
         on_call_ongoing()
+        watchdog.start()
         # beign message
         if agent.llm_begin_message is None:
             session.generate_reply(user_input="Welcome user with a greeting message.")
@@ -255,10 +362,19 @@ async def entrypoint(ctx: agents.JobContext):
 
 
 if __name__ == "__main__":
+    # Plugins can only be imported on the main thread. `console` runs jobs in threads of
+    # this process (and `download-files` only sees imported plugins), so every plugin a
+    # call may build is imported now; other modes import silero and PRELOAD_PLUGINS.
+    if {"console", "dev", "download-files"} & set(sys.argv[1:]):
+        load_all_plugins()
+    else:
+        for name in ["silero", *app.env.PRELOAD_PLUGINS]:
+            load_plugin(name)
     agents.cli.run_app(
         agents.WorkerOptions(
             entrypoint_fnc=entrypoint,
             prewarm_fnc=prewarm,
             shutdown_process_timeout=20,
+            agent_name=app.env.AGENT_NAME,
         )
     )
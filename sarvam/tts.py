@@ -3,18 +3,23 @@ from typing import Literal
 
 import asyncio
 import base64
-import io
+import contextlib
+import dataclasses
 import os
-import wave
+import struct
+import time
 from dataclasses import dataclass
+from email.utils import parsedate_to_datetime
+from typing import AsyncContextManager, AsyncIterator, Protocol
 
 import aiohttp
 
-from livekit import rtc
 from livekit.agents import (
     APIConnectionError,
+    APIError,
     APIStatusError,
     APITimeoutError,
+    tokenize,
     tts,
     utils,
     APIConnectOptions,
@@ -23,6 +28,11 @@ from livekit.agents import (
 
 import logging
 
+try:
+    from orjson import loads as json_loads
+except ImportError:
+    from json import loads as json_loads
+
 logger = logging.getLogger("sarvam")
 
 TTSEncoding = Literal["wav",]
@@ -50,6 +60,18 @@ TTSVoices = Literal[
 
 SARVAM_TTS_BASE_URL = "https://api.sarvam.ai/text-to-speech"
 
+# Response bytes read and base64 characters decoded between cancellation points
+READ_CHUNK_SIZE = 64 * 1024
+DECODE_CHUNK_SIZE = 64 * 1024  # must be a multiple of 4
+
+# Standard frame duration for WebRTC is 20ms
+FRAME_DURATION_MS = 20
+
+# Request priorities: greetings and first sentences, which the caller is waiting on in
+# silence, and the rest of a reply, which is synthesised while the start plays
+PRIORITY_FIRST = 0
+PRIORITY_NORMAL = 1
+
 # Sarvam TTS specific models and speakers
 SarvamTTSModels = Literal["bulbul:v1", "bulbul:v2"]
 SarvamTTSSpeakers = Literal[
@@ -112,12 +134,73 @@ class _TTSOptions:
     base_url: str = SARVAM_TTS_BASE_URL
 
 
-class TTS(tts.TTS):
+class RequestGate(Protocol):
+    """Admits the TTS requests, e.g. to share a rate limit between processes."""
+
+    def slot(self, priority: int, queued_at: float | None = None) -> AsyncContextManager[None]:
+        """Held for the duration of a request, waits until the request may be sent.
+
+        `queued_at` is the time.monotonic() of the request's first attempt, a gate
+        bounds the wait of all its attempts together.
+        """
+        ...
+
+    async def throttled(self, retry_after: float | None) -> None:
+        """Called on a 429 response with its Retry-After in seconds, if any."""
+        ...
+
+
+@contextlib.asynccontextmanager
+async def _no_gate() -> AsyncIterator[None]:
+    yield
+
+
+def _retry_after(value: str | None) -> float | None:
+    """Seconds to wait from a Retry-After header, in seconds or an HTTP date."""
+    if not value:
+        return None
+    try:
+        return max(float(value), 0.0)
+    except ValueError:
+        pass
+    try:
+        return max(parsedate_to_datetime(value).timestamp() - time.time(), 0.0)
+    except (TypeError, ValueError):
+        return None
+
+
+@dataclass
+class SynthesisCancelledEvent:
+    """Emitted as "synthesis_cancelled" when work for a sentence is abandoned.
+
+    Args:
+        characters: Characters of the sentence
+        bytes: Response bytes that were not downloaded plus decoded audio bytes that
+            were not framed
+        sent: Whether the request had been sent, False for queued sentences that
+            were dropped before reaching the API
+    """
+
+    characters: int
+    bytes: int
+    sent: bool
+
+
+class TTS(tts.TTS[Literal["synthesis_cancelled"]]):
     """Sarvam.ai Text-to-Speech implementation.
 
     This class provides text-to-speech functionality using the Sarvam.ai API.
     Sarvam.ai specializes in high-quality TTS for Indian languages.
 
+    Sentences are synthesised one request at a time. When the stream is closed, for
+    example because the caller barged in, the in-flight request is aborted and queued
+    sentences are dropped before being sent.
+
+    A `request_gate` can hold requests back to stay under the API's rate limits.
+    Greetings (the sentences of the first stream) and the first sentence of every
+    reply are requested with PRIORITY_FIRST. A 429 response is reported to the gate
+    and retried.
+
     Args:
         target_language_code: BCP-47 language code, e.g., "hi-IN"
         model: Sarvam TTS model to use
@@ -131,6 +214,8 @@ class TTS(tts.TTS):
         api_key: Sarvam.ai API key (falls back to SARVAM_API_KEY env var)
         base_url: API endpoint URL
         http_session: Optional aiohttp session to use
+        sentence_tokenizer: Tokenizer used to split streamed text into requests
+        request_gate: Optional gate every request waits on before being sent
     """
 
     def __init__(
@@ -148,9 +233,11 @@ class TTS(tts.TTS):
         api_key: str | None = None,
         base_url: str = SARVAM_TTS_BASE_URL,
         http_session: aiohttp.ClientSession | None = None,
+        sentence_tokenizer: tokenize.SentenceTokenizer | None = None,
+        request_gate: RequestGate | None = None,
     ) -> None:
         super().__init__(
-            capabilities=tts.TTSCapabilities(streaming=False),
+            capabilities=tts.TTSCapabilities(streaming=True),
             sample_rate=speech_sample_rate,
             num_channels=num_channels,
         )
@@ -174,7 +261,10 @@ class TTS(tts.TTS):
             base_url=base_url,
         )
         self._session = http_session
+        self._sentence_tokenizer = sentence_tokenizer or tokenize.basic.SentenceTokenizer()
         self._logger = logger.getChild(self.__class__.__name__)
+        self._request_gate = request_gate
+        self._streams = 0
 
     def _ensure_session(self) -> aiohttp.ClientSession:
         if not self._session:
@@ -186,6 +276,7 @@ class TTS(tts.TTS):
         text: str,
         *,
         conn_options: APIConnectOptions = DEFAULT_API_CONNECT_OPTIONS,
+        priority: int = PRIORITY_NORMAL,
     ) -> ChunkedStream:
         return ChunkedStream(
             tts=self,
@@ -193,11 +284,51 @@ class TTS(tts.TTS):
             conn_options=conn_options,
             session=self._ensure_session(),
             opts=self._opts,
+            priority=priority,
         )
 
+    def stream(
+        self,
+        *,
+        conn_options: APIConnectOptions = DEFAULT_API_CONNECT_OPTIONS,
+    ) -> SynthesizeStream:
+        self._streams += 1
+        return SynthesizeStream(
+            tts=self,
+            conn_options=conn_options,
+            sentence_tokenizer=self._sentence_tokenizer,
+            greeting=self._streams == 1,
+        )
+
+
+def _parse_wav_header(data: bytes) -> tuple[int, int, int, int]:
+    """Return the sample rate, channel count, sample width and PCM offset of a WAV."""
+    if data[:4] != b"RIFF" or data[8:12] != b"WAVE":
+        raise APIConnectionError("Sarvam TTS API response invalid: not a WAV file")
+
+    fmt = None
+    offset = 12
+    while offset + 8 <= len(data):
+        chunk_id, size = struct.unpack_from("<4sI", data, offset)
+        if chunk_id == b"fmt ":
+            num_channels, sample_rate = struct.unpack_from("<HI", data, offset + 10)
+            (bits_per_sample,) = struct.unpack_from("<H", data, offset + 22)
+            fmt = (sample_rate, num_channels, bits_per_sample // 8)
+        elif chunk_id == b"data":
+            if fmt is None:
+                break
+            return (*fmt, offset + 8)
+        offset += 8 + size + (size & 1)
+
+    raise APIConnectionError("Sarvam TTS API response invalid: no WAV data chunk")
+
 
 class ChunkedStream(tts.ChunkedStream):
-    """Synthesize using the Sarvam.ai API in chunks (LiveKit compatible)."""
+    """Synthesize using the Sarvam.ai API in chunks (LiveKit compatible).
+
+    The response is read, decoded and framed in chunks with a cancellation point
+    between each, so closing the stream stops the download and decoding right away.
+    """
 
     def __init__(
         self,
@@ -207,11 +338,14 @@ class ChunkedStream(tts.ChunkedStream):
         opts: _TTSOptions,
         conn_options: APIConnectOptions,
         session: aiohttp.ClientSession,
+        priority: int = PRIORITY_NORMAL,
     ) -> None:
         super().__init__(tts=tts, input_text=input_text, conn_options=conn_options)
         self._tts = tts
         self._session = session
         self._opts = opts
+        self._priority = priority
+        self._queued_at: float | None = None
 
     async def _run(self) -> None:
         # Prepare payload and headers as in _synthesize_impl
@@ -231,105 +365,191 @@ class ChunkedStream(tts.ChunkedStream):
             "api-subscription-key": opts.api_key,
             "Content-Type": "application/json",
         }
-        _request_id = ""
+        # bytes still expected from the API and decoded audio not framed yet,
+        # reported as wasted work if the stream is cancelled
+        pending_bytes = 0
+        sent = False
+        gate = self._tts._request_gate
+        if self._queued_at is None:
+            self._queued_at = time.monotonic()
         try:
-            async with self._session.post(
-                url=self._opts.base_url,
-                json=payload,
-                headers=headers,
-                timeout=aiohttp.ClientTimeout(total=20.0),  # Adjust timeout as needed
-            ) as res:
-                if res.status != 200:
-                    error_text = await res.text()
-                    raise APIStatusError(
-                        message=f"Sarvam TTS API Error: {error_text}",
-                        status_code=res.status,
-                    )
-
-                response_json = await res.json()
-                _request_id = response_json.get("request_id", "")  # Store request_id
-
-                # Sarvam returns a list of base64 audios, we'll take the first one.
-                if (
-                    not response_json.get("audios")
-                    or not isinstance(response_json["audios"], list)
-                    or len(response_json["audios"]) == 0
-                ):
-                    raise APIConnectionError(
-                        "Sarvam TTS API response invalid: no audio data"
-                    )
-
-                base64_wav = response_json["audios"][0]
-                wav_bytes = base64.b64decode(base64_wav)
-                logger.debug("------- %s %d", self._input_text, len(base64_wav))
-
-                # Parse WAV and generate AudioFrames
-                # Standard frame duration for WebRTC is 20ms, but can be 10ms. Let's use 20ms.
-                frame_duration_ms = 20
-
-                with io.BytesIO(wav_bytes) as wav_io:
-                    with wave.open(wav_io, "rb") as wf:
-                        sample_rate = wf.getframerate()
-                        num_channels = wf.getnchannels()
-                        sample_width = wf.getsampwidth()  # Bytes per sample
-
-                        if sample_rate != self._opts.speech_sample_rate:
-                            # self._logger.warning(
-                            #     f"Sarvam TTS output sample rate {sample_rate} differs "
-                            #     f"from requested {self._opts.speech_sample_rate}"
-                            # )
-
-                            # Use actual sample rate from WAV for frame calculation
-                            pass
-                        samples_per_channel_val = (
-                            sample_rate * frame_duration_ms
-                        ) // 1000  # Renamed for clarity
-                        # For mono, samples_per_channel_val is samples_per_frame.
-                        # If stereo, it would be samples_per_frame / num_channels.
-                        # Since num_channels is 1, samples_per_channel_val is correct here.
-
-                        bytes_per_frame = (
-                            samples_per_channel_val * num_channels * sample_width
+            async with gate.slot(self._priority, self._queued_at) if gate else _no_gate():
+                sent = True
+                async with self._session.post(
+                    url=self._opts.base_url,
+                    json=payload,
+                    headers=headers,
+                    timeout=aiohttp.ClientTimeout(total=20.0),  # Adjust timeout as needed
+                ) as res:
+                    if res.status == 429 and gate:
+                        await gate.throttled(_retry_after(res.headers.get("Retry-After")))
+                    if res.status != 200:
+                        error_text = await res.text()
+                        raise APIStatusError(
+                            message=f"Sarvam TTS API Error: {error_text}",
+                            status_code=res.status,
+                            # 5xx are retryable, other 4xx aren't. The gate holds the
+                            # retry of a 429 until the limit has passed.
+                            retryable=True if res.status == 429 else None,
                         )
 
-                        emitter = tts.SynthesizedAudioEmitter(
-                            event_ch=self._event_ch,
-                            request_id=_request_id,
+                    pending_bytes = res.content_length or 0
+                    body = bytearray()
+                    async for chunk in res.content.iter_chunked(READ_CHUNK_SIZE):
+                        body += chunk
+                        pending_bytes = max(pending_bytes - len(chunk), 0)
+
+            # a response carries the whole utterance as base64, decoding it would
+            # block the event loop for milliseconds
+            response_json = await asyncio.to_thread(json_loads, body)
+            del body
+            _request_id = response_json.get("request_id", "")  # Store request_id
+
+            # Sarvam returns a list of base64 audios, we'll take the first one.
+            if (
+                not response_json.get("audios")
+                or not isinstance(response_json["audios"], list)
+                or len(response_json["audios"]) == 0
+            ):
+                raise APIConnectionError("Sarvam TTS API response invalid: no audio data")
+
+            base64_wav = response_json["audios"][0]
+            logger.debug("------- %s %d", self._input_text, len(base64_wav))
+            pending_bytes = len(base64_wav) * 3 // 4
+
+            emitter = tts.SynthesizedAudioEmitter(
+                event_ch=self._event_ch,
+                request_id=_request_id,
+            )
+            audio_bstream: utils.audio.AudioByteStream | None = None
+            for i in range(0, len(base64_wav), DECODE_CHUNK_SIZE):
+                data = base64.b64decode(base64_wav[i : i + DECODE_CHUNK_SIZE])
+                pending_bytes = max(pending_bytes - len(data), 0)
+                if audio_bstream is None:
+                    # the header is in the first chunk, the sample rate of the WAV
+                    # is used even if it differs from the requested one
+                    sample_rate, num_channels, sample_width, offset = _parse_wav_header(data)
+                    if sample_width != 2:
+                        raise APIConnectionError(
+                            f"Sarvam TTS API response invalid: {sample_width * 8}-bit audio"
                         )
-
-                        while True:
-                            frame_data = wf.readframes(
-                                samples_per_channel_val
-                            )  # Read based on samples per channel
-                            if not frame_data:
-                                break
-
-                            current_length = len(frame_data)
-                            if current_length < bytes_per_frame:
-                                # Pad with silence (zeros)
-                                padding_needed = bytes_per_frame - current_length
-                                frame_data += b"\x00" * padding_needed
-
-                            audio_frame = rtc.AudioFrame(
-                                data=frame_data,
-                                sample_rate=sample_rate,  # Use actual sample rate from WAV
-                                num_channels=num_channels,
-                                samples_per_channel=samples_per_channel_val,
-                            )
-                            # yield tts.SynthesizedAudio(
-                            #     request_id=_request_id, frame=audio_frame
-                            # )
-                            # self._event_ch.send_nowait(
-                            #     tts.SynthesizedAudio(
-                            #         request_id=_request_id, frame=audio_frame
-                            #     )
-                            # )
-                            emitter.push(audio_frame)
-                        emitter.flush()
-
+                    audio_bstream = utils.audio.AudioByteStream(
+                        sample_rate=sample_rate,
+                        num_channels=num_channels,
+                        samples_per_channel=sample_rate * FRAME_DURATION_MS // 1000,
+                    )
+                    data = data[offset:]
+
+                for frame in audio_bstream.write(data):
+                    emitter.push(frame)
+                # let a pending cancellation in before decoding the next chunk
+                await asyncio.sleep(0)
+
+            if audio_bstream is not None:
+                for frame in audio_bstream.flush():
+                    emitter.push(frame)
+            emitter.flush()
+
+        except asyncio.CancelledError:
+            self._tts.emit(
+                "synthesis_cancelled",
+                SynthesisCancelledEvent(
+                    characters=len(self._input_text), bytes=pending_bytes, sent=sent
+                ),
+            )
+            raise
+        except APIError as e:
+            if not e.retryable:
+                # livekit-agents 1.0 retries every APIError, unless max_retry is 0 when
+                # the attempt fails
+                self._conn_options = dataclasses.replace(self._conn_options, max_retry=0)
+            raise
         except asyncio.TimeoutError as e:
             raise APITimeoutError("Sarvam TTS API request timed out") from e
         except aiohttp.ClientError as e:
             raise APIConnectionError(f"Sarvam TTS API connection error: {e}") from e
         except Exception as e:
             raise APIConnectionError(f"Unexpected error in Sarvam TTS: {e}") from e
+
+
+class SynthesizeStream(tts.SynthesizeStream):
+    """Streams text into sentences and synthesises them one request at a time.
+
+    Unlike the generic StreamAdapter, the request of the current sentence is closed
+    when the stream is, and sentences still queued are dropped without being sent.
+
+    Each sentence's request is retried on its own. The stream itself isn't: its input
+    is consumed by the first attempt, a second one would end without audio.
+    """
+
+    def __init__(
+        self,
+        *,
+        tts: TTS,
+        conn_options: APIConnectOptions,
+        sentence_tokenizer: tokenize.SentenceTokenizer,
+        greeting: bool = False,
+    ) -> None:
+        super().__init__(tts=tts, conn_options=dataclasses.replace(conn_options, max_retry=0))
+        self._request_options = conn_options
+        self._sent_stream = sentence_tokenizer.stream()
+        self._greeting = greeting
+
+    async def _metrics_monitor_task(self, event_aiter) -> None:
+        # each sentence's ChunkedStream reports its own metrics
+        async for _ in event_aiter:
+            pass
+
+    async def _run(self) -> None:
+        # None marks the end of the input
+        sentences: asyncio.Queue[str | None] = asyncio.Queue()
+
+        async def _forward_input():
+            async for data in self._input_ch:
+                if isinstance(data, self._FlushSentinel):
+                    self._sent_stream.flush()
+                    continue
+                self._sent_stream.push_text(data)
+
+            self._sent_stream.end_input()
+
+        async def _tokenize():
+            async for ev in self._sent_stream:
+                sentences.put_nowait(ev.token)
+            sentences.put_nowait(None)
+
+        async def _synthesize():
+            priority = PRIORITY_FIRST
+            while (sentence := await sentences.get()) is not None:
+                last_audio: tts.SynthesizedAudio | None = None
+                # leaving the block closes the request, also when we are cancelled
+                async with self._tts.synthesize(
+                    sentence, conn_options=self._request_options, priority=priority
+                ) as stream:
+                    async for audio in stream:
+                        if last_audio is not None:
+                            self._event_ch.send_nowait(last_audio)
+                        last_audio = audio
+
+                if last_audio is not None:
+                    last_audio.is_final = True
+                    self._event_ch.send_nowait(last_audio)
+                if not self._greeting:
+                    priority = PRIORITY_NORMAL
+
+        tasks = [
+            asyncio.create_task(_forward_input()),
+            asyncio.create_task(_tokenize()),
+            asyncio.create_task(_synthesize()),
+        ]
+        try:
+            await asyncio.gather(*tasks)
+        finally:
+            await utils.aio.cancel_and_wait(*tasks)
+            while not sentences.empty():
+                sentence = sentences.get_nowait()
+                if sentence:
+                    self._tts.emit(
+                        "synthesis_cancelled",
+                        SynthesisCancelledEvent(characters=len(sentence), bytes=0, sent=False),
+                    )
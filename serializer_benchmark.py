@@ -0,0 +1,109 @@
+"""CPU time per call spent on JSON, stdlib json against app.serializer's backend.
+
+Times the documents a call serializes with synthetic data of realistic size: the
+agent config, the call record updates, the transcript and the Sarvam TTS responses
+(base64 WAV of each agent turn):
+
+    python serializer_benchmark.py [--turns 20] [--turn-seconds 4]
+"""
+
+import argparse
+import base64
+import json
+import os
+import sys
+import time
+from typing import Any, Callable
+
+# app.env refuses to import without these, their values don't matter here
+os.environ.setdefault("SERVER_URL", "http://localhost")
+os.environ.setdefault("SERVER_API_KEY", "serializer-benchmark")
+
+from app import serializer  # noqa: E402
+
+SARVAM_SAMPLE_RATE = 22050
+
+
+def stdlib_dumps(obj: Any) -> bytes:
+    return json.dumps(obj).encode()
+
+
+def best_of(fn: Callable[[], Any], runs: int) -> float:
+    times = []
+    for _ in range(runs):
+        started_at = time.perf_counter()
+        fn()
+        times.append(time.perf_counter() - started_at)
+    return min(times)
+
+
+def documents(turns: int, turn_seconds: float) -> dict:
+    agent = {
+        "id": "agent",
+        "name": "Support",
+        "llmGeneralPrompt": "You are a helpful support agent. " * 200,
+        "fillerPhrases": ["Hmm", "One moment"],
+    }
+    history = {
+        "items": [
+            {
+                "id": f"item_{i}",
+                "type": "message",
+                "role": "user" if i % 2 else "assistant",
+                "content": ["सुनिए, मेरा ऑर्डर अभी तक नहीं आया है, कृपया देखिए। " * 3],
+                "interrupted": False,
+            }
+            for i in range(turns * 2)
+        ]
+    }
+    update = {
+        "callStatus": "ended",
+        "cost": 0.0,
+        "transcript": json.dumps(history),
+        "latency": json.dumps({"ttft": [0.4] * turns}),
+    }
+    audio = os.urandom(int(turn_seconds * SARVAM_SAMPLE_RATE * 2))
+    tts = {"request_id": "x", "audios": [base64.b64encode(audio).decode()]}
+    return {"agent": agent, "history": history, "update": update, "tts": tts}
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--turns", type=int, default=20, help="agent turns per call")
+    parser.add_argument("--turn-seconds", type=float, default=4, help="audio per agent turn")
+    parser.add_argument("--runs", type=int, default=20, help="best of N runs is reported")
+    args = parser.parse_args()
+
+    docs = documents(args.turns, args.turn_seconds)
+    encoded = {name: stdlib_dumps(doc) for name, doc in docs.items()}
+    # (document, encode or decode, times per call)
+    work = [
+        ("agent", "decode", 1),
+        ("history", "encode", 1),
+        ("update", "encode", 3),
+        ("tts", "decode", args.turns),
+    ]
+
+    print(f"Backend: {serializer.BACKEND}, {args.turns} turns of {args.turn_seconds:.0f}s")
+    totals = [0.0, 0.0]
+    for name, op, count in work:
+        if op == "encode":
+            fns = [lambda: stdlib_dumps(docs[name]), lambda: serializer.dumps(docs[name])]
+        else:
+            fns = [lambda: json.loads(encoded[name]), lambda: serializer.loads(encoded[name])]
+        stdlib_time, backend_time = (best_of(fn, args.runs) for fn in fns)
+        totals[0] += stdlib_time * count
+        totals[1] += backend_time * count
+        print(
+            f"  {op} {name:<8} {len(encoded[name]) / 1024:8.0f} KiB x{count:<3} "
+            f"json {stdlib_time * 1e6:8.0f} us  {serializer.BACKEND} {backend_time * 1e6:8.0f} us"
+        )
+    print(
+        f"Per call: json {totals[0] * 1000:.2f} ms, {serializer.BACKEND} "
+        f"{totals[1] * 1000:.2f} ms, {(totals[0] - totals[1]) * 1000:.2f} ms saved"
+    )
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
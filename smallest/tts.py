@@ -0,0 +1,184 @@
+from __future__ import annotations
+
+import asyncio
+import os
+from dataclasses import dataclass
+from typing import Literal
+
+import aiohttp
+
+from livekit.agents import (
+    APIConnectionError,
+    APIStatusError,
+    APITimeoutError,
+    tts,
+    utils,
+    APIConnectOptions,
+    DEFAULT_API_CONNECT_OPTIONS,
+)
+
+import logging
+
+logger = logging.getLogger("smallest")
+
+SMALLEST_TTS_BASE_URL = "https://waves-api.smallest.ai/api/v1"
+
+SmallestTTSModels = Literal["lightning", "lightning-large"]
+
+
+@dataclass
+class _TTSOptions:
+    """Options for the Smallest.ai (Waves) TTS service.
+
+    Args:
+        model: The Waves model to use
+        voice_id: Voice to use for synthesis
+        speed: Speech rate multiplier (0.5 to 2.0)
+        sample_rate: Audio sample rate (8000 to 24000)
+        api_key: Smallest.ai API key
+        base_url: API endpoint URL, the model name is appended to it
+    """
+
+    voice_id: str
+    model: SmallestTTSModels | str = "lightning"
+    speed: float = 1.0
+    sample_rate: int = 24000
+    api_key: str | None = None
+    base_url: str = SMALLEST_TTS_BASE_URL
+
+
+class TTS(tts.TTS):
+    """Smallest.ai (Waves) Text-to-Speech implementation.
+
+    Requests raw 16-bit PCM so audio frames can be pushed while the response
+    is still being downloaded.
+
+    Args:
+        voice_id: Voice to use for synthesis
+        model: Waves model to use
+        speed: Speech rate multiplier (0.5 to 2.0)
+        sample_rate: Audio sample rate in Hz
+        api_key: Smallest.ai API key (falls back to SMALLEST_API_KEY env var)
+        base_url: API endpoint URL
+        http_session: Optional aiohttp session to use
+    """
+
+    def __init__(
+        self,
+        *,
+        voice_id: str,
+        model: SmallestTTSModels | str = "lightning",
+        speed: float = 1.0,
+        sample_rate: int = 24000,
+        api_key: str | None = None,
+        base_url: str = SMALLEST_TTS_BASE_URL,
+        http_session: aiohttp.ClientSession | None = None,
+    ) -> None:
+        super().__init__(
+            capabilities=tts.TTSCapabilities(streaming=False),
+            sample_rate=sample_rate,
+            num_channels=1,
+        )
+
+        api_key = api_key or os.environ.get("SMALLEST_API_KEY")
+        if not api_key:
+            raise ValueError(
+                "Smallest API key is required. Provide it directly or set SMALLEST_API_KEY env var."
+            )
+
+        self._opts = _TTSOptions(
+            voice_id=voice_id,
+            model=model,
+            speed=speed,
+            sample_rate=sample_rate,
+            api_key=api_key,
+            base_url=base_url,
+        )
+        self._session = http_session
+
+    def _ensure_session(self) -> aiohttp.ClientSession:
+        if not self._session:
+            self._session = utils.http_context.http_session()
+        return self._session
+
+    def synthesize(
+        self,
+        text: str,
+        *,
+        conn_options: APIConnectOptions = DEFAULT_API_CONNECT_OPTIONS,
+    ) -> ChunkedStream:
+        return ChunkedStream(
+            tts=self,
+            input_text=text,
+            conn_options=conn_options,
+            session=self._ensure_session(),
+            opts=self._opts,
+        )
+
+
+class ChunkedStream(tts.ChunkedStream):
+    """Synthesize using the Smallest.ai API, streaming the PCM response body."""
+
+    def __init__(
+        self,
+        *,
+        tts: TTS,
+        input_text: str,
+        opts: _TTSOptions,
+        conn_options: APIConnectOptions,
+        session: aiohttp.ClientSession,
+    ) -> None:
+        super().__init__(tts=tts, input_text=input_text, conn_options=conn_options)
+        self._session = session
+        self._opts = opts
+
+    async def _run(self) -> None:
+        request_id = utils.shortuuid()
+        payload = {
+            "text": self._input_text,
+            "voice_id": self._opts.voice_id,
+            "speed": self._opts.speed,
+            "sample_rate": self._opts.sample_rate,
+            "add_wav_header": False,
+        }
+        headers = {
+            "Authorization": f"Bearer {self._opts.api_key}",
+            "Content-Type": "application/json",
+        }
+        audio_bstream = utils.audio.AudioByteStream(
+            sample_rate=self._opts.sample_rate,
+            num_channels=1,
+        )
+        try:
+            async with self._session.post(
+                url=f"{self._opts.base_url}/{self._opts.model}/get_speech",
+                json=payload,
+                headers=headers,
+                timeout=aiohttp.ClientTimeout(total=20.0),
+            ) as res:
+                if res.status != 200:
+                    error_text = await res.text()
+                    raise APIStatusError(
+                        message=f"Smallest TTS API Error: {error_text}",
+                        status_code=res.status,
+                    )
+
+                emitter = tts.SynthesizedAudioEmitter(
+                    event_ch=self._event_ch,
+                    request_id=request_id,
+                )
+                async for data, _ in res.content.iter_chunks():
+                    for frame in audio_bstream.write(data):
+                        emitter.push(frame)
+                for frame in audio_bstream.flush():
+                    emitter.push(frame)
+                emitter.flush()
+
+        except asyncio.TimeoutError as e:
+            raise APITimeoutError("Smallest TTS API request timed out") from e
+        except aiohttp.ClientError as e:
+            raise APIConnectionError(f"Smallest TTS API connection error: {e}") from e
+        except APIStatusError:
+            raise
+        except Exception as e:
+            raise APIConnectionError(f"Unexpected error in Smallest TTS: {e}") from e